@@ -0,0 +1,200 @@
+"""Time each conversion stage against a synthetic Meraki organization
+
+Run from the repository root:
+
+    python benchmarks/run_benchmarks.py                   # compare to baseline
+    python benchmarks/run_benchmarks.py --save-baseline   # record a new one
+
+Each stage is timed separately over the same generated org and reported in
+seconds. Configs are rendered with benchmarks/org_settings.toml, which fills
+in every settings section, so every template is part of the timing. When
+compared with benchmarks/baseline.json, any stage slower than the baseline
+by more than the tolerance is reported as a regression and the script exits
+non-zero.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import types
+
+from meraki_converter import main as converter
+from meraki_converter.common import (
+    dhcp_options,
+    fileops,
+    fortios,
+    render,
+    settingsops,
+    synthetic,
+)
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+# Every section filled in, so the whole template set is rendered
+SETTINGS_PATH = os.path.join(os.path.dirname(__file__), "org_settings.toml")
+
+
+def time_stage(func, repeat, setup=None):
+    """Return the best wall clock time of repeat calls to func
+
+    Args:
+        func (callable): The stage to time
+        repeat (int): The number of calls, the fastest is kept
+        setup (callable): Called untimed before each call, to reset any
+            state the previous call left behind
+    """
+    best = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run_benchmarks(networks=20, vlans=200, clients=40, repeat=3, seed=0):
+    """Time every stage of the conversion over a generated organization
+
+    Args:
+        networks (int): The number of networks in the org
+        vlans (int): The number of VLANs per network
+        clients (int): The number of fixed IP assignments per VLAN
+        repeat (int): The number of runs per stage, the best is kept
+        seed (int): Seed for the synthetic org
+
+    Returns:
+        dict: stage name to seconds
+    """
+    dashboard = synthetic.SyntheticDashboard(
+        networks=networks, vlans=vlans, clients=clients, seed=seed
+    )
+    net_ids = [network["id"] for network in dashboard.networks]
+    payloads = [dashboard.appliance.getNetworkApplianceVlans(n) for n in net_ids]
+    # Serve the generated VLANs from memory so generation is not timed
+    by_id = dict(zip(net_ids, payloads))
+    replay = types.SimpleNamespace(
+        appliance=types.SimpleNamespace(getNetworkApplianceVlans=by_id.__getitem__)
+    )
+    options = [v["dhcpOptions"] for p in payloads for v in p if "dhcpOptions" in v]
+    fixed = [v["fixedIpAssignments"] for p in payloads for v in p]
+    settings = settingsops.load_toml(SETTINGS_PATH)
+    config = settingsops.parse_org_settings(settings, SETTINGS_PATH).to_config()
+    vlan_infos = [converter.format_vlans(payload) for payload in payloads]
+    rendered = [render.render_network(config, info) for info in vlan_infos]
+    # A benchmark of a config FortiOS would reject is no benchmark at all
+    for text in rendered:
+        fortios.check_text(text)
+
+    with tempfile.TemporaryDirectory() as out_dir:
+
+        def write_all():
+            for position, text in enumerate(rendered):
+                filename = os.path.join(out_dir, f"{position}.conf")
+                fileops.writelines_to_file(filename, text)
+
+        stages = {
+            "from_meraki_get_vlans": lambda: [
+                converter.from_meraki_get_vlans(replay, n) for n in net_ids
+            ],
+            "parse_dhcp_options": lambda: [
+                converter.parse_dhcp_options(o) for o in options
+            ],
+            "setup_fixed_address_clients": lambda: [
+                converter.setup_fixed_address_clients(f) for f in fixed
+            ],
+            "render_base_conf": lambda: [
+                render.render_network(config, info) for info in vlan_infos
+            ],
+            "write_files": write_all,
+        }
+        # Option sets repeat across VLANs, so each run starts with the memo
+        # empty and pays for the first translation of every set, as a batch does
+        setups = {"parse_dhcp_options": dhcp_options._translate.cache_clear}
+        return {
+            name: time_stage(func, repeat, setups.get(name))
+            for name, func in stages.items()
+        }
+
+
+def compare(results, baseline, tolerance):
+    """Return the stages that are slower than the baseline allows"""
+    regressions = {}
+    for stage, seconds in results.items():
+        expected = baseline.get(stage)
+        if expected and seconds > expected * (1 + tolerance):
+            regressions[stage] = (expected, seconds)
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--networks", type=int, default=20)
+    parser.add_argument("--vlans", type=int, default=200)
+    parser.add_argument("--clients", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Allowed slowdown over the baseline before failing (default: 0.25)",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Store the results as the new baseline",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    params = {
+        "networks": args.networks,
+        "vlans": args.vlans,
+        "clients": args.clients,
+        "seed": args.seed,
+    }
+    results = run_benchmarks(repeat=args.repeat, **params)
+    for stage, seconds in results.items():
+        print(f"{stage:>30}: {seconds * 1000:10.2f} ms")
+
+    if args.save_baseline:
+        baseline = {
+            "params": params,
+            "python": platform.python_version(),
+            "results": results,
+        }
+        with open(BASELINE_PATH, "w", encoding="utf-8") as file:
+            json.dump(baseline, file, indent=2)
+            file.write("\n")
+        print(f"Saved baseline to {BASELINE_PATH}")
+        return 0
+
+    if not os.path.exists(BASELINE_PATH):
+        print("No baseline found, run with --save-baseline to record one")
+        return 0
+    with open(BASELINE_PATH, "r", encoding="utf-8") as file:
+        baseline = json.load(file)
+    if baseline["params"] != params:
+        print("Baseline was recorded with different parameters, not comparing")
+        return 0
+    regressions = compare(results, baseline["results"], args.tolerance)
+    for stage, (expected, seconds) in regressions.items():
+        print(
+            fileops.colorme(
+                f"Regression in {stage}: {expected * 1000:.2f} ms -> "
+                f"{seconds * 1000:.2f} ms",
+                "red",
+            )
+        )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
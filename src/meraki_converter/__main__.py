@@ -0,0 +1,5 @@
+import sys
+
+from meraki_converter.cli import main
+
+sys.exit(main())
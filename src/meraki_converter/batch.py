@@ -0,0 +1,680 @@
+"""Convert every matching network in an organization without prompting"""
+
+import argparse
+import json
+import logging
+import os
+
+from meraki_converter import main as converter
+from meraki_converter.common import (
+    apicache,
+    archive,
+    configtree,
+    conflicts,
+    fileops,
+    fortios,
+    journal,
+    manifest,
+    merakiaio,
+    merakiops,
+    metrics,
+    pipeline,
+    ratelimit,
+    render,
+)
+
+log = logging.getLogger(__name__)
+
+CONFIG_DIR = "output/configs"
+CONFLICTS_PATH = "output/configs/conflicts.json"
+# Added to a config written beside the one it replaces until it is checked
+PENDING_SUFFIX = ".pending"
+
+
+def fetch_vlans(dashboard, network, vlans=None):
+    """Fetch a network's VLANs, unless they were already fetched
+
+    Args:
+        dashboard (obj): The Meraki dashboard instance
+        network (dict): The network as returned by getOrganizationNetworks
+        vlans (list): VLANs already fetched for the network, or the
+            exception raised fetching them
+
+    Returns:
+        list: the VLANs as returned by getNetworkApplianceVlans
+    """
+    if vlans is None:
+        with ratelimit.priority(ratelimit.BULK):
+            vlans = dashboard.appliance.getNetworkApplianceVlans(network["id"])
+    elif isinstance(vlans, BaseException):
+        raise vlans
+    return vlans
+
+
+def prepare_network(network, vlans, org_name, state=None, base_hashes=None,
+                    checker=None, config_dir=CONFIG_DIR):
+    """Load a network's settings and format its VLANs for rendering
+
+    Args:
+        network (dict): The network as returned by getOrganizationNetworks
+        vlans (list): The network's VLANs from getNetworkApplianceVlans
+        org_name (str): The name of the org settings, with optional
+            per-network overrides in input/<org_name>/<network name>.toml
+        state (Manifest): Input hashes of earlier runs, to skip unchanged
+            networks
+        base_hashes (dict): Hashes of the inputs shared by every network
+        checker (OrgChecker): Checks the VLANs and keeps their subnets to
+            compare across the org
+        config_dir (str): The directory the config file is written to
+
+    Returns:
+        tuple: the config file, the settings, the formatted VLANs and the
+            input hashes. The VLANs are None when the file is up to date.
+
+    Raises:
+        ConflictError: when the VLANs have addressing conflicts
+    """
+    with metrics.span("check_conflicts"):
+        if checker is not None:
+            found = checker.add(network["id"], vlans)
+        else:
+            found = conflicts.check_network(vlans, network["id"])
+    if found:
+        raise conflicts.ConflictError(found)
+    config = converter.process_settings(org_name, site=network["name"])
+    name = fileops.safe_filename(network["name"], network["id"])
+    filename = os.path.join(config_dir, f"{name}.conf")
+    hashes = None
+    if state is not None:
+        hashes = dict(
+            base_hashes or {},
+            settings=manifest.hash_json(config),
+            vlans=manifest.hash_json(vlans),
+        )
+        if state.is_current(network["id"], hashes, filename):
+            return filename, config, None, hashes
+    with metrics.span("format_vlans"):
+        vlan_info = converter.format_vlans(vlans)
+    return filename, config, vlan_info, hashes
+
+
+def write_network(network, prepared, state=None, delta_dir=None,
+                  config_archive=None, staged=False):
+    """Render a prepared network to its config file
+
+    Args:
+        network (dict): The network as returned by getOrganizationNetworks
+        prepared (tuple): As returned by prepare_network
+        state (Manifest): Where the inputs of the written file are recorded
+        delta_dir (str): Where to write the changes from the config being
+            replaced, if anywhere
+        config_archive (ConfigArchive): Where the config is added instead
+            of being written to its own file
+        staged (bool): Whether to write the config and its delta beside
+            their files, with PENDING_SUFFIX added, for check_configs to
+            put in place once checked, rather than over them unchecked
+
+    Returns:
+        tuple: the name of the config file and whether it was rendered
+    """
+    filename, config, vlan_info, hashes = prepared
+    if vlan_info is None:
+        return filename, False
+    if config_archive is not None:
+        with metrics.span("render"):
+            text = render.render_network(config, vlan_info)
+        # Never on disk to be checked with the rest of the batch
+        fortios.check_text(text, filename)
+        name = os.path.basename(filename)
+        config_archive.add(network, name, text)
+        return os.path.join(config_archive.path, name), True
+    # Checked once the whole batch is written, on a process pool
+    render.render_network_to_file(
+        filename + PENDING_SUFFIX if staged else filename,
+        config,
+        vlan_info,
+        check=False,
+        delta_dir=delta_dir,
+        replaces=filename,
+    )
+    if state is not None:
+        state.record(network["id"], network["name"], hashes, filename, staged)
+    return filename, True
+
+
+def convert_network(dashboard, network, org_name, vlans=None, state=None,
+                    base_hashes=None):
+    """Fetch, format and render a single network to its own config file
+
+    Args:
+        dashboard (obj): The Meraki dashboard instance
+        network (dict): The network as returned by getOrganizationNetworks
+        org_name (str): The name of the org settings, with optional
+            per-network overrides in input/<org_name>/<network name>.toml
+        vlans (list): VLANs already fetched for the network, if any
+        state (Manifest): Input hashes of earlier runs, to skip unchanged
+            networks
+        base_hashes (dict): Hashes of the inputs shared by every network
+
+    Returns:
+        tuple: the name of the config file and whether it was rendered
+    """
+    vlans = fetch_vlans(dashboard, network, vlans)
+    prepared = prepare_network(network, vlans, org_name, state, base_hashes)
+    return write_network(network, prepared, state)
+
+
+def run_batch(dashboard, networks, org_name, workers=8, prefetched=None,
+              state=None, base_hashes=None, job_journal=None,
+              transform_workers=2, render_workers=4, queue_size=16,
+              checker=None, delta_dir=None, config_archive=None, staged=False,
+              config_dir=CONFIG_DIR):
+    """Convert networks through a fetch, transform and render pipeline
+
+    The stages are connected by bounded queues, so only a few networks are
+    held in memory at any time however many are converted. Each network is
+    released once its config is written.
+
+    Args:
+        dashboard (obj): The Meraki dashboard instance
+        networks (list): The networks to convert
+        org_name (str): The name of the org settings
+        workers (int): The number of networks fetched at once
+        prefetched (dict): Network ID to VLANs fetched ahead of time, each
+            removed once used
+        state (Manifest): Input hashes of earlier runs, to skip unchanged
+            networks
+        base_hashes (dict): Hashes of the inputs shared by every network
+        job_journal (Journal): Where the outcome of each network is recorded
+            as soon as it is known
+        transform_workers (int): The number of networks formatted at once
+        render_workers (int): The number of networks rendered and written
+            at once
+        queue_size (int): The most networks waiting between two stages
+        checker (OrgChecker): Collects the addressing conflicts of the org
+        delta_dir (str): Where to write the changes to each config replaced,
+            if anywhere
+        config_archive (ConfigArchive): Where the configs are added instead
+            of being written to files of their own
+        staged (bool): Whether the configs are written beside their files,
+            and only journaled as done, by check_configs once checked
+        config_dir (str): The directory the config files are written to
+
+    Returns:
+        tuple: lists of (network, filename) converted, (network, filename)
+            already up to date and (network, error) failures
+    """
+    succeeded = []
+    up_to_date = []
+    failed = []
+    prefetched = prefetched if prefetched is not None else {}
+    stages = [
+        pipeline.Stage(
+            "fetch",
+            lambda network, _: fetch_vlans(
+                dashboard, network, prefetched.pop(network["id"], None)
+            ),
+            workers,
+        ),
+        pipeline.Stage(
+            "transform",
+            lambda network, vlans: prepare_network(
+                network,
+                vlans,
+                org_name,
+                state,
+                base_hashes,
+                checker,
+                config_dir,
+            ),
+            transform_workers,
+        ),
+        pipeline.Stage(
+            "render",
+            lambda network, prepared: write_network(
+                network, prepared, state, delta_dir, config_archive, staged
+            ),
+            render_workers,
+        ),
+    ]
+    results = pipeline.run_pipeline(networks, stages, queue_size)
+    for progress, (network, result) in enumerate(results, start=1):
+        if isinstance(result, pipeline.Failed):
+            error = str(result.error)
+            log.error(f"Failed to convert network {network['name']}: {error}")
+            failed.append((network, error))
+            if job_journal:
+                job_journal.record(network, journal.FAILED, error=error)
+        else:
+            filename, rendered = result
+            if job_journal and not (staged and rendered):
+                job_journal.record(network, journal.DONE, filename)
+            if rendered:
+                log.info(f"Wrote network {network['name']} to {filename}")
+                succeeded.append((network, filename))
+            else:
+                log.info(f"Network {network['name']} is up to date")
+                up_to_date.append((network, filename))
+        print(fileops.progress_bar(progress, len(networks)), end="\r")
+    print()
+    return succeeded, up_to_date, failed
+
+
+def check_configs(succeeded, workers=None, job_journal=None, state=None,
+                  delta_dir=None):
+    """Check the configs staged by a batch and put those without errors in place
+
+    The configs are read back and checked on a process pool, away from the
+    render threads. A config with errors is removed, leaving the one it
+    would have replaced.
+
+    Args:
+        succeeded (list): (network, filename) pairs of the configs written
+            by run_batch with staged set
+        workers (int): The number of processes, defaults to the CPU count
+        job_journal (Journal): Where the outcome of each network is recorded
+        state (Manifest): Where the pending inputs of each config are
+            confirmed or discarded
+        delta_dir (str): Where the staged deltas were written, if anywhere
+
+    Returns:
+        tuple: the (network, filename) pairs that passed and (network, error)
+            pairs of those with errors
+    """
+    if not succeeded:
+        return succeeded, []
+    with metrics.span("check_configs"):
+        results = fortios.check_files(
+            [filename + PENDING_SUFFIX for _, filename in succeeded],
+            workers=workers,
+        )
+    passed, failed = [], []
+    for network, filename in succeeded:
+        staged = filename + PENDING_SUFFIX
+        staged_delta = None
+        if delta_dir is not None:
+            staged_delta = os.path.join(delta_dir, os.path.basename(staged))
+        issues = results[staged]
+        for issue in issues:
+            if issue.severity == fortios.WARNING:
+                log.warning(f"{filename}:{issue.line}: {issue.message}")
+        errors = fortios.errors(issues)
+        if not errors:
+            os.replace(staged, filename)
+            if staged_delta and os.path.exists(staged_delta):
+                os.replace(staged_delta, staged_delta[: -len(PENDING_SUFFIX)])
+            if state is not None:
+                state.confirm(network["id"])
+            if job_journal:
+                job_journal.record(network, journal.DONE, filename)
+            passed.append((network, filename))
+            continue
+        os.remove(staged)
+        if staged_delta and os.path.exists(staged_delta):
+            os.remove(staged_delta)
+        if state is not None:
+            state.discard(network["id"])
+        error = str(fortios.ConfigError(errors))
+        log.error(f"Config of network {network['name']} has errors: {error}")
+        failed.append((network, error))
+        if job_journal:
+            job_journal.record(network, journal.FAILED, error=error)
+    metrics.count("config_errors", len(failed))
+    return passed, failed
+
+
+def write_conflicts(found, filename=CONFLICTS_PATH):
+    """Write the addressing conflicts found, as JSON, for review or tooling"""
+    report = [conflict._asdict() for conflict in found]
+    fileops.write_atomic(filename, (json.dumps(report, indent=2),))
+    warnings = [c for c in found if c.severity == conflicts.WARNING]
+    for conflict in warnings:
+        log.warning(conflict.message)
+    if found:
+        print(
+            fileops.colorme(
+                f"{len(found) - len(warnings)} addressing conflicts and "
+                f"{len(warnings)} warnings, see {filename}",
+                "red" if len(found) > len(warnings) else "blue",
+            )
+        )
+
+
+def print_summary(succeeded, up_to_date, failed, resumed=()):
+    print(fileops.colorme(f"Converted {len(succeeded)} networks", "green"))
+    if up_to_date:
+        print(fileops.colorme(f"{len(up_to_date)} networks up to date", "green"))
+    if resumed:
+        print(
+            fileops.colorme(
+                f"{len(resumed)} networks already done by the interrupted run",
+                "green",
+            )
+        )
+    if failed:
+        print(fileops.colorme(f"Failed to convert {len(failed)} networks:", "red"))
+        for network, error in sorted(failed, key=lambda x: x[0]["name"]):
+            print(f"  {network['name']} ({network['id']}): {error}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Convert every matching network in an organization"
+    )
+    parser.add_argument(
+        "org_id", nargs="?", help="The Meraki organization ID, unless --job is given"
+    )
+    parser.add_argument("--name", help="Only networks whose name contains this")
+    parser.add_argument("--tag", help="Only networks carrying this tag")
+    parser.add_argument("--regex", help="Only networks whose name matches this")
+    parser.add_argument(
+        "--job",
+        help="A TOML file listing the orgs and networks to convert, see "
+        "input/batch_job_template.toml. The configs of each org are written "
+        "to a directory named after its ID",
+    )
+    parser.add_argument(
+        "--journal",
+        default=journal.JOURNAL_PATH,
+        help=f"Where each network's outcome is recorded, so an interrupted run "
+        f"can resume (default: {journal.JOURNAL_PATH})",
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Convert every network again instead of resuming an interrupted run",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        help="Number of networks fetched at the same time (default: 8)",
+    )
+    parser.add_argument(
+        "--transform-workers",
+        type=int,
+        default=2,
+        help="Number of networks formatted at the same time (default: 2)",
+    )
+    parser.add_argument(
+        "--render-workers",
+        type=int,
+        default=4,
+        help="Number of networks rendered and written at the same time "
+        "(default: 4)",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=16,
+        help="Most networks waiting between two stages, bounding memory use "
+        "(default: 16)",
+    )
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help="Fetch all VLANs concurrently with the asyncio dashboard first",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=8,
+        help="Number of concurrent requests when using --async (default: 8)",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Only use cached dashboard responses, no API key is needed",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always query the dashboard instead of using cached responses",
+    )
+    parser.add_argument(
+        "--settings",
+        help="Name of the org settings file in input/, defaults to the org name",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Render every network even when its inputs have not changed",
+    )
+    parser.add_argument(
+        "--archive",
+        nargs="?",
+        const=archive.ARCHIVE_PATH,
+        metavar="PATH",
+        help=f"Write every config into one compressed archive with an index, "
+        f"instead of a file each, rendering every network (default PATH: "
+        f"{archive.ARCHIVE_PATH})",
+    )
+    parser.add_argument(
+        "--delta",
+        action="store_true",
+        help=f"Also write the changes to each config replaced, as a script, to "
+        f"{configtree.DELTA_DIR}",
+    )
+    parser.add_argument(
+        "--check-workers",
+        type=int,
+        help="Processes checking the written configs (default: CPU count)",
+    )
+    parser.add_argument(
+        "--no-check",
+        action="store_true",
+        help="Do not check the written configs for structural errors",
+    )
+    args = parser.parse_args(argv)
+    if not args.org_id and not args.job:
+        parser.error("an org_id or --job is required")
+    return args
+
+
+def job_from_args(args):
+    """The single org job given on the command line, shaped like load_job's"""
+    return {
+        "org_id": args.org_id,
+        "settings": args.settings,
+        "name": args.name,
+        "tag": args.tag,
+        "regex": args.regex,
+        "networks": None,
+    }
+
+
+def convert_org(job, args, settings, state, base_hashes, job_journal,
+                checker=None, config_archive=None):
+    """Convert the networks of one org in a job
+
+    Args:
+        job (dict): The org and its filters, as returned by load_job
+        args (Namespace): The command line arguments
+        settings (dict): The general settings
+        state (Manifest): Input hashes of earlier runs
+        base_hashes (dict): Hashes of the inputs shared by every network
+        job_journal (Journal): Records each network's outcome and which were
+            done by an interrupted run
+        checker (OrgChecker): Collects the org's addressing conflicts
+        config_archive (ConfigArchive): Where the configs are added instead
+            of being written to files of their own. Every network is
+            rendered, as the archive starts out empty.
+
+    Returns:
+        tuple: the lists returned by run_batch, with the configs that failed
+            their check moved to the failures, and the networks skipped as
+            already done
+    """
+    org_id = job["org_id"]
+    log.info("Creating instance of the Meraki dashboard")
+    cache = None
+    if args.no_cache:
+        dashboard = merakiops.get_dashboard(org=org_id)
+    else:
+        cache = apicache.cache_from_settings(settings, offline=args.offline)
+        dashboard = merakiops.get_cached_dashboard(
+            cache, offline=args.offline, org=org_id
+        )
+    org_name = job["settings"] or merakiops.get_organization_name(dashboard, org_id)
+    log.info(f"Batch converting organization {org_name} with ID {org_id}")
+    # Fail on bad settings before fetching any networks
+    converter.process_settings(org_name)
+
+    networks = merakiops.get_networks(dashboard, org_id) or []
+    networks = merakiops.filter_networks(
+        networks, name=job["name"], tag=job["tag"], regex=job["regex"]
+    )
+    if job["networks"] is not None:
+        wanted = set(job["networks"])
+        networks = [network for network in networks if network["id"] in wanted]
+    if not networks:
+        print(fileops.colorme(f"No networks in {org_name} matched the job", "red"))
+        return [], [], [], []
+    resumed = [network for network in networks if job_journal.is_done(network["id"])]
+    if resumed:
+        log.info(f"Skipping {len(resumed)} networks done by the interrupted run")
+        networks = [
+            network for network in networks if not job_journal.is_done(network["id"])
+        ]
+    log.info(
+        f"Converting {len(networks)} networks with {args.workers} fetch, "
+        f"{args.transform_workers} transform and {args.render_workers} render workers"
+    )
+    if not networks:
+        return [], [], [], resumed
+
+    # Networks of different orgs can share a name, so each org of a job
+    # writes to a directory of its own, named after its ID
+    config_dir, delta_dir = CONFIG_DIR, configtree.DELTA_DIR
+    if args.job:
+        config_dir = os.path.join(config_dir, org_id)
+        delta_dir = os.path.join(delta_dir, org_id)
+    os.makedirs(config_dir, exist_ok=True)
+    delta_dir = delta_dir if args.delta else None
+    staged = config_archive is None and not args.no_check
+
+    # VLANs fetched with --async are prefetched a chunk at a time, so no more
+    # than one chunk is held in memory
+    chunk_size = len(networks)
+    if args.use_async and not args.offline:
+        chunk_size = max(args.concurrency * 16, args.queue_size)
+    succeeded, up_to_date, failed = [], [], []
+    for start in range(0, len(networks), chunk_size):
+        chunk = networks[start:start + chunk_size]
+        prefetched = None
+        if args.use_async and not args.offline:
+            prefetched, missed = {}, [(network["id"],) for network in chunk]
+            if cache:
+                cached, missed = cache.get_many("getNetworkApplianceVlans", missed)
+                for (net_id,), vlans in cached.items():
+                    prefetched[net_id] = vlans
+            fetched = {}
+            if missed:
+                log.info(
+                    f"Fetching VLANs of {len(missed)} networks with "
+                    f"{args.concurrency} concurrent requests"
+                )
+                fetched = merakiaio.fetch_network_vlans(
+                    [net_id for net_id, in missed],
+                    concurrency=args.concurrency,
+                    org=org_id,
+                )
+            if cache:
+                for net_id, vlans in fetched.items():
+                    if not isinstance(vlans, BaseException):
+                        cache.put("getNetworkApplianceVlans", (net_id,), None, vlans)
+            prefetched.update(fetched)
+        result = run_batch(
+            dashboard,
+            chunk,
+            org_name,
+            workers=args.workers,
+            prefetched=prefetched,
+            state=state if config_archive is None else None,
+            base_hashes=base_hashes,
+            job_journal=job_journal,
+            checker=checker,
+            transform_workers=args.transform_workers,
+            render_workers=args.render_workers,
+            queue_size=args.queue_size,
+            delta_dir=delta_dir,
+            config_archive=config_archive,
+            staged=staged,
+            config_dir=config_dir,
+        )
+        for total, part in zip((succeeded, up_to_date, failed), result):
+            total.extend(part)
+    if staged:
+        succeeded, bad = check_configs(
+            succeeded, args.check_workers, job_journal, state, delta_dir
+        )
+        failed.extend(bad)
+    return succeeded, up_to_date, failed, resumed
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    fileops.setup_logging("batch")
+    req_keys = ["title", "logging"]
+    settings = fileops.load_settings("input/general_settings.toml", req_keys)
+    print(fileops.colorme(settings["title"], "red"))
+    ratelimit.configure(settings)
+
+    jobs = journal.load_job(args.job) if args.job else [job_from_args(args)]
+    state = manifest.Manifest(force=args.force)
+    base_hashes = {
+        "templates": manifest.hash_templates(render.TEMPLATE_DIR),
+    }
+    succeeded, up_to_date, failed, resumed = [], [], [], []
+    found = []
+    config_archive = archive.ConfigArchive(args.archive) if args.archive else None
+    # An archive is written from scratch, so nothing is resumed into it
+    restart = args.restart or config_archive is not None
+    with journal.Journal(
+        args.journal, journal.job_key(jobs), restart=restart
+    ) as job_journal:
+        try:
+            for job in jobs:
+                checker = conflicts.OrgChecker()
+                result = convert_org(
+                    job,
+                    args,
+                    settings,
+                    state,
+                    base_hashes,
+                    job_journal,
+                    checker,
+                    config_archive,
+                )
+                for total, part in zip(
+                    (succeeded, up_to_date, failed, resumed), result
+                ):
+                    total.extend(part)
+                found.extend(checker.conflicts())
+            if config_archive is not None:
+                config_archive.close()
+        except BaseException:
+            if config_archive is not None:
+                config_archive.abort()
+            raise
+        finally:
+            state.save()
+            write_conflicts(found)
+        if not failed:
+            job_journal.complete()
+    if not (succeeded or up_to_date or failed or resumed):
+        print(fileops.colorme("No networks matched the given filters", "red"))
+        return 1
+    metrics.count("networks", len(succeeded), status="converted")
+    metrics.count("networks", len(up_to_date), status="up_to_date")
+    metrics.count("networks", len(resumed), status="resumed")
+    metrics.count("networks", len(failed), status="failed")
+    metrics.write_reports("batch", converter.metrics_directory(settings))
+    print_summary(succeeded, up_to_date, failed, resumed)
+    log.info(
+        f"Batch completed: {len(succeeded)} converted, "
+        f"{len(up_to_date)} up to date, {len(resumed)} resumed, "
+        f"{len(failed)} failed"
+    )
+    return 1 if failed else 0
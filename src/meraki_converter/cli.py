@@ -0,0 +1,337 @@
+"""Command line entry point dispatching to the converter subcommands
+
+Only argparse is imported up front. Each subcommand imports what it needs
+when it runs, so the offline commands never load the meraki library and
+--version or validate return almost immediately.
+"""
+
+import argparse
+import glob
+import os
+import sys
+
+from meraki_converter import __version__
+
+# Settings files in input/ that are not org settings
+NON_ORG_SETTINGS = {"general_settings", "base_settings"}
+
+
+def run_convert(args):
+    from meraki_converter import main as converter
+
+    return converter.main(args.args)
+
+
+def run_batch(args):
+    from meraki_converter import batch
+
+    return batch.main(args.args)
+
+
+def run_watch(args):
+    from meraki_converter import watch
+
+    return watch.main(args.args)
+
+
+def run_render(args):
+    """Render a network from cached responses without touching the API"""
+    from meraki_converter import main as converter
+    from meraki_converter.common import apicache, conflicts, fileops, fortios, render
+
+    settings = fileops.load_settings("input/general_settings.toml", ["title"])
+    cache = apicache.cache_from_settings(settings, offline=True)
+    dashboard = apicache.CachedDashboard(None, cache)
+    try:
+        vlans = dashboard.appliance.getNetworkApplianceVlans(args.network_id)
+    except apicache.CacheMiss:
+        sys.exit(f"No cached VLANs for network {args.network_id}, run online first")
+    found = conflicts.check_network(vlans, args.network_id)
+    if found:
+        for conflict in found:
+            print(fileops.colorme(conflict.message, "red"))
+        return 1
+    config = converter.process_settings(args.settings, site=args.site)
+    vlan_info = converter.format_vlans(vlans)
+    name = fileops.safe_filename(args.site or args.network_id, args.network_id)
+    filename = args.output or f"output/configs/{name}.conf"
+    try:
+        render.render_network_to_file(filename, config, vlan_info)
+    except fortios.ConfigError as e:
+        print_issues(e.issues)
+        return 1
+    print(fileops.colorme(f"Wrote {filename}", "green"))
+    return 0
+
+
+def print_issues(issues):
+    from meraki_converter.common import fileops, fortios
+
+    for issue in issues:
+        color = "red" if issue.severity == fortios.ERROR else "blue"
+        message = f"{issue.path}:{issue.line}: {issue.severity}: {issue.message}"
+        print(fileops.colorme(message, color))
+
+
+def run_check(args):
+    """Check rendered configs for structural errors, on a process pool"""
+    from meraki_converter.common import fileops, fortios
+
+    files = fortios.config_files(args.paths)
+    if not files:
+        sys.exit(f"No configs found in {' '.join(args.paths)}")
+    results = fortios.check_files(files, workers=args.workers)
+    failed = 0
+    for issues in results.values():
+        print_issues(issues)
+        if fortios.errors(issues):
+            failed += 1
+    color = "red" if failed else "green"
+    print(fileops.colorme(f"{failed} of {len(files)} configs have errors", color))
+    return 1 if failed else 0
+
+
+def run_diff(args):
+    """Print the script that turns one rendered config into another"""
+    from meraki_converter.common import configtree
+
+    trees = []
+    for path in (args.old, args.new):
+        tree = configtree.load(path)
+        if tree is None:
+            sys.exit(f"Could not find file {path}")
+        trees.append(tree)
+    for line in configtree.diff(*trees):
+        print(line)
+    return 0
+
+
+def run_extract(args):
+    """List the networks in a config archive, or extract the config of one"""
+    from meraki_converter.common import archive, fileops
+
+    if not os.path.exists(args.archive):
+        sys.exit(f"Could not find file {args.archive}")
+    if args.network is None:
+        for entry in archive.read_index(args.archive):
+            print(
+                f"{entry['network_id']}  {entry['sha256'][:12]}  "
+                f"{entry['size']:>9}  {entry['name']}"
+            )
+        return 0
+    config = archive.read_config(args.archive, args.network)
+    if config is None:
+        sys.exit(f"No network {args.network} in {args.archive}")
+    if args.output:
+        fileops.write_atomic(args.output, (config,))
+        print(fileops.colorme(f"Wrote {args.output}", "green"))
+    else:
+        sys.stdout.write(config)
+    return 0
+
+
+def org_settings_names(input_dir="input"):
+    """Return the names of the org settings files found in input_dir"""
+    names = []
+    for path in sorted(glob.glob(os.path.join(input_dir, "*.toml"))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        if name in NON_ORG_SETTINGS or name.endswith("_template"):
+            continue
+        names.append(name)
+    return names
+
+
+def run_validate(args):
+    """Check every org settings file, including its site overrides"""
+    from meraki_converter.common import fileops, settingsops
+
+    orgs = args.orgs or org_settings_names(args.input_dir)
+    if not orgs:
+        sys.exit(f"No org settings files found in {args.input_dir}")
+    failed = 0
+    for org in orgs:
+        sites = [None] + sorted(
+            os.path.splitext(os.path.basename(path))[0]
+            for path in glob.glob(os.path.join(args.input_dir, org, "*.toml"))
+        )
+        for site in sites:
+            label = f"{org}/{site}" if site else org
+            try:
+                settingsops.load_org_settings(org, site, args.input_dir)
+            except (FileNotFoundError, settingsops.SettingsError) as e:
+                failed += 1
+                print(fileops.colorme(f"{label}: {e}", "red"))
+            else:
+                print(fileops.colorme(f"{label}: ok", "green"))
+    return 1 if failed else 0
+
+
+def run_list_templates(args):
+    for path in sorted(glob.glob(os.path.join(args.template_dir, "*.conf"))):
+        print(os.path.basename(path))
+    return 0
+
+
+def run_standin(args):
+    """Serve a local stand-in of the dashboard API until interrupted"""
+    from meraki_converter.common import standin, synthetic
+
+    if args.recordings:
+        backend = standin.recorded_backend(args.recordings)
+    else:
+        backend = synthetic.SyntheticDashboard(
+            org_id=args.org_id,
+            networks=args.networks,
+            vlans=args.vlans,
+            clients=args.clients,
+            seed=args.seed,
+        )
+    server = standin.StandInServer(
+        backend,
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        page_size=args.page_size,
+        throttle_every=args.throttle_every,
+        retry_after=args.retry_after,
+    )
+    print(f"export MERAKI_DASHBOARD_BASE_URL={server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="meraki_converter",
+        description="Convert Meraki MX networks to Fortigate configuration",
+    )
+    parser.add_argument(
+        "--version", action="version", version=f"%(prog)s {__version__}"
+    )
+    subparsers = parser.add_subparsers(dest="command", metavar="COMMAND")
+
+    # convert, batch and watch keep their own parsers, so pass their arguments along
+    convert = subparsers.add_parser(
+        "convert", add_help=False, help="Interactively convert one network"
+    )
+    convert.add_argument("args", nargs=argparse.REMAINDER)
+    convert.set_defaults(func=run_convert)
+    batch = subparsers.add_parser(
+        "batch", add_help=False, help="Convert every matching network in an org"
+    )
+    batch.add_argument("args", nargs=argparse.REMAINDER)
+    batch.set_defaults(func=run_batch)
+    watch = subparsers.add_parser(
+        "watch", add_help=False, help="Convert networks as their config changes"
+    )
+    watch.add_argument("args", nargs=argparse.REMAINDER)
+    watch.set_defaults(func=run_watch)
+
+    render = subparsers.add_parser(
+        "render", help="Render a network offline from cached API responses"
+    )
+    render.add_argument("network_id", help="The network ID to render")
+    render.add_argument(
+        "--settings", required=True, help="Org settings to use, input/<name>.toml"
+    )
+    render.add_argument("--site", help="The network name, for site overrides")
+    render.add_argument("--output", help="The config file to write")
+    render.set_defaults(func=run_render)
+
+    validate = subparsers.add_parser(
+        "validate", help="Check the org settings files without rendering"
+    )
+    validate.add_argument(
+        "orgs", nargs="*", help="Org settings to check, defaults to all"
+    )
+    validate.add_argument("--input-dir", default="input")
+    validate.set_defaults(func=run_validate)
+
+    check = subparsers.add_parser(
+        "check", help="Check rendered configs for structural errors"
+    )
+    check.add_argument(
+        "paths",
+        nargs="*",
+        default=["output/configs"],
+        help="Configs or directories of them, defaults to output/configs",
+    )
+    check.add_argument(
+        "--workers", type=int, help="Processes to check with, defaults to CPUs"
+    )
+    check.set_defaults(func=run_check)
+
+    diff = subparsers.add_parser(
+        "diff", help="Print the changes between two rendered configs as a script"
+    )
+    diff.add_argument("old", help="The config on the device")
+    diff.add_argument("new", help="The config it should become")
+    diff.set_defaults(func=run_diff)
+
+    extract = subparsers.add_parser(
+        "extract", help="List a config archive or extract one network's config"
+    )
+    extract.add_argument(
+        "network", nargs="?", help="The network ID or name, lists all if left out"
+    )
+    extract.add_argument(
+        "--archive",
+        default="output/configs/configs.zip",
+        help="The archive written by batch --archive",
+    )
+    extract.add_argument("--output", help="The file to write, instead of stdout")
+    extract.set_defaults(func=run_extract)
+
+    list_templates = subparsers.add_parser(
+        "list-templates", help="List the jinja templates that are rendered"
+    )
+    list_templates.add_argument("--template-dir", default="templates")
+    list_templates.set_defaults(func=run_list_templates)
+
+    standin = subparsers.add_parser(
+        "standin", help="Serve a local stand-in of the dashboard API"
+    )
+    standin.add_argument("--host", default="127.0.0.1")
+    standin.add_argument("--port", type=int, default=8080)
+    standin.add_argument(
+        "--recordings", help="Serve the responses cached in this directory"
+    )
+    standin.add_argument("--org-id", default="1", help="Synthetic org ID")
+    standin.add_argument("--networks", type=int, default=100)
+    standin.add_argument("--vlans", type=int, default=20)
+    standin.add_argument("--clients", type=int, default=10)
+    standin.add_argument("--seed", type=int, default=0)
+    standin.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds added to responses"
+    )
+    standin.add_argument("--page-size", type=int, default=1000)
+    standin.add_argument(
+        "--throttle-every",
+        type=int,
+        default=0,
+        help="Answer every nth request with a 429",
+    )
+    standin.add_argument("--retry-after", type=int, default=1)
+    standin.set_defaults(func=run_standin)
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    parser = build_parser()
+    # With no subcommand behave like the original interactive converter
+    if not argv or argv[0].startswith("-") and argv[0] not in (
+        "-h", "--help", "--version"
+    ):
+        argv = ["convert"] + argv
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,243 @@
+"""Persistent on-disk cache of Meraki dashboard responses"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from meraki_converter.common import fileops, metrics
+
+log = logging.getLogger(__name__)
+
+# The dashboard the meraki library calls unless given another base_url
+DEFAULT_BASE_URL = "https://api.meraki.com/api/v1"
+# The API key last used online for each base URL, as a hash, for offline runs
+SCOPES_FILE = "scopes"
+
+# Seconds a response stays fresh, by endpoint
+DEFAULT_TTLS = {
+    "getOrganizations": 86400,
+    "getOrganization": 86400,
+    "getOrganizationNetworks": 3600,
+    "getNetworkApplianceVlans": 900,
+    "getNetworkApplianceWarmSpare": 3600,
+}
+
+
+class CacheMiss(Exception):
+    """Raised in offline mode when a response has never been cached"""
+
+
+class ResponseCache:
+    """Cache of API responses stored as one JSON file per request
+
+    Entries are keyed by a hash of the scope, the endpoint name and its
+    arguments. The scope, from cache_scope, names the dashboard and API key
+    the responses came from, so one cache directory can hold those of the
+    stand-in and of several keys apart. Each endpoint has its own time to
+    live, and the least recently used entries are evicted once the
+    directory grows past max_bytes. In offline mode entries never expire
+    and a miss raises CacheMiss.
+    """
+
+    def __init__(self, directory="output/cache/", ttls=None, default_ttl=3600,
+                 max_bytes=256 * 1024 * 1024, offline=False, scope=""):
+        self.directory = directory
+        self.scope = scope
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(size for _, size, _ in self._entries())
+
+    def key(self, endpoint, args=(), kwargs=None):
+        request = json.dumps(
+            [self.scope, endpoint, list(args), kwargs or {}], sort_keys=True
+        )
+        return hashlib.sha256(request.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def _entries(self):
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(".json"):
+                    stat = entry.stat()
+                    yield entry.path, stat.st_size, stat.st_mtime
+
+    def get(self, endpoint, args=(), kwargs=None):
+        """Return a (hit, value) tuple for a cached response"""
+        path = self._path(self.key(endpoint, args, kwargs))
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                entry = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return False, None
+        age = time.time() - entry["stored"]
+        if not self.offline and age > self.ttls.get(endpoint, self.default_ttl):
+            return False, None
+        # The modification time doubles as the last access time for eviction
+        os.utime(path)
+        return True, entry["value"]
+
+    def get_many(self, endpoint, calls):
+        """Split calls into those with a cached response and those without
+
+        Args:
+            endpoint (str): The endpoint name
+            calls (list): The positional arguments of each call, as tuples
+
+        Returns:
+            tuple: a dict of the arguments of each hit to its response, and
+                a list of the arguments of each miss
+        """
+        hits, misses = {}, []
+        for args in calls:
+            hit, value = self.get(endpoint, args)
+            if hit:
+                hits[args] = value
+            else:
+                misses.append(args)
+        metrics.count("cache_hits", len(hits), endpoint=endpoint)
+        metrics.count("cache_misses", len(misses), endpoint=endpoint)
+        return hits, misses
+
+    def put(self, endpoint, args=(), kwargs=None, value=None):
+        """Store a response, evicting old entries if over the size limit"""
+        entry = {
+            "endpoint": endpoint,
+            "args": list(args),
+            "kwargs": kwargs or {},
+            "stored": time.time(),
+            "value": value,
+        }
+        path = self._path(self.key(endpoint, args, kwargs))
+        data = json.dumps(entry).encode("utf-8")
+        with self._lock:
+            try:
+                self._size -= os.path.getsize(path)
+            except FileNotFoundError:
+                pass
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            os.replace(temp_path, path)
+            self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        entries = sorted(self._entries(), key=lambda x: x[2])
+        for path, size, _ in entries:
+            if self._size <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            self._size -= size
+            log.debug(f"Evicted cached response {path}")
+
+    def call(self, endpoint, func, *args, **kwargs):
+        """Return the cached response for a call, making it on a miss"""
+        hit, value = self.get(endpoint, args, kwargs)
+        if hit:
+            metrics.count("cache_hits", endpoint=endpoint)
+            return value
+        metrics.count("cache_misses", endpoint=endpoint)
+        if self.offline or func is None:
+            raise CacheMiss(f"No cached response for {endpoint}{args}")
+        value = func(*args, **kwargs)
+        self.put(endpoint, args, kwargs, value)
+        return value
+
+
+class _CachedSection:
+    def __init__(self, section, cache):
+        self._section = section
+        self._cache = cache
+
+    def __getattr__(self, name):
+        func = getattr(self._section, name) if self._section else None
+        if not name.startswith("get"):
+            if func is None:
+                raise CacheMiss(f"{name} is not available in offline mode")
+            return func
+
+        def cached_call(*args, **kwargs):
+            return self._cache.call(name, func, *args, **kwargs)
+
+        return cached_call
+
+
+class CachedDashboard:
+    """Wraps a DashboardAPI so every get* call goes through the cache
+
+    With no dashboard, as in offline mode, only cached responses are served.
+    """
+
+    def __init__(self, dashboard, cache):
+        self._dashboard = dashboard
+        self.cache = cache
+
+    def __getattr__(self, name):
+        section = getattr(self._dashboard, name) if self._dashboard else None
+        return _CachedSection(section, self.cache)
+
+
+def cache_scope(directory, offline=False, key=None, base_url=None):
+    """Name the dashboard and API key cached responses belong to
+
+    Only a hash of the key is used. An offline run needs no key, so without
+    one it takes the key last used online against the same base URL.
+
+    Args:
+        directory (str): The cache directory, where that key is remembered
+        offline (bool): Whether the cache is only read
+        key (str): The API key, defaults to MERAKI_DASHBOARD_API_KEY
+        base_url (str): The API called, defaults to MERAKI_DASHBOARD_BASE_URL
+            or the Meraki cloud
+
+    Returns:
+        str: the scope to give ResponseCache
+    """
+    key = key or os.environ.get("MERAKI_DASHBOARD_API_KEY")
+    base_url = base_url or os.environ.get("MERAKI_DASHBOARD_BASE_URL")
+    base_url = (base_url or DEFAULT_BASE_URL).rstrip("/")
+    path = os.path.join(directory, SCOPES_FILE)
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            scopes = json.load(file)
+    except (FileNotFoundError, ValueError):
+        scopes = {}
+    if key:
+        key_hash = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+        if not offline and scopes.get(base_url) != key_hash:
+            scopes[base_url] = key_hash
+            os.makedirs(directory, exist_ok=True)
+            fileops.write_atomic(path, (json.dumps(scopes, indent=2),))
+    else:
+        key_hash = scopes.get(base_url)
+    return f"{base_url} {key_hash}"
+
+
+def cache_from_settings(settings, offline=False):
+    """Create a ResponseCache from the [cache] table of the general settings
+
+    The cache is scoped to the dashboard and API key in the environment.
+    """
+    cache_settings = settings.get("cache", {})
+    directory = cache_settings.get("directory", "output/cache/")
+    return ResponseCache(
+        directory=directory,
+        ttls=dict(cache_settings.get("ttl", {})),
+        max_bytes=int(cache_settings.get("max_size_mb", 256)) * 1024 * 1024,
+        offline=offline,
+        scope=cache_scope(directory, offline),
+    )
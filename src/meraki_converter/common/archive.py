@@ -0,0 +1,172 @@
+"""Write the configs of a batch into one compressed archive
+
+A config file per network means an open, write and close for each of
+thousands of networks, and as many files to move around afterwards. An
+archive is written front to back as the configs are rendered instead.
+Each distinct config is compressed once, named after the hash of its
+content, and an index at the end maps every network to its config and the
+byte offset of its compressed data, so one config can be read without
+unpacking the rest.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import zipfile
+
+from meraki_converter.common import metrics
+
+log = logging.getLogger(__name__)
+
+ARCHIVE_PATH = "output/configs/configs.zip"
+INDEX_NAME = "index.json"
+COMPRESS_LEVEL = 6
+# The fixed part of a zip local file header, before its name and extra field
+LOCAL_HEADER_SIZE = 30
+
+
+class ConfigArchive:
+    """Collects rendered configs into one zip archive
+
+    Configs can be added from any thread. The archive is written to a
+    temporary file beside path and only renamed to it by close, so an
+    interrupted batch never leaves half an archive in its place.
+
+    Args:
+        path (str): The archive to write
+        compresslevel (int): The zlib compression level, 1 to 9
+    """
+
+    def __init__(self, path=ARCHIVE_PATH, compresslevel=COMPRESS_LEVEL):
+        self.path = path
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, self._temp_name = tempfile.mkstemp(
+            dir=directory, prefix="." + os.path.basename(path), suffix=".tmp"
+        )
+        self._file = open(fd, "wb")
+        self._zip = zipfile.ZipFile(
+            self._file,
+            "w",
+            compression=zipfile.ZIP_DEFLATED,
+            compresslevel=compresslevel,
+        )
+        self._lock = threading.Lock()
+        # Content hash to where the config is stored, each only once
+        self._stored = {}
+        self._index = []
+
+    def add(self, network, filename, text):
+        """Add the config of one network
+
+        Args:
+            network (dict): The network as returned by getOrganizationNetworks
+            filename (str): The name the config is extracted under
+            text (str): The rendered config
+
+        Returns:
+            str: the sha256 hex digest of the config
+        """
+        data = text.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        member = f"configs/{digest}.conf"
+        with self._lock:
+            stored = self._stored.get(digest)
+            if stored is None:
+                with metrics.span("archive_write"):
+                    self._zip.writestr(member, data)
+                info = self._zip.getinfo(member)
+                header = LOCAL_HEADER_SIZE + len(info.filename) + len(info.extra)
+                stored = self._stored[digest] = {
+                    "member": member,
+                    "offset": info.header_offset + header,
+                    "compressed_size": info.compress_size,
+                    "size": info.file_size,
+                }
+            else:
+                metrics.count("archive_duplicates")
+            self._index.append(
+                {
+                    "network_id": network["id"],
+                    "name": network["name"],
+                    "filename": filename,
+                    "sha256": digest,
+                    **stored,
+                }
+            )
+        return digest
+
+    def close(self):
+        """Write the index and put the archive in place of any older one
+
+        Returns:
+            int: the number of distinct configs stored
+        """
+        with self._lock:
+            index = {
+                "networks": sorted(self._index, key=lambda x: x["name"]),
+                "configs": len(self._stored),
+            }
+            try:
+                self._zip.writestr(INDEX_NAME, json.dumps(index, indent=2))
+                self._zip.close()
+                with metrics.span("write"):
+                    self._file.flush()
+                    os.fsync(self._file.fileno())
+                self._file.close()
+                os.chmod(self._temp_name, 0o644)
+                os.replace(self._temp_name, self.path)
+            except BaseException:
+                self.abort()
+                raise
+        metrics.count("archive_configs", len(self._stored))
+        log.info(
+            f"Wrote {len(self._index)} networks to {self.path} as "
+            f"{len(self._stored)} distinct configs"
+        )
+        return len(self._stored)
+
+    def abort(self):
+        """Throw the archive away, leaving any older one in place"""
+        try:
+            self._zip.close()
+        except (OSError, ValueError):
+            pass
+        self._file.close()
+        if os.path.exists(self._temp_name):
+            os.remove(self._temp_name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def read_index(path):
+    """Return the index entry of every network in an archive"""
+    with zipfile.ZipFile(path) as archive:
+        return json.loads(archive.read(INDEX_NAME))["networks"]
+
+
+def read_config(path, network):
+    """Read the config of one network without unpacking the others
+
+    Args:
+        path (str): The archive
+        network (str): The network ID or name
+
+    Returns:
+        str: the config, or None when the network is not in the archive
+    """
+    with zipfile.ZipFile(path) as archive:
+        for entry in json.loads(archive.read(INDEX_NAME))["networks"]:
+            if network in (entry["network_id"], entry["name"]):
+                return archive.read(entry["member"]).decode("utf-8")
+    return None
@@ -0,0 +1,125 @@
+"""Follow an org's configuration change log to find the networks to refresh"""
+
+import json
+import logging
+from datetime import datetime, timezone
+
+from meraki_converter.common import fileops, manifest, metrics
+
+log = logging.getLogger(__name__)
+
+CURSOR_PATH = "output/configs/watch_cursor.json"
+
+
+def utc_now():
+    """The current time in the ISO 8601 form the dashboard uses"""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def change_key(change):
+    """A stable identity for a change, as the change log gives them no ID"""
+    return manifest.hash_json(change)[:16]
+
+
+class ChangeCursor:
+    """The newest change already handled, persisted between runs
+
+    The dashboard filters the change log by timestamp, so the cursor is the
+    timestamp of the newest change seen plus the keys of the changes at
+    exactly that timestamp, which the next poll returns again. The IDs of
+    networks that failed to convert are kept with it in pending, as the
+    cursor has already moved past the changes that named them.
+    """
+
+    def __init__(self, path=CURSOR_PATH, org_id=None):
+        self.path = path
+        self.org_id = org_id
+        self.t0 = None
+        self.seen = set()
+        self.pending = set()
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return
+        if data.get("org_id") == org_id:
+            self.t0 = data["t0"]
+            self.seen = set(data.get("seen", []))
+            self.pending = set(data.get("pending", []))
+        else:
+            log.warning(f"Ignoring the watch cursor of org {data.get('org_id')}")
+
+    def start(self, t0):
+        """Begin following the change log from t0"""
+        self.t0 = t0
+        self.seen = set()
+        self.pending.clear()
+
+    def advance(self, changes):
+        """Move past changes, returning only those not handled before
+
+        Args:
+            changes (list): Changes as returned by
+                getOrganizationConfigurationChanges since t0
+
+        Returns:
+            list: the changes that are new, oldest first
+        """
+        new = []
+        for change in sorted(changes, key=lambda x: x["ts"]):
+            key = change_key(change)
+            if self.t0 is not None and (
+                change["ts"] < self.t0 or (change["ts"] == self.t0 and key in self.seen)
+            ):
+                continue
+            new.append(change)
+            if self.t0 is None or change["ts"] > self.t0:
+                self.t0 = change["ts"]
+                self.seen = set()
+            self.seen.add(key)
+        return new
+
+    def save(self):
+        data = {
+            "org_id": self.org_id,
+            "t0": self.t0,
+            "seen": sorted(self.seen),
+            "pending": sorted(self.pending),
+        }
+        fileops.write_atomic(self.path, (json.dumps(data, indent=2),))
+
+
+def fetch_changes(dashboard, org, cursor):
+    """Return the configuration changes made since the cursor
+
+    Args:
+        dashboard (obj): The Meraki dashboard instance
+        org (str): The organization ID
+        cursor (ChangeCursor): Where the last poll stopped, advanced past
+            the returned changes
+
+    Returns:
+        list: the new changes, oldest first
+    """
+    with metrics.span("fetch_changes"):
+        changes = dashboard.organizations.getOrganizationConfigurationChanges(
+            org, total_pages="all", t0=cursor.t0
+        )
+    new = cursor.advance(changes)
+    metrics.count("config_changes", len(new))
+    return new
+
+
+def affected_network_ids(changes):
+    """Return the IDs of the networks that changes were made in
+
+    Org wide changes, such as to admins or licensing, carry no network and
+    do not affect any network's appliance config, so they are skipped.
+    """
+    network_ids = set()
+    for change in changes:
+        if change.get("networkId"):
+            network_ids.add(change["networkId"])
+        else:
+            log.debug(f"Skipping org wide change to {change.get('label')}")
+    return network_ids
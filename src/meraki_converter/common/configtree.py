@@ -0,0 +1,275 @@
+"""FortiOS configs as trees, and the minimal script between two of them
+
+A rendered config is read a line at a time into a tree of Nodes keyed by
+config path and edit ID. Two trees are compared block by block, and only
+the set, unset, edit and delete commands needed to turn the older config
+into the newer one are written out, so a device already running the older
+config only has to load what changed. A table only has to be purged when an
+"edit 0" entry is taken out of it, and the script says so where it does.
+"""
+
+import logging
+import os
+
+from meraki_converter.common import fileops, fortios, metrics
+
+log = logging.getLogger(__name__)
+
+# Where render_network_to_file writes the delta of each config it replaces
+DELTA_DIR = "output/configs/deltas"
+
+INDENT = "    "
+READ_SIZE = 1024 * 1024
+# Written above each purge, which the device applies to the whole table
+PURGE_WARNING = (
+    "# WARNING: purge deletes every entry in this table, all are re-added below"
+)
+
+
+class Node:
+    """One config or edit block, or the whole config at the root
+
+    settings maps each setting to its value as written. configs maps the
+    path of each nested config block, and entries the ID of each edit
+    block, to its Node. anonymous holds the "edit 0" blocks, which FortiOS
+    numbers itself and so can only be told apart by their content.
+    """
+
+    __slots__ = ("settings", "configs", "entries", "anonymous")
+
+    def __init__(self):
+        self.settings = {}
+        self.configs = {}
+        self.entries = {}
+        self.anonymous = []
+
+    def __eq__(self, other):
+        if not isinstance(other, Node):
+            return NotImplemented
+        return (
+            self.settings == other.settings
+            and self.configs == other.configs
+            and self.entries == other.entries
+            and self.anonymous == other.anonymous
+        )
+
+    __hash__ = None
+
+
+# Stands in for a block missing from one of the configs, never modified
+EMPTY = Node()
+
+
+class Builder:
+    """Builds the tree of a config fed to it a line at a time"""
+
+    def __init__(self):
+        self.root = Node()
+        self._stack = [self.root]
+        self._pending = ""
+        self._statement = None
+        self._quote = None
+
+    def feed(self, text):
+        """Add text, which may end part way through a line"""
+        lines = (self._pending + text).split("\n")
+        self._pending = lines.pop()
+        for line in lines:
+            self.add_line(line)
+
+    def tee(self, chunks):
+        """Pass rendered chunks through, adding each to the tree"""
+        for chunk in chunks:
+            self.feed(chunk)
+            yield chunk
+
+    def add_line(self, line):
+        if self._statement is None and '"' not in line and "'" not in line:
+            words = line.split(None, 2)
+            if words and words[0][0] != "#":
+                self._add(words)
+            return
+        line = line.rstrip("\r")
+        if self._statement is None:
+            words, self._quote = fortios.tokenize(line)
+            if self._quote is not None:
+                # A string spanning lines, kept whole as one value
+                self._statement = [line]
+                return
+        else:
+            self._quote = fortios.tokenize(line, self._quote)[1]
+            self._statement.append(line)
+            if self._quote is not None:
+                return
+            words = fortios.tokenize("\n".join(self._statement))[0]
+            self._statement = None
+        if words and not words[0].startswith("#"):
+            self._add(words[:2] + [" ".join(words[2:])] if words[2:] else words)
+
+    def _add(self, words):
+        command = words[0]
+        top = self._stack[-1]
+        if command == "set":
+            if len(words) > 2:
+                top.settings[words[1]] = words[2].rstrip()
+        elif command == "config":
+            path = " ".join(words[1:])
+            node = top.configs.get(path)
+            if node is None:
+                node = top.configs[path] = Node()
+            self._stack.append(node)
+        elif command == "edit":
+            name = " ".join(words[1:])
+            if name == "0":
+                node = Node()
+                top.anonymous.append(node)
+            else:
+                node = top.entries.get(name)
+                if node is None:
+                    node = top.entries[name] = Node()
+            self._stack.append(node)
+        elif command in ("next", "end"):
+            if len(self._stack) > 1:
+                self._stack.pop()
+        elif command == "unset" and len(words) > 1:
+            top.settings.pop(words[1], None)
+        elif command == "append" and len(words) > 2:
+            value = top.settings.get(words[1])
+            top.settings[words[1]] = f"{value} {words[2]}" if value else words[2]
+        else:
+            log.debug(f"Left {command} out of the config tree")
+
+    def close(self):
+        """Finish the config
+
+        Returns:
+            Node: the root of the tree
+        """
+        if self._pending:
+            self.add_line(self._pending)
+            self._pending = ""
+        return self.root
+
+
+def parse(text):
+    """Build the tree of a config held in a string"""
+    builder = Builder()
+    builder.feed(text)
+    return builder.close()
+
+
+def load(filename):
+    """Build the tree of a config file, reading it a line at a time
+
+    Returns:
+        Node: the root of the tree, or None when the file does not exist
+    """
+    builder = Builder()
+    try:
+        with open(filename, "r", encoding="utf-8") as file:
+            while chunk := file.read(READ_SIZE):
+                builder.feed(chunk)
+    except FileNotFoundError:
+        return None
+    return builder.close()
+
+
+def _diff_configs(old, new, depth):
+    indent = INDENT * depth
+    for path, node in new.items():
+        lines = list(_diff_block(old.get(path, EMPTY), node, depth + 1))
+        if lines:
+            yield f"{indent}config {path}"
+            yield from lines
+            yield f"{indent}end"
+    for path, node in old.items():
+        if path not in new:
+            lines = list(_diff_block(node, EMPTY, depth + 1))
+            if lines:
+                yield f"{indent}config {path}"
+                yield from lines
+                yield f"{indent}end"
+
+
+def _edit(name, old, new, depth):
+    lines = list(_diff_block(old, new, depth + 1))
+    # A new entry is created even when it has nothing set
+    if lines or old is EMPTY:
+        yield f"{INDENT * depth}edit {name}"
+        yield from lines
+        yield f"{INDENT * depth}next"
+
+
+def _diff_block(old, new, depth):
+    indent = INDENT * depth
+    for name in old.settings:
+        if name not in new.settings:
+            yield f"{indent}unset {name}"
+    for name, value in new.settings.items():
+        if old.settings.get(name) != value:
+            yield f"{indent}set {name} {value}"
+    yield from _diff_configs(old.configs, new.configs, depth)
+
+    old_entries = old.entries
+    # Numbered by the device, so matched by content and only the new ones
+    # appended, whatever their order
+    added = list(new.anonymous)
+    removed = False
+    for node in old.anonymous:
+        if node in added:
+            added.remove(node)
+        else:
+            removed = True
+    if removed:
+        # An entry without an ID cannot be deleted on its own. purge clears
+        # the whole table, named entries included, so everything is re-added.
+        yield f"{indent}{PURGE_WARNING}"
+        yield f"{indent}purge"
+        old_entries = {}
+        added = new.anonymous
+    for name in old_entries:
+        if name not in new.entries:
+            yield f"{indent}delete {name}"
+    for name, node in new.entries.items():
+        yield from _edit(name, old_entries.get(name, EMPTY), node, depth)
+    for node in added:
+        yield from _edit("0", EMPTY, node, depth)
+
+
+def diff(old, new):
+    """Work out the script that turns one config into another
+
+    Settings and entries are compared by name, and "edit 0" entries by
+    content, so a change to the order of entries alone, such as of firewall
+    policies, is not in the script.
+
+    Args:
+        old (Node): The tree of the config on the device
+        new (Node): The tree of the config it should become
+
+    Returns:
+        list: the lines of the script, empty when the configs are the same
+    """
+    return list(_diff_block(old, new, 0))
+
+
+def write_delta(filename, old, new):
+    """Write the script that turns one config into another
+
+    Args:
+        filename (str): The path of the script to write
+        old (Node): The tree of the config being replaced
+        new (Node): The tree of the config replacing it
+
+    Returns:
+        int: the number of lines in the script
+    """
+    with metrics.span("delta"):
+        lines = diff(old, new)
+        os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+        fileops.write_atomic(filename, (line + "\n" for line in lines))
+    metrics.count("delta_lines", len(lines))
+    purges = sum(1 for line in lines if line.strip() == "purge")
+    if purges:
+        log.warning(f"{filename} purges {purges} tables and re-adds their entries")
+    return len(lines)
@@ -0,0 +1,309 @@
+"""Find addressing conflicts in VLANs before they are rendered
+
+FortiOS rejects a DHCP server whose exclude ranges overlap, more than 16
+exclude ranges, or a reserved address inside an exclude range, and a
+config with overlapping VLAN subnets routes traffic to the wrong one.
+Everything is checked on integer ranges sorted once, so a network with
+thousands of reservations or an org with thousands of networks is checked
+in O(n log n) rather than pair by pair.
+"""
+
+import collections
+import threading
+from bisect import bisect_left, bisect_right
+
+from meraki_converter.common import subnets
+
+MAX_RESERVATIONS = 16
+
+ERROR = "error"
+WARNING = "warning"
+
+Conflict = collections.namedtuple(
+    "Conflict",
+    ["kind", "severity", "network_id", "vlan_id", "other", "start", "end", "message"],
+)
+Conflict.__doc__ = """One addressing problem, as reported before rendering
+
+kind names the check that found it. other identifies what it conflicts
+with, a VLAN ID or a (network ID, VLAN ID) pair for VLANs in another
+network, and start and end are the addresses in conflict.
+"""
+
+
+class ConflictError(ValueError):
+    """Raised for a network with conflicts that FortiOS would reject"""
+
+    def __init__(self, conflicts):
+        self.conflicts = conflicts
+        super().__init__(
+            f"{len(conflicts)} addressing conflicts: "
+            + "; ".join(conflict.message for conflict in conflicts)
+        )
+
+
+def nested_blocks(blocks):
+    """Find every CIDR block that lies inside another
+
+    CIDR blocks either nest or do not overlap at all, so sorted by start,
+    widest first, each block only has to be compared with the innermost
+    block still open when it starts.
+
+    Args:
+        blocks (iterable): (first, last, owner) integer address ranges
+
+    Returns:
+        list: (block, enclosing block) pairs
+    """
+    nested = []
+    enclosing = []
+    for block in sorted(blocks, key=lambda x: (x[0], -x[1])):
+        while enclosing and enclosing[-1][1] < block[0]:
+            enclosing.pop()
+        if enclosing:
+            nested.append((block, enclosing[-1]))
+        enclosing.append(block)
+    return nested
+
+
+def overlapping_ranges(ranges):
+    """Find every range that overlaps one starting at or before it
+
+    Args:
+        ranges (iterable): (first, last, owner) integer address ranges
+
+    Returns:
+        list: (range, earlier range) pairs, the earlier range being the one
+            that reaches furthest
+    """
+    overlaps = []
+    furthest = None
+    for current in sorted(ranges, key=lambda x: (x[0], x[1])):
+        if furthest is not None and current[0] <= furthest[1]:
+            overlaps.append((current, furthest))
+        if furthest is None or current[1] > furthest[1]:
+            furthest = current
+    return overlaps
+
+
+def _address(value):
+    return subnets.int_to_ip(value)
+
+
+def check_vlan(vlan, network_id=None):
+    """Check one VLAN's reservations and fixed IPs against its subnet
+
+    Args:
+        vlan (dict): The VLAN as returned by getNetworkApplianceVlans
+        network_id (str): The network, for the report
+
+    Returns:
+        list: the Conflicts found
+    """
+    found = []
+    vlan_id = vlan["id"]
+
+    def conflict(kind, other, first, last, message):
+        found.append(
+            Conflict(
+                kind,
+                ERROR,
+                network_id,
+                vlan_id,
+                other,
+                _address(first),
+                _address(last),
+                f"VLAN {vlan_id}: {message}",
+            )
+        )
+
+    network, prefix = subnets.parse_subnet(vlan["subnet"])
+    broadcast = network | subnets.HOSTMASKS[prefix]
+    reserved = vlan.get("reservedIpRanges") or ()
+    if len(reserved) > MAX_RESERVATIONS:
+        first = subnets.ip_to_int(reserved[MAX_RESERVATIONS]["start"])
+        last = subnets.ip_to_int(reserved[-1]["end"])
+        conflict(
+            "too_many_reservations",
+            None,
+            first,
+            last,
+            f"{len(reserved)} reserved ranges, FortiOS allows {MAX_RESERVATIONS}",
+        )
+    ranges = []
+    for position, reservation in enumerate(reserved):
+        first = subnets.ip_to_int(reservation["start"])
+        last = subnets.ip_to_int(reservation["end"])
+        label = reservation.get("comment") or f"reservation {position + 1}"
+        if first > last:
+            conflict(
+                "reservation_reversed",
+                label,
+                first,
+                last,
+                f"{label} ends before it starts",
+            )
+            first, last = last, first
+        if first <= network or last >= broadcast:
+            conflict(
+                "reservation_outside_subnet",
+                label,
+                first,
+                last,
+                f"{label} is not inside {vlan['subnet']}",
+            )
+        ranges.append((first, last, label))
+    for current, earlier in overlapping_ranges(ranges):
+        conflict(
+            "reservation_overlap",
+            earlier[2],
+            current[0],
+            min(current[1], earlier[1]),
+            f"{current[2]} overlaps {earlier[2]}",
+        )
+
+    assignments = vlan.get("fixedIpAssignments") or {}
+    if not assignments:
+        return found
+    macs = list(assignments)
+    ips = [client["ip"] for client in assignments.values()]
+    addresses = subnets.ips_to_ints(ips)
+    # Each check first looks at all the clients at once, as nearly every VLAN
+    # passes them
+    if min(addresses) <= network or max(addresses) >= broadcast:
+        for mac, ip, address in zip(macs, ips, addresses):
+            if address <= network or address >= broadcast:
+                conflict(
+                    "fixed_ip_outside_subnet",
+                    mac,
+                    address,
+                    address,
+                    f"fixed IP {ip} of {mac} is not inside {vlan['subnet']}",
+                )
+    if ranges:
+        # Few reserved ranges and many clients, so each range looks for the
+        # clients inside it among the sorted addresses
+        order = sorted(range(len(addresses)), key=addresses.__getitem__)
+        ordered = [addresses[position] for position in order]
+        for first, last, label in ranges:
+            low = bisect_left(ordered, first)
+            high = bisect_right(ordered, last)
+            for position in order[low:high]:
+                conflict(
+                    "fixed_ip_reserved",
+                    macs[position],
+                    addresses[position],
+                    addresses[position],
+                    f"fixed IP {ips[position]} of {macs[position]} is in {label}",
+                )
+    if len(set(addresses)) < len(addresses):
+        owners = {}
+        for mac, ip, address in zip(macs, ips, addresses):
+            if address in owners:
+                conflict(
+                    "duplicate_fixed_ip",
+                    owners[address],
+                    address,
+                    address,
+                    f"fixed IP {ip} is given to {owners[address]} and {mac}",
+                )
+            else:
+                owners[address] = mac
+    return found
+
+
+def vlan_blocks(vlans, network_id=None):
+    """The subnet of each VLAN as a (first, last, owner) integer range"""
+    blocks = []
+    for vlan in vlans:
+        network, prefix = subnets.parse_subnet(vlan["subnet"])
+        blocks.append(
+            (network, network | subnets.HOSTMASKS[prefix], (network_id, vlan["id"]))
+        )
+    return blocks
+
+
+def check_network(vlans, network_id=None, blocks=None):
+    """Check the VLANs of one network, each on its own and against each other
+
+    Args:
+        vlans (list): The VLANs as returned by getNetworkApplianceVlans
+        network_id (str): The network, for the report
+        blocks (list): The vlan_blocks of the VLANs, if already worked out
+
+    Returns:
+        list: the Conflicts found, all of them errors
+    """
+    found = []
+    for vlan in vlans:
+        found.extend(check_vlan(vlan, network_id))
+    if blocks is None:
+        blocks = vlan_blocks(vlans, network_id)
+    for block, enclosing in nested_blocks(blocks):
+        found.append(
+            Conflict(
+                "subnet_overlap",
+                ERROR,
+                network_id,
+                block[2][1],
+                enclosing[2][1],
+                _address(block[0]),
+                _address(block[1]),
+                f"VLAN {block[2][1]} overlaps the subnet of VLAN {enclosing[2][1]}",
+            )
+        )
+    return found
+
+
+class OrgChecker:
+    """Checks the networks of an org as they are converted
+
+    Networks can be added from any thread. Only their subnets, as integers,
+    and the conflicts found are kept, to compare subnets across networks
+    once all of them have been added.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._blocks = []
+        self._found = []
+
+    def add(self, network_id, vlans):
+        """Check a network and keep its subnets
+
+        Returns:
+            list: the network's own Conflicts, as check_network
+        """
+        blocks = vlan_blocks(vlans, network_id)
+        found = check_network(vlans, network_id, blocks)
+        with self._lock:
+            self._blocks.extend(blocks)
+            self._found.extend(found)
+        return found
+
+    def conflicts(self):
+        """Return the conflicts of every network added and between them
+
+        A subnet used by more than one network is a warning, as networks
+        that are not joined by VPN may reuse subnets on purpose.
+        """
+        with self._lock:
+            blocks = list(self._blocks)
+            found = list(self._found)
+        for block, enclosing in nested_blocks(blocks):
+            if block[2][0] == enclosing[2][0]:
+                continue
+            found.append(
+                Conflict(
+                    "subnet_overlap",
+                    WARNING,
+                    block[2][0],
+                    block[2][1],
+                    enclosing[2],
+                    _address(block[0]),
+                    _address(block[1]),
+                    f"VLAN {block[2][1]} of {block[2][0]} overlaps VLAN "
+                    f"{enclosing[2][1]} of {enclosing[2][0]}",
+                )
+            )
+        return found
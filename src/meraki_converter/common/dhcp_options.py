@@ -0,0 +1,118 @@
+"""Translate Meraki DHCP options into Fortigate DHCP server options"""
+
+import collections
+import functools
+import logging
+
+from meraki_converter.common import fileops
+
+log = logging.getLogger(__name__)
+
+# Byte width of integer options, anything else is sent as 4 bytes
+INTEGER_SIZES = {
+    "19": 1,
+    "20": 1,
+    "23": 1,
+    "26": 2,
+    "37": 1,
+    "39": 1,
+    "46": 1,
+    "52": 1,
+    "57": 2,
+}
+
+# Codes with no Fortigate equivalent that are dropped
+IGNORED_CODES = {"115"}
+
+Option = collections.namedtuple("Option", ["code", "type", "value"])
+Option.__doc__ = """A DHCP option the templates render by its code and type"""
+
+
+def format_domain(value):
+    try:
+        fileops.validate_domain(value)
+    except ValueError:
+        return "Error"
+    return value
+
+
+def format_string(value):
+    """Escape a text value to go between double quotes"""
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def format_ip_list(value):
+    return " ".join(ip.strip() for ip in value.split(",") if ip.strip())
+
+
+def format_hex_words(value):
+    """Group colon separated hex bytes into two byte words: f1:04:0a -> f104:0a"""
+    octets = value.split(":")
+    return ":".join("".join(octets[pos:pos + 2]) for pos in range(0, len(octets), 2))
+
+
+def format_hex(value):
+    return value.replace(":", "").lower()
+
+
+def format_integer(code, value):
+    size = INTEGER_SIZES.get(code, 4)
+    return int(value).to_bytes(size, "big", signed=int(value) < 0).hex()
+
+
+# Options the templates render with their own keys, by (code, type)
+NAMED_OPTIONS = {
+    ("15", "text"): ("code_15_text", format_domain),
+    ("43", "hex"): ("code_43_hex", format_hex_words),
+    ("78", "ip"): ("code_78_ip", format_ip_list),
+    ("79", "text"): ("code_79_text", format_string),
+    ("85", "ip"): ("code_85_ip", format_ip_list),
+    ("150", "ip"): ("code_150_ip", format_ip_list),
+}
+
+# Any other option, by Meraki type: the Fortigate type and value formatter
+GENERIC_OPTIONS = {
+    "text": ("string", lambda code, value: format_string(value)),
+    "ip": ("ip", lambda code, value: format_ip_list(value)),
+    "hex": ("hex", lambda code, value: format_hex(value)),
+    "integer": ("hex", format_integer),
+}
+
+
+@functools.lru_cache(maxsize=4096)
+def _translate(options):
+    all_options = {key: "" for key, _ in NAMED_OPTIONS.values()}
+    extra = []
+    for code, option_type, value in options:
+        named = NAMED_OPTIONS.get((code, option_type))
+        if named:
+            key, formatter = named
+            all_options[key] = formatter(value)
+        elif code in IGNORED_CODES:
+            continue
+        elif option_type in GENERIC_OPTIONS:
+            forti_type, formatter = GENERIC_OPTIONS[option_type]
+            extra.append(Option(code, forti_type, formatter(code, value)))
+        else:
+            raise TypeError("Undefined DHCP option type provided")
+    all_options["extra"] = tuple(extra)
+    return all_options
+
+
+def parse_dhcp_options(options):
+    """For each Meraki DHCP option, format to Fortigate options
+
+    Options the templates know by name are returned under their own key,
+    every other code is returned as an Option in the extra tuple. Results
+    are memoized since the same option sets repeat across VLANs and
+    networks, so everything in them is immutable and only the dict is
+    copied.
+
+    Args:
+        options (list): The dhcpOptions of a VLAN
+
+    Returns:
+        dict: the formatted options
+    """
+    key = tuple((str(o["code"]), o["type"], str(o["value"])) for o in options)
+    return dict(_translate(key))
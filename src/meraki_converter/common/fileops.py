@@ -5,10 +5,18 @@ import logging
 import os
 import platform
 import sys
+import tempfile
 from datetime import datetime
 import re
 
-import tomlkit
+from meraki_converter.common import metrics, settingsops
+
+# Characters a network name may keep in its file name, the rest become "_"
+UNSAFE_FILENAME = re.compile(r"[^\w .()+,=@-]")
+RESERVED_FILENAMES = {"CON", "PRN", "AUX", "NUL"} | {
+    f"{device}{number}" for device in ("COM", "LPT") for number in range(1, 10)
+}
+MAX_FILENAME = 200
 
 
 def load_file(filename, rtype="readlines"):
@@ -35,6 +43,8 @@ def load_file(filename, rtype="readlines"):
             elif rtype == "json":
                 return json.load(file)
             elif rtype == "toml":
+                import tomlkit
+
                 return tomlkit.load(file)
             else:
                 sys.exit(
@@ -44,15 +54,77 @@ def load_file(filename, rtype="readlines"):
         sys.exit(f"Could not find file {filename}")
 
 
+def safe_filename(name, unique=None):
+    """Turn a network name into a file name that works on any OS
+
+    Path separators and other unsafe characters become underscores, and
+    leading dots and trailing dots and spaces are dropped. A name that had
+    to change gets unique appended, so it cannot take the file of another
+    network that really has the changed name.
+
+    Args:
+        name (str): The network name
+        unique (str): Appended to a name that had to change, such as the
+            network ID
+
+    Returns:
+        str: the file name, without an extension
+    """
+    safe = UNSAFE_FILENAME.sub("_", name).lstrip(". ").rstrip(". ")[:MAX_FILENAME]
+    reserved = safe.split(".")[0].upper() in RESERVED_FILENAMES
+    if safe and safe == name and not reserved:
+        return safe
+    safe = safe or "_"
+    return f"{safe}_{unique}" if unique else f"{safe}_"
+
+
 def writelines_to_file(filename, filedata):
     # Write text to given path
+    if isinstance(filedata, str):
+        filedata = (filedata,)
     try:
-        with open(filename, "w", encoding="utf-8") as file_data:
-            file_data.writelines(filedata)
+        write_atomic(filename, filedata)
     except FileNotFoundError:
         sys.exit("Error opening file")
 
 
+def write_atomic(filename, chunks, buffer_size=1024 * 1024):
+    """Stream text to a file without ever leaving it half written
+
+    The chunks go through a large write buffer into a temporary file in the
+    same directory, which is renamed over filename once everything has been
+    flushed to disk. A crash leaves either the old file or the new one.
+
+    Args:
+        filename (str): The path of the file to write
+        chunks (iterable): The strings to write, in order
+        buffer_size (int): The size of the write buffer in bytes
+
+    Returns:
+        int: the number of bytes written
+    """
+    directory = os.path.dirname(filename) or "."
+    fd, temp_name = tempfile.mkstemp(
+        dir=directory, prefix="." + os.path.basename(filename), suffix=".tmp"
+    )
+    try:
+        with open(fd, "w", encoding="utf-8", buffering=buffer_size) as file:
+            for chunk in chunks:
+                file.write(chunk)
+            # Small configs sit in the buffer until here, so this is the disk I/O
+            with metrics.span("write"):
+                file.flush()
+                os.fsync(file.fileno())
+                written = file.buffer.tell()
+        os.chmod(temp_name, 0o644)
+        os.replace(temp_name, filename)
+    except BaseException:
+        os.remove(temp_name)
+        raise
+    metrics.count("bytes_written", written)
+    return written
+
+
 def append_to_file(filename, filedata):
     # Write text to given path
     try:
@@ -97,7 +169,11 @@ def colorme(msg, color):
 
 
 def load_settings(settings_path="input/settings.toml", required_keys=[]):
-    settings = load_file(settings_path, "toml")
+    # Parsed once and reused until the file changes, do not modify the result
+    try:
+        settings = settingsops.load_toml(settings_path)
+    except FileNotFoundError:
+        sys.exit(f"Could not find file {settings_path}")
     # Make sure the needed keys are there
     for key in required_keys:
         if key not in settings:
@@ -122,9 +198,12 @@ def setup_logging(script_name):
     )
 
 
+DOMAIN_LABEL = re.compile("[a-zA-Z0-9][a-zA-Z0-9-]{0,60}[a-zA-Z0-9]")
+
+
 def validate_domain(name):
     labels = name.split(".")
     for label in labels:
-        if not re.match("^[a-zA-Z0-9][a-zA-Z0-9-]{0,60}[a-zA-Z0-9]$", label):
+        if not DOMAIN_LABEL.fullmatch(label):
             raise ValueError("Invalid domain name provided")
     return True
@@ -0,0 +1,337 @@
+"""Single pass structural checks of rendered FortiOS configs
+
+Configs are read a line at a time, keeping only the stack of open config
+and edit blocks and the edit IDs seen in each, so a config is never held
+in memory whole. Whole directories are checked on a process pool, one
+file per task.
+"""
+
+import collections
+import concurrent.futures
+import glob
+import logging
+import os
+import re
+
+log = logging.getLogger(__name__)
+
+ERROR = "error"
+WARNING = "warning"
+
+# Commands allowed inside a config or edit block
+COMMANDS = {
+    "set",
+    "unset",
+    "append",
+    "select",
+    "unselect",
+    "purge",
+    "delete",
+    "rename",
+    "move",
+    "clone",
+    "abort",
+}
+# Left in rendered output by a helper that could not convert a value
+PLACEHOLDERS = {"Error", "None"}
+
+Issue = collections.namedtuple("Issue", ["path", "line", "severity", "message"])
+Issue.__doc__ = """A problem found in a config, at a 1-based line number"""
+
+
+class ConfigError(ValueError):
+    """Raised for a rendered config that FortiOS would not load"""
+
+    def __init__(self, issues):
+        self.issues = issues
+        super().__init__(
+            f"{len(issues)} config errors: "
+            + "; ".join(f"line {issue.line}: {issue.message}" for issue in issues)
+        )
+
+
+# A word, which may hold quoted strings, on a line with every quote closed
+_WORD = re.compile(r"""(?:[^\s"]|"[^"]*")+""")
+
+
+def tokenize(line, quote=None):
+    """Split a line into words, keeping quoted strings together
+
+    Args:
+        line (str): The line, without its newline
+        quote (str): The quote character of a string left open by the
+            previous line, if any
+
+    Returns:
+        tuple: the words and the quote character still open at the end of
+            the line, or None
+    """
+    if (
+        quote is None
+        and line.count('"') % 2 == 0
+        and "'" not in line
+        and "\\" not in line
+    ):
+        return _WORD.findall(line), None
+    words = []
+    word = []
+    position = 0
+    quoted = quote is not None
+    while position < len(line):
+        char = line[position]
+        if quote:
+            if char == "\\" and position + 1 < len(line):
+                word.append(line[position:position + 2])
+                position += 2
+                continue
+            word.append(char)
+            if char == quote:
+                quote = None
+        elif char in "\"'":
+            quote = char
+            quoted = True
+            word.append(char)
+        elif char in " \t":
+            if word or quoted:
+                words.append("".join(word))
+                word = []
+                quoted = False
+        else:
+            word.append(char)
+        position += 1
+    if word or quoted:
+        words.append("".join(word))
+    return words, quote
+
+
+class Checker:
+    """Checks a config fed to it a line at a time
+
+    Args:
+        path (str): The name the issues are reported under
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.issues = []
+        self.line = 0
+        # Open blocks as [kind, name, line, edit IDs seen] lists
+        self._stack = []
+        self._statement = None
+        self._quote = None
+        self._pending = ""
+
+    def _report(self, severity, message, line=None):
+        self.issues.append(Issue(self.path, line or self.line, severity, message))
+
+    def feed(self, text):
+        """Check text, which may end part way through a line"""
+        lines = (self._pending + text).split("\n")
+        self._pending = lines.pop()
+        for line in lines:
+            self.check_line(line)
+
+    def check_line(self, line):
+        self.line += 1
+        if self._statement is None and '"' not in line and "'" not in line:
+            # Nearly every line, split without looking at each character
+            words = line.split(None, 2)
+            if words and words[0][0] != "#":
+                self._check_statement(self.line, words)
+            return
+        words, self._quote = tokenize(line.rstrip("\r"), self._quote)
+        if self._statement is not None:
+            # The rest of a quoted string that spans lines
+            self._statement[1].extend(words)
+            if self._quote is None:
+                self._check_statement(*self._statement)
+                self._statement = None
+            return
+        if not words or words[0].startswith("#"):
+            return
+        if self._quote is not None:
+            self._statement = (self.line, words)
+            return
+        self._check_statement(self.line, words)
+
+    def _check_statement(self, line, words):
+        """Check a statement split into its command, first argument and rest"""
+        command = words[0]
+        top = self._stack[-1] if self._stack else None
+        if command == "set":
+            if top is None:
+                self._report(ERROR, "set outside a config block", line)
+            self._check_set(line, words[1:])
+        elif command == "config":
+            if len(words) < 2:
+                self._report(ERROR, "config without a path", line)
+            self._stack.append(["config", " ".join(words[1:]), line, set()])
+        elif command == "edit":
+            name = " ".join(words[1:])
+            if top is None or top[0] != "config":
+                self._report(ERROR, "edit outside a config block", line)
+                self._stack.append(["edit", name, line, set()])
+                return
+            if not name:
+                self._report(ERROR, "edit without an ID", line)
+            # edit 0 takes the next free ID, so it may be repeated
+            if name in top[3] and name != "0":
+                self._report(ERROR, f"duplicate edit {name} in config {top[1]}", line)
+            top[3].add(name)
+            self._stack.append(["edit", name, line, set()])
+        elif command == "next":
+            if top is None or top[0] != "edit":
+                where = f"config {top[1]}" if top else "the top level"
+                self._report(ERROR, f"next in {where} without an edit", line)
+                return
+            self._stack.pop()
+        elif command == "end":
+            if top is None:
+                self._report(ERROR, "end without a config", line)
+                return
+            if top[0] == "edit":
+                self._report(
+                    ERROR, f"edit {top[1]} from line {top[2]} has no next", line
+                )
+                self._stack.pop()
+                if not self._stack:
+                    return
+            self._stack.pop()
+        elif command in COMMANDS:
+            if top is None:
+                self._report(ERROR, f"{command} outside a config block", line)
+        else:
+            self._report(ERROR, f"unknown command {command}", line)
+
+    def _check_set(self, line, arguments):
+        if not arguments:
+            self._report(ERROR, "set without a setting", line)
+            return
+        setting = arguments[0]
+        if len(arguments) == 1:
+            self._report(ERROR, f"set {setting} has no value", line)
+            return
+        values = arguments[1:]
+        if len(values) == 1:
+            value = values[0]
+            if '"' not in value and "'" not in value and " " not in value:
+                # One plain word, the usual case
+                if value in PLACEHOLDERS:
+                    self._report(
+                        ERROR, f"set {setting} has placeholder {value}", line
+                    )
+                return
+            values = tokenize(value)[0]
+        if all(value in ('""', "''") for value in values):
+            self._report(WARNING, f"set {setting} is empty", line)
+        for value in values:
+            if value.strip("\"'") in PLACEHOLDERS:
+                self._report(ERROR, f"set {setting} has placeholder {value}", line)
+
+    def close(self):
+        """Finish the config, reporting the blocks left open
+
+        Returns:
+            list: every Issue found, in line order
+        """
+        if self._pending:
+            self.check_line(self._pending)
+            self._pending = ""
+        if self._statement is not None:
+            self._report(ERROR, "quoted string never closed", self._statement[0])
+            self._statement = None
+        for kind, name, line, _ in reversed(self._stack):
+            closer = "next" if kind == "edit" else "end"
+            self._report(ERROR, f"{kind} {name} is never closed by {closer}", line)
+        self._stack = []
+        self.issues.sort(key=lambda issue: issue.line)
+        return self.issues
+
+
+def errors(issues):
+    """The issues that would stop FortiOS loading the config"""
+    return [issue for issue in issues if issue.severity == ERROR]
+
+
+def checked(chunks, path=None):
+    """Pass rendered chunks through while checking them
+
+    Args:
+        chunks (iterable): The rendered text
+        path (str): The name the issues are reported under
+
+    Yields:
+        str: the chunks, unchanged
+
+    Raises:
+        ConfigError: after the last chunk, when the config has errors, so
+            fileops.write_atomic leaves the old file in place
+    """
+    checker = Checker(path)
+    for chunk in chunks:
+        checker.feed(chunk)
+        yield chunk
+    _finish(checker)
+
+
+def check_text(text, path=None):
+    """Check a whole config held in a string
+
+    Raises:
+        ConfigError: when the config has errors
+    """
+    checker = Checker(path)
+    checker.feed(text)
+    _finish(checker)
+
+
+def _finish(checker):
+    issues = checker.close()
+    for issue in issues:
+        if issue.severity == WARNING:
+            log.warning(f"{checker.path}:{issue.line}: {issue.message}")
+    if errors(issues):
+        raise ConfigError(errors(issues))
+
+
+def check_file(path):
+    """Check a config file without reading all of it into memory
+
+    Returns:
+        list: the Issues found
+    """
+    checker = Checker(path)
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            checker.check_line(line.rstrip("\n"))
+    return checker.close()
+
+
+def check_files(paths, workers=None):
+    """Check many config files at once on a process pool
+
+    Args:
+        paths (iterable): The config files
+        workers (int): The number of processes, defaults to the CPU count
+
+    Returns:
+        dict: each path to its Issues, in the order given
+    """
+    paths = list(paths)
+    if len(paths) < 2 or workers == 1:
+        return {path: check_file(path) for path in paths}
+    workers = min(workers or os.cpu_count() or 1, len(paths))
+    chunksize = max(1, len(paths) // (workers * 4))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        return dict(zip(paths, pool.map(check_file, paths, chunksize=chunksize)))
+
+
+def config_files(paths):
+    """Expand directories to the .conf files in them, sorted"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "*.conf"))))
+        else:
+            files.append(path)
+    return files
@@ -0,0 +1,102 @@
+"""Org wide prefetch of the appliances in every network
+
+getNetworkApplianceWarmSpare needs one request per network. The org
+device list and appliance uplink statuses cover every network in a few
+paged requests, and together give the serials, models and HA pairing of
+each network's MX.
+"""
+
+import collections
+import logging
+
+from meraki_converter.common import metrics
+
+log = logging.getLogger(__name__)
+
+
+class Appliance(
+    collections.namedtuple(
+        "Appliance",
+        ["network_id", "serial", "model", "name", "spare_serial", "spare_model"],
+        defaults=[None, None],
+    )
+):
+    """The MX of one network and its warm spare, if it has one"""
+
+    __slots__ = ()
+
+    def to_config(self):
+        """The appliance details under the keys the templates can use"""
+        return {
+            "mx_serial": self.serial,
+            "mx_model": self.model or "",
+            "mx_spare_serial": self.spare_serial or "",
+        }
+
+
+def index_appliances(devices, uplink_statuses):
+    """Pair up the appliances of each network
+
+    Args:
+        devices (list): Appliances as returned by getOrganizationDevices
+        uplink_statuses (list): As returned by
+            getOrganizationApplianceUplinkStatuses, for the HA roles
+
+    Returns:
+        dict: network ID to its Appliance
+    """
+    roles = {
+        status["serial"]: (status.get("highAvailability") or {}).get("role")
+        for status in uplink_statuses
+    }
+    primaries = {}
+    spares = {}
+    # Sort by serial so an org with unpaired duplicates indexes the same way
+    for device in sorted(devices, key=lambda x: x["serial"]):
+        net_id = device.get("networkId")
+        if not net_id:
+            continue
+        if roles.get(device["serial"]) == "spare":
+            spares.setdefault(net_id, device)
+        else:
+            primaries.setdefault(net_id, device)
+    # A network whose only appliance is marked spare still has an appliance
+    for net_id, device in spares.items():
+        if net_id not in primaries:
+            primaries[net_id] = device
+    index = {}
+    for net_id, device in primaries.items():
+        spare = spares.get(net_id)
+        if spare is device:
+            spare = None
+        index[net_id] = Appliance(
+            net_id,
+            device["serial"],
+            device.get("model"),
+            device.get("name"),
+            spare["serial"] if spare else None,
+            spare.get("model") if spare else None,
+        )
+    return index
+
+
+def prefetch_appliances(dashboard, org):
+    """Fetch the appliances of every network in an org in a few paged calls
+
+    Args:
+        dashboard (obj): The Meraki dashboard instance
+        org (str): The organization ID
+
+    Returns:
+        dict: network ID to its Appliance
+    """
+    with metrics.span("prefetch_appliances"):
+        devices = dashboard.organizations.getOrganizationDevices(
+            org, total_pages="all", productTypes=["appliance"]
+        )
+        uplink_statuses = dashboard.appliance.getOrganizationApplianceUplinkStatuses(
+            org, total_pages="all"
+        )
+        index = index_appliances(devices, uplink_statuses)
+    log.info(f"Prefetched {len(devices)} appliances in {len(index)} networks")
+    return index
@@ -0,0 +1,163 @@
+"""Durable per-network journal that lets an interrupted batch run resume
+
+Every finished network is appended to the journal as one JSON line and
+flushed to disk before the next is recorded. A run of the same job that
+finds an unfinished journal skips the networks it lists as done, without
+fetching or rendering them again, and retries the ones that failed.
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+from datetime import datetime
+
+from meraki_converter.common import fileops, manifest
+
+log = logging.getLogger(__name__)
+
+JOURNAL_PATH = "output/configs/batch_journal.jsonl"
+
+DONE = "done"
+FAILED = "failed"
+
+
+def job_key(jobs):
+    """A short hash identifying a job, so a journal is only resumed by it"""
+    return manifest.hash_json(jobs)[:16]
+
+
+def load_job(filename):
+    """Load a job file listing the orgs, and optionally networks, to convert
+
+    Args:
+        filename (str): A TOML file with an [[org]] table per organization,
+            holding its org_id and optionally settings, name, tag, regex
+            and a networks list of network IDs
+
+    Returns:
+        list: a dict per org with every key set, None when not given
+    """
+    data = fileops.load_file(filename, "toml").unwrap()
+    jobs = []
+    for org in data.get("org", []):
+        if "org_id" not in org:
+            sys.exit(f"An [[org]] in {filename} has no org_id")
+        jobs.append(
+            {
+                "org_id": str(org["org_id"]),
+                "settings": org.get("settings"),
+                "name": org.get("name"),
+                "tag": org.get("tag"),
+                "regex": org.get("regex"),
+                "networks": (
+                    [str(net_id) for net_id in org["networks"]]
+                    if "networks" in org
+                    else None
+                ),
+            }
+        )
+    if not jobs:
+        sys.exit(f"{filename} does not list any [[org]]")
+    return jobs
+
+
+class Journal:
+    """Append-only record of each network's outcome in a batch job
+
+    Args:
+        path (str): The journal file
+        job (str): The job_key of the run, a journal of another job or of a
+            run that completed is started over
+        restart (bool): Start over even when the journal could be resumed
+    """
+
+    def __init__(self, path=JOURNAL_PATH, job=None, restart=False):
+        self.path = path
+        self.job = job
+        self.networks = {}
+        self._lock = threading.Lock()
+        entries = [] if restart else self._read()
+        header = entries[0] if entries else {}
+        if (
+            header.get("job") == job
+            and not entries[-1].get("complete")
+            and len(entries) > 1
+        ):
+            for entry in entries[1:]:
+                self.networks[entry["network_id"]] = entry
+            done = sum(
+                1 for entry in self.networks.values() if entry["status"] == DONE
+            )
+            log.info(f"Resuming batch journal {path} with {done} networks done")
+        else:
+            entries = [{"job": job, "started": datetime.now().isoformat()}]
+        # Rewritten so a line torn by a crash is not appended to
+        fileops.write_atomic(path, (json.dumps(entry) + "\n" for entry in entries))
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _read(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                lines = file.readlines()
+        except FileNotFoundError:
+            return []
+        entries = []
+        for line in lines:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                log.warning(f"Dropping a damaged line of the journal {self.path}")
+        return entries
+
+    def is_done(self, network_id):
+        """Whether a network was converted by an earlier run of the job
+
+        A network whose config file has since been removed is not done.
+        """
+        entry = self.networks.get(network_id)
+        return (
+            entry is not None
+            and entry["status"] == DONE
+            and os.path.exists(entry["filename"])
+        )
+
+    def _append(self, entry):
+        with self._lock:
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def record(self, network, status, filename=None, error=None):
+        """Durably record the outcome of one network
+
+        Args:
+            network (dict): The network as returned by getOrganizationNetworks
+            status (str): DONE or FAILED
+            filename (str): The config file written, when done
+            error (str): What went wrong, when failed
+        """
+        entry = {
+            "network_id": network["id"],
+            "name": network["name"],
+            "status": status,
+            "filename": filename,
+            "error": error,
+        }
+        self._append(entry)
+        with self._lock:
+            self.networks[network["id"]] = entry
+
+    def complete(self):
+        """Mark the job finished, so the next run starts over"""
+        self._append({"complete": True, "finished": datetime.now().isoformat()})
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
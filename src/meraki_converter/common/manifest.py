@@ -0,0 +1,107 @@
+"""Content hashes of each network's inputs, used to skip unchanged networks"""
+
+import hashlib
+import json
+import os
+import threading
+
+from meraki_converter.common import fileops
+
+MANIFEST_PATH = "output/configs/manifest.json"
+
+
+def hash_json(data):
+    """Return a stable sha256 hex digest of a JSON serializable object"""
+    encoded = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def hash_files(paths):
+    """Return a sha256 hex digest over the names and contents of files"""
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        digest.update(os.path.basename(path).encode("utf-8") + b"\0")
+        with open(path, "rb") as file:
+            digest.update(file.read())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def hash_templates(template_dir="templates"):
+    paths = [
+        os.path.join(template_dir, name)
+        for name in os.listdir(template_dir)
+        if os.path.isfile(os.path.join(template_dir, name))
+    ]
+    return hash_files(paths)
+
+
+class Manifest:
+    """Record of the input hashes each network's config was last rendered from
+
+    Entries are keyed by network ID and hold the hash of the VLAN payload,
+    the org settings file and the template set, plus the file written.
+    With force set, no network is ever considered current but new hashes
+    are still recorded. Entries recorded as pending, for configs not yet
+    checked, are only kept once confirmed.
+    """
+
+    def __init__(self, path=MANIFEST_PATH, force=False):
+        self.path = path
+        self.force = force
+        self._lock = threading.Lock()
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                self.networks = json.load(file)
+        except (FileNotFoundError, ValueError):
+            self.networks = {}
+        self.pending = {}
+
+    def is_current(self, network_id, hashes, filename):
+        """Check whether a network was already rendered from the same inputs
+
+        Args:
+            network_id (str): The network ID
+            hashes (dict): The input hashes, keyed by input name
+            filename (str): The config file the network renders to
+
+        Returns:
+            bool: True when nothing changed and the file is still there
+        """
+        entry = self.networks.get(network_id)
+        return (
+            not self.force
+            and entry is not None
+            and entry["hashes"] == hashes
+            and entry["filename"] == filename
+            and os.path.exists(filename)
+        )
+
+    def record(self, network_id, network_name, hashes, filename, pending=False):
+        entry = {
+            "name": network_name,
+            "hashes": hashes,
+            "filename": filename,
+        }
+        with self._lock:
+            if pending:
+                self.pending[network_id] = entry
+            else:
+                self.networks[network_id] = entry
+
+    def confirm(self, network_id):
+        """Keep the pending entry of a network whose config passed its check"""
+        with self._lock:
+            entry = self.pending.pop(network_id, None)
+            if entry is not None:
+                self.networks[network_id] = entry
+
+    def discard(self, network_id):
+        """Drop the pending entry of a network whose config failed its check"""
+        with self._lock:
+            self.pending.pop(network_id, None)
+
+    def save(self):
+        with self._lock:
+            data = json.dumps(self.networks, indent=2, sort_keys=True)
+        fileops.write_atomic(self.path, (data,))
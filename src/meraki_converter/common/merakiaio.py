@@ -0,0 +1,138 @@
+"""Asynchronous counterparts of merakiops for fetching many networks at once"""
+
+import asyncio
+import os
+import sys
+
+import meraki
+import meraki.aio
+
+from meraki_converter.common import metrics, ratelimit
+
+
+def get_async_dashboard(key=None, max_concurrent=8, org=None, base_url=None):
+    """Instantiate the asynchronous Meraki dashboard
+
+    The returned object must be used as an async context manager so the
+    underlying HTTP session is closed when the work is done.
+
+    Args:
+        key (str): The API KEY
+        max_concurrent (int): The most requests the session will run at once
+        org (str): The organization ID whose rate limit the calls count
+            against, if known
+        base_url (str): The API to call instead of the Meraki cloud.
+            Defaults to MERAKI_DASHBOARD_BASE_URL if set
+
+    Returns:
+        ScheduledDashboard: the AsyncDashboardAPI with every call rate
+            limited by the shared scheduler
+    """
+    if not key and "MERAKI_DASHBOARD_API_KEY" not in os.environ:
+        sys.exit("MERAKI_DASHBOARD_API_KEY not found.")
+    # The library logs its retries, which metrics counts
+    metrics.capture_meraki_logs()
+    base_url = base_url or os.environ.get("MERAKI_DASHBOARD_BASE_URL")
+    options = {"base_url": base_url} if base_url else {}
+    try:
+        dashboard = meraki.aio.AsyncDashboardAPI(
+            key,
+            output_log=False,
+            print_console=False,
+            suppress_logging=False,
+            inherit_logging_config=True,
+            maximum_concurrent_requests=max_concurrent,
+            **ratelimit.CLIENT_OPTIONS,
+            **options,
+        )
+    except AttributeError:
+        sys.exit("Make sure meraki library is installed. Try `pip install meraki`")
+    return ratelimit.ScheduledDashboard(dashboard, ratelimit.scheduler, org)
+
+
+async def get_networks(dashboard, org):
+    metrics.count("api_calls", endpoint="getOrganizationNetworks")
+    try:
+        return await dashboard.organizations.getOrganizationNetworks(
+            org, total_pages="all"
+        )
+    except meraki.AsyncAPIError as e:
+        print(f"reason = {e.reason}")
+
+
+async def get_mx_serial_number(dashboard, net_id):
+    has_spare = False
+    spare_mx_sn = None
+    metrics.count("api_calls", endpoint="getNetworkApplianceWarmSpare")
+    try:
+        warm_spare = await dashboard.appliance.getNetworkApplianceWarmSpare(net_id)
+    except meraki.AsyncAPIError as e:
+        print(f"reason = {e.reason}")
+        print(f"error = {e.message}")
+        return None
+    if warm_spare["enabled"]:
+        has_spare = True
+        spare_mx_sn = warm_spare["spareSerial"]
+    primary_mx_sn = warm_spare["primarySerial"]
+    return (has_spare, primary_mx_sn, spare_mx_sn)
+
+
+async def get_network_vlans(dashboard, net_id):
+    metrics.count("api_calls", endpoint="getNetworkApplianceVlans")
+    return await dashboard.appliance.getNetworkApplianceVlans(net_id)
+
+
+async def gather_bounded(coros, limit):
+    """Run coroutines with at most limit of them in flight at once
+
+    Args:
+        coros (iterable): The coroutines to run
+        limit (int): The size of the semaphore guarding them
+
+    Returns:
+        list: the results in the same order, with any raised exception
+            returned in place of its result
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def bounded(coro):
+        async with semaphore:
+            return await coro
+
+    return await asyncio.gather(
+        *(bounded(coro) for coro in coros), return_exceptions=True
+    )
+
+
+async def _fetch_network_vlans(net_ids, key, concurrency, org, base_url):
+    dashboard = get_async_dashboard(
+        key, max_concurrent=concurrency, org=org, base_url=base_url
+    )
+    async with dashboard:
+        # The tasks gather makes copy this context, and with it the priority
+        with ratelimit.priority(ratelimit.BULK):
+            results = await gather_bounded(
+                (get_network_vlans(dashboard, net_id) for net_id in net_ids),
+                concurrency,
+            )
+    return dict(zip(net_ids, results))
+
+
+def fetch_network_vlans(net_ids, key=None, concurrency=8, org=None,
+                        base_url=None):
+    """Fetch the appliance VLANs of many networks concurrently
+
+    Args:
+        net_ids (list): The network IDs to fetch
+        key (str): The API KEY
+        concurrency (int): The most VLAN requests in flight at once
+        org (str): The organization ID the requests count against
+        base_url (str): The API to call instead of the Meraki cloud
+
+    Returns:
+        dict: network ID to its VLAN list, or to the exception raised
+            while fetching it
+    """
+    return asyncio.run(
+        _fetch_network_vlans(list(net_ids), key, concurrency, org, base_url)
+    )
@@ -1,45 +1,76 @@
 """Frequently used functions for accessing the Meraki dashboard"""
 
 import os
+import re
 import sys
 
 import meraki
 
-from meraki_converter.common import fileops
+from meraki_converter.common import (
+    apicache,
+    fileops,
+    inventory,
+    metrics,
+    ratelimit,
+    search,
+)
 
 
-def get_dashboard(key=None, print_console=False, output_log=False):
+def get_dashboard(key=None, print_console=False, output_log=False, org=None,
+                  base_url=None):
     """Instantiate the Meraki dashboard
 
     Args:
         key (str): The API KEY
         print_console (bool): Flag used to determine writing to CLI
         output_log (bool): Flag used to determine writing to logs
+        org (str): The organization ID whose rate limit the calls count
+            against, if known
+        base_url (str): The API to call instead of the Meraki cloud, such as
+            a local stand-in. Defaults to MERAKI_DASHBOARD_BASE_URL if set
 
     Returns:
-        DashboardAPI
+        InstrumentedDashboard: the DashboardAPI with every call rate limited
+            by the shared scheduler, and timed and counted in metrics
     """
     # TODO: look into log_file_prefix=os.path.basename(__file__)
-    if key:
-        try:
-            return meraki.DashboardAPI(
-                key,
-                output_log=output_log,
-                print_console=print_console,
-                suppress_logging=True,
-            )
-        except AttributeError as e:
-            sys.exit("Make sure meraki library is installed. Try `pip install meraki`")
-
-    if "MERAKI_DASHBOARD_API_KEY" in os.environ:
-        try:
-            return meraki.DashboardAPI(
-                output_log=False, print_console=False, suppress_logging=True
-            )
-        except AttributeError as e:
-            sys.exit("Make sure meraki library is installed. Try `pip install meraki`")
+    if not key and "MERAKI_DASHBOARD_API_KEY" not in os.environ:
+        sys.exit("MERAKI_DASHBOARD_API_KEY not found.")
+
+    # The library logs its retries, which metrics counts
+    metrics.capture_meraki_logs()
+    ratelimit.listen_for_throttling()
+    base_url = base_url or os.environ.get("MERAKI_DASHBOARD_BASE_URL")
+    options = {"base_url": base_url} if base_url else {}
+    try:
+        dashboard = meraki.DashboardAPI(
+            key,
+            output_log=output_log,
+            print_console=print_console,
+            suppress_logging=False,
+            inherit_logging_config=not (output_log or print_console),
+            **ratelimit.CLIENT_OPTIONS,
+            **options,
+        )
+    except AttributeError as e:
+        sys.exit("Make sure meraki library is installed. Try `pip install meraki`")
+    dashboard = ratelimit.ScheduledDashboard(dashboard, ratelimit.scheduler, org)
+    return metrics.InstrumentedDashboard(dashboard)
+
+
+def get_cached_dashboard(cache, offline=False, org=None):
+    """Instantiate the Meraki dashboard behind a response cache
+
+    Args:
+        cache (ResponseCache): The cache responses are stored in
+        offline (bool): Serve only cached responses without an API key
+        org (str): The organization ID the calls count against, if known
 
-    sys.exit("MERAKI_DASHBOARD_API_KEY not found.")
+    Returns:
+        CachedDashboard
+    """
+    dashboard = None if offline else get_dashboard(org=org)
+    return apicache.CachedDashboard(dashboard, cache)
 
 
 def validate_integer_in_range(end_range):
@@ -57,6 +88,43 @@ def validate_integer_in_range(end_range):
     return selected - 1
 
 
+def select_from_index(index, label, query="", lines_to_display=25):
+    """Show the matches of a search and prompt until one is selected
+
+    Anything other than the number of a listed match is taken as a new
+    search. When nothing matches, the closest names are offered instead.
+
+    Args:
+        index (SearchIndex): The items to search
+        label (str): What is being searched for, used in messages
+        query (str): The first search, blank lists everything
+        lines_to_display (int): The most matches to list at once
+
+    Returns:
+        dict: the selected item
+    """
+    while True:
+        matches = index.search(query)
+        if not matches:
+            matches = index.fuzzy(query)
+            if matches:
+                print(f"No {label} found matching {query}, closest matches:")
+            else:
+                print(f"No {label} found matching {query}")
+        shown = matches[:lines_to_display]
+        print()
+        for line_num, item in enumerate(shown, start=1):
+            print(fileops.colorme(f"  {line_num} - {item['name']}", "green"))
+        if len(matches) > len(shown):
+            print(f"  ... {len(matches) - len(shown)} more, search again to narrow")
+        response = input("\nOption number, or a name, tag:<tag> or ID to search >> ")
+        response = response.strip()
+        if response.isdigit() and 1 <= int(response) <= len(shown):
+            print()
+            return shown[int(response) - 1]
+        query = response
+
+
 def select_organization(dashboard):
     """Lists all the organizations and prompts the user to select one
 
@@ -65,72 +133,142 @@ def select_organization(dashboard):
     Returns:
         A tuple containing organization ID and name
     """
-    organizations = dashboard.organizations.getOrganizations()
-    organizations.sort(key=lambda x: x["name"])
-    print("\nSelect an organization:\n")
-    for line_num, organization in enumerate(organizations, start=1):
-        row = fileops.colorme((f'  {line_num} - {organization["name"]}'), "green")
-        print(row)
-    selected = validate_integer_in_range(len(organizations))
-    return (
-        organizations[int(selected)]["id"],
-        organizations[int(selected)]["name"],
-    )
+    try:
+        organizations = dashboard.organizations.getOrganizations()
+    except apicache.CacheMiss as e:
+        sys.exit(f"{e}, run online first")
+    print("\nSelect an organization:")
+    index = search.SearchIndex(organizations)
+    organization = select_from_index(index, "organizations")
+    return organization["id"], organization["name"]
 
 
 def select_network(dashboard, org, lines_to_display=25):
-    """Lists the organization networks and prompts user to select one
+    """Prompts the user to search the organization networks and select one
+
+    Networks can be found by part of their name, by tag or by ID, and the
+    index is built once so every search after the first is immediate.
 
     Args:
         dashboard (obj): The Meraki dashboard instance
         org (str): The selected organization ID
-        lines_to_display (int): The number of lines before pausing
+        lines_to_display (int): The most matches to list at once
 
     Returns:
         list: the selected network ID and network name
     """
+    try:
+        networks = dashboard.organizations.getOrganizationNetworks(
+            org, total_pages="all"
+        )
+    except apicache.CacheMiss as e:
+        sys.exit(f"{e}, run online first")
+    index = search.SearchIndex(networks)
+    query = input(
+        "Enter a name, tag:<tag> or ID to search for or leave blank for all "
+        "networks: "
+    )
+    network = select_from_index(index, "networks", query, lines_to_display)
+    return [network["id"], network["name"]]
 
-    network_list = []
-    networks = dashboard.organizations.getOrganizationNetworks(org)
 
-    while not network_list:
-        search_name = input(
-            "Enter a name to search for or leave blank for all networks: "
+def get_networks(dashboard, org):
+    try:
+        networks = dashboard.organizations.getOrganizationNetworks(
+            org, total_pages="all"
         )
-        if search_name:
-            for network in networks:
-                if search_name.lower() in network["name"].lower():
-                    network_list.append(network)
-        else:
-            network_list = networks
-        if network_list:
-            network_list.sort(key=lambda x: x["name"])
-            print("\nNetworks:")
-            for line_num, net in enumerate(network_list, start=1):
-                net_name = net["name"]
-                print(f"{line_num} - {net_name}")
-                if line_num % lines_to_display == 0:
-                    user_response = input(
-                        "\nPress Enter to continue, or q + Enter to quit search: "
-                    )
-                    if "q" in user_response:
-                        break
-        else:
-            print(f"No networks found matching {search_name}")
+        return networks
+    except meraki.APIError as e:
+        print(f"reason = {e.reason}")
+    except apicache.CacheMiss as e:
+        sys.exit(f"{e}, run online first")
 
-    selected = validate_integer_in_range(len(network_list))
-    return [network_list[int(selected)]["id"], network_list[int(selected)]["name"]]
 
+def get_organization_name(dashboard, org):
+    """Look up the name of an organization from its ID
 
-def get_networks(dashboard, org):
+    Args:
+        dashboard (obj): The Meraki dashboard instance
+        org (str): The organization ID
+
+    Returns:
+        str: the organization name
+    """
     try:
-        networks = dashboard.organizations.getOrganizationNetworks(org)
-        return networks
+        return dashboard.organizations.getOrganization(org)["name"]
+    except meraki.APIError as e:
+        sys.exit(f"Unable to find organization {org}: {e.message}")
+    except apicache.CacheMiss as e:
+        sys.exit(f"{e}, run online first")
+
+
+def filter_networks(networks, name=None, tag=None, regex=None,
+                    product_type="appliance"):
+    """Return the networks matching every filter that was given
+
+    Args:
+        networks (list): Networks as returned by getOrganizationNetworks
+        name (str): Case insensitive substring the network name must contain
+        tag (str): A tag the network must carry
+        regex (str): A regular expression the network name must match
+        product_type (str): A product type the network must contain
+
+    Returns:
+        list: the matching networks sorted by name
+    """
+    pattern = re.compile(regex) if regex else None
+    matches = []
+    for network in networks:
+        if product_type and product_type not in network.get("productTypes", []):
+            continue
+        if name and name.lower() not in network["name"].lower():
+            continue
+        if tag and tag not in network.get("tags", []):
+            continue
+        if pattern and not pattern.search(network["name"]):
+            continue
+        matches.append(network)
+    matches.sort(key=lambda x: x["name"])
+    return matches
+
+
+def get_appliances(dashboard, org):
+    """Return the appliance of every network in an org, keyed by network ID
+
+    Args:
+        dashboard (obj): The Meraki dashboard instance
+        org (str): The organization ID
+
+    Returns:
+        dict: network ID to its Appliance, empty if it could not be fetched
+    """
+    try:
+        return inventory.prefetch_appliances(dashboard, org)
     except meraki.APIError as e:
         print(f"reason = {e.reason}")
+    except apicache.CacheMiss as e:
+        print(f"Appliances not cached: {e}")
+    return {}
+
 
+def get_mx_serial_number(dashboard, net_id, appliances=None):
+    """Return whether a network has a warm spare and its MX serials
 
-def get_mx_serial_number(dashboard, net_id):
+    Args:
+        dashboard (obj): The Meraki dashboard instance
+        net_id (str): The network ID
+        appliances (dict): Appliances from get_appliances, which are used
+            instead of calling the dashboard when given
+
+    Returns:
+        tuple: has a spare, the primary serial and the spare serial
+    """
+    if appliances is not None:
+        appliance = appliances.get(net_id)
+        if appliance is None:
+            return None
+        has_spare = appliance.spare_serial is not None
+        return (has_spare, appliance.serial, appliance.spare_serial)
     has_spare = False
     primary_mx_sn = None
     spare_mx_sn = None
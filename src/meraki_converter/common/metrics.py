@@ -0,0 +1,199 @@
+"""Per-stage timings and API call counters with JSON and Prometheus reports"""
+
+import contextlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime
+
+log = logging.getLogger(__name__)
+
+PREFIX = "meraki_converter"
+
+# The meraki library logs "<tag>, <operation> - <reason>, retrying in ...",
+# its asyncio client the same with " > <url>" after the operation
+RETRY_PATTERN = re.compile(r"^\w+, (\w+)(?: > \S+)? - .*retrying in")
+
+
+class Metrics:
+    """Thread-safe registry of stage timings and labelled counters"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.stages = {}
+        self.counters = {}
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            count, total, peak = self.stages.get(stage, (0, 0.0, 0.0))
+            self.stages[stage] = (count + 1, total + seconds, max(peak, seconds))
+
+    @contextlib.contextmanager
+    def span(self, stage):
+        """Time the body of a with block as one run of stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def count(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def report(self):
+        """Return the collected metrics as a JSON serializable dict"""
+        with self._lock:
+            stages = {
+                stage: {
+                    "count": count,
+                    "total_seconds": round(total, 6),
+                    "mean_seconds": round(total / count, 6),
+                    "max_seconds": round(peak, 6),
+                }
+                for stage, (count, total, peak) in sorted(self.stages.items())
+            }
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self.counters.items())
+            ]
+        return {
+            "started": datetime.fromtimestamp(self.started).isoformat(),
+            "duration_seconds": round(time.time() - self.started, 6),
+            "stages": stages,
+            "counters": counters,
+        }
+
+    def prometheus(self):
+        """Return the collected metrics in the Prometheus text format"""
+        report = self.report()
+        lines = [
+            f"# HELP {PREFIX}_stage_seconds Time spent in each conversion stage",
+            f"# TYPE {PREFIX}_stage_seconds summary",
+        ]
+        for stage, values in report["stages"].items():
+            lines.append(
+                f'{PREFIX}_stage_seconds_sum{{stage="{stage}"}} '
+                f'{values["total_seconds"]}'
+            )
+            lines.append(
+                f'{PREFIX}_stage_seconds_count{{stage="{stage}"}} {values["count"]}'
+            )
+        lines.append(f"# HELP {PREFIX}_stage_max_seconds Slowest run of each stage")
+        lines.append(f"# TYPE {PREFIX}_stage_max_seconds gauge")
+        for stage, values in report["stages"].items():
+            lines.append(
+                f'{PREFIX}_stage_max_seconds{{stage="{stage}"}} '
+                f'{values["max_seconds"]}'
+            )
+        declared = set()
+        for counter in report["counters"]:
+            name = f"{PREFIX}_{counter['name']}_total"
+            if name not in declared:
+                lines.append(f"# TYPE {name} counter")
+                declared.add(name)
+            labels = ",".join(f'{k}="{v}"' for k, v in counter["labels"].items())
+            if labels:
+                name += "{" + labels + "}"
+            lines.append(f"{name} {counter['value']}")
+        lines.append(f"# TYPE {PREFIX}_run_duration_seconds gauge")
+        lines.append(f"{PREFIX}_run_duration_seconds {report['duration_seconds']}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Metrics()
+
+
+def span(stage):
+    return registry.span(stage)
+
+
+def count(name, value=1, **labels):
+    registry.count(name, value, **labels)
+
+
+class _InstrumentedSection:
+    def __init__(self, section):
+        self._section = section
+
+    def __getattr__(self, name):
+        func = getattr(self._section, name)
+        if not callable(func):
+            return func
+
+        def instrumented_call(*args, **kwargs):
+            count("api_calls", endpoint=name)
+            with span(f"api.{name}"):
+                return func(*args, **kwargs)
+
+        return instrumented_call
+
+
+class InstrumentedDashboard:
+    """Wraps a DashboardAPI to time and count every endpoint call"""
+
+    def __init__(self, dashboard):
+        self._dashboard = dashboard
+
+    def __getattr__(self, name):
+        return _InstrumentedSection(getattr(self._dashboard, name))
+
+
+class MerakiLogCounter(logging.Handler):
+    """Counts the retries the meraki library logs
+
+    The warnings and errors are passed on to this module's logger so they
+    still reach the run's log file.
+    """
+
+    def emit(self, record):
+        message = record.getMessage()
+        match = RETRY_PATTERN.match(message)
+        if match:
+            count("api_retries", endpoint=match.group(1))
+        log.log(record.levelno, message)
+
+
+def capture_meraki_logs():
+    """Route the meraki library's warnings through MerakiLogCounter
+
+    The library's logger, and that of its asyncio client below it, is set
+    to warnings, so the record it logs for every request is never made.
+    """
+    meraki_log = logging.getLogger("meraki")
+    if not any(isinstance(h, MerakiLogCounter) for h in meraki_log.handlers):
+        meraki_log.addHandler(MerakiLogCounter(logging.WARNING))
+    meraki_log.setLevel(logging.WARNING)
+    meraki_log.propagate = False
+
+
+def write_reports(script_name, directory="output/metrics/"):
+    """Write the JSON report and Prometheus textfile for this run
+
+    The JSON report is timestamped like the log files. The Prometheus file
+    keeps a fixed name so a textfile collector always reads the latest run.
+
+    Args:
+        script_name (str): The name of the script that ran
+        directory (str): The directory the reports are written to
+
+    Returns:
+        tuple: the paths of the JSON report and the Prometheus textfile
+    """
+    # Imported here since fileops reports its writes through this module
+    from meraki_converter.common import fileops
+
+    os.makedirs(directory, exist_ok=True)
+    time_stamp = datetime.now().strftime("__%Y-%m-%d__%H-%M-%S")
+    json_path = os.path.join(directory, script_name + time_stamp + ".json")
+    prom_path = os.path.join(directory, f"{PREFIX}_{script_name}.prom")
+    report = dict(registry.report(), script=script_name)
+    fileops.write_atomic(json_path, (json.dumps(report, indent=2),))
+    fileops.write_atomic(prom_path, (registry.prometheus(),))
+    log.info(f"Wrote metrics to {json_path} and {prom_path}")
+    return json_path, prom_path
@@ -0,0 +1,143 @@
+"""Staged conversion pipeline connected by bounded queues
+
+Each stage runs on its own worker threads and hands its output to the next
+through a queue holding at most queue_size items. A stage that gets ahead
+blocks until the next one catches up, so the networks in flight, and the
+memory they take, are bounded by the queue sizes and worker counts rather
+than by the size of the org.
+"""
+
+import collections
+import logging
+import queue
+import threading
+
+from meraki_converter.common import metrics
+
+log = logging.getLogger(__name__)
+
+Stage = collections.namedtuple("Stage", ["name", "func", "workers"])
+Stage.__doc__ = """One step of a pipeline
+
+Args:
+    name (str): The name the stage's timings are reported under
+    func (callable): Called with an item and the previous stage's output,
+        or None for the first stage, returning this stage's output
+    workers (int): The number of threads running the stage
+"""
+
+# Put on a queue once for each worker of the stage reading it
+_DONE = object()
+# Seconds between checks for the pipeline being abandoned while blocked
+_POLL = 0.1
+
+
+class Failed:
+    """Stands in for the output of an item whose stage raised an exception"""
+
+    __slots__ = ("error", "stage")
+
+    def __init__(self, error, stage):
+        self.error = error
+        self.stage = stage
+
+
+class _Run:
+    def __init__(self, stages, queue_size):
+        self.stages = stages
+        self.queues = [queue.Queue(queue_size) for _ in range(len(stages) + 1)]
+        self.remaining = [stage.workers for stage in stages]
+        self.lock = threading.Lock()
+        self.cancelled = threading.Event()
+
+    def put(self, position, entry):
+        while not self.cancelled.is_set():
+            try:
+                self.queues[position].put(entry, timeout=_POLL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(self, position):
+        while not self.cancelled.is_set():
+            try:
+                return self.queues[position].get(timeout=_POLL)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def feed(self, items):
+        for item in items:
+            if not self.put(0, (item, None)):
+                return
+        for _ in range(self.stages[0].workers):
+            self.put(0, _DONE)
+
+    def work(self, position):
+        stage = self.stages[position]
+        while True:
+            entry = self.get(position)
+            if entry is _DONE:
+                break
+            item, value = entry
+            if not isinstance(value, Failed):
+                try:
+                    with metrics.span(f"pipeline.{stage.name}"):
+                        value = stage.func(item, value)
+                except (Exception, SystemExit) as e:
+                    value = Failed(e, stage.name)
+            entry = None
+            if not self.put(position + 1, (item, value)):
+                return
+            # Not held by this worker while it waits for the next item
+            item = value = None
+        with self.lock:
+            self.remaining[position] -= 1
+            last = self.remaining[position] == 0
+        if last:
+            following = position + 1
+            workers = (
+                self.stages[following].workers if following < len(self.stages) else 1
+            )
+            for _ in range(workers):
+                self.put(following, _DONE)
+
+
+def run_pipeline(items, stages, queue_size=16):
+    """Pass items through stages, yielding each once it leaves the last
+
+    Args:
+        items (iterable): The items to process, read as the first stage
+            has room for them
+        stages (list): The Stages, in order
+        queue_size (int): The most items waiting between two stages
+
+    Yields:
+        tuple: an item and the last stage's output for it, or a Failed
+            holding the exception a stage raised, in completion order
+    """
+    run = _Run(stages, queue_size)
+    threads = [threading.Thread(target=run.feed, args=(items,), daemon=True)]
+    for position, stage in enumerate(stages):
+        threads += [
+            threading.Thread(
+                target=run.work,
+                args=(position,),
+                name=f"pipeline-{stage.name}-{number}",
+                daemon=True,
+            )
+            for number in range(stage.workers)
+        ]
+    for thread in threads:
+        thread.start()
+    try:
+        while True:
+            entry = run.get(len(stages))
+            if entry is _DONE:
+                break
+            yield entry
+    finally:
+        run.cancelled.set()
+        for thread in threads:
+            thread.join()
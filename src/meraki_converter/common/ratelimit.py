@@ -0,0 +1,309 @@
+"""Shared scheduling of dashboard requests under Meraki's per-org rate limit
+
+Every dashboard call made through a ScheduledDashboard takes a token from
+its org's bucket first. Callers waiting on the same bucket are served by
+priority, so interactive lookups go ahead of bulk fetches. A 429 pauses
+the whole bucket for its Retry-After, and server errors are retried with
+jittered exponential backoff.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import logging
+import random
+import re
+import threading
+import time
+
+from meraki_converter.common import metrics
+
+log = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+BULK = 1
+
+# Passed to the meraki clients so retries and backoff are left to the
+# scheduler. The library sends no request at all with 0 retries, so 1 is one
+# attempt per scheduled call.
+CLIENT_OPTIONS = {"wait_on_rate_limit": False, "maximum_retries": 1}
+
+# The meraki library logs a 429 before sleeping it off and retrying
+THROTTLE_PATTERN = re.compile(r" - 429 .*retrying in (\d+) seconds")
+
+_priority = contextvars.ContextVar("priority", default=INTERACTIVE)
+
+
+@contextlib.contextmanager
+def priority(level):
+    """Make the dashboard calls in a with block at the given priority"""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    """Tokens refilled at rate per second, holding at most burst of them
+
+    Not thread-safe, RequestScheduler guards its buckets with its own lock.
+    """
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = burst
+        self.updated = clock()
+        self.paused_until = 0.0
+
+    def take(self):
+        """Take a token if one is free, returning 0 or the seconds to wait"""
+        now = self.clock()
+        if now < self.paused_until:
+            return self.paused_until - now
+        refill = (now - self.updated) * self.rate
+        self.tokens = min(self.burst, self.tokens + refill)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def pause(self, seconds):
+        """Hand out no tokens for seconds, then refill from empty"""
+        self.paused_until = max(self.paused_until, self.clock() + seconds)
+        self.tokens = 0
+        self.updated = self.paused_until
+
+
+def retry_status(error):
+    """Return the HTTP status of an error worth retrying, otherwise None"""
+    status = getattr(error, "status", None)
+    if status == 429 or (isinstance(status, int) and status >= 500):
+        return status
+    return None
+
+
+def retry_after(error):
+    """Return the Retry-After of an error's response in seconds, if any"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers["Retry-After"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class RequestScheduler:
+    """Token buckets per org shared by every thread making dashboard calls
+
+    Args:
+        rate (float): Requests per second allowed for each org
+        burst (int): Requests that can be made at once after being idle
+        max_retries (int): Retries of a throttled or failed call
+        backoff (float): Base of the exponential backoff in seconds
+        max_backoff (float): The longest backoff between retries
+    """
+
+    def __init__(self, rate=10, burst=10, max_retries=5, backoff=1.0,
+                 max_backoff=60.0):
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._condition = threading.Condition()
+        self._buckets = {}
+        self._waiting = {}
+        self._order = itertools.count()
+
+    def _bucket(self, key):
+        if key not in self._buckets:
+            self._buckets[key] = TokenBucket(self.rate, self.burst)
+            self._waiting[key] = []
+        return self._buckets[key]
+
+    def acquire(self, key=None, level=None):
+        """Block until a request for key may be made
+
+        Args:
+            key (str): The org the request counts against
+            level (int): INTERACTIVE or BULK, defaults to the current priority
+
+        Returns:
+            float: the seconds spent waiting
+        """
+        level = _priority.get() if level is None else level
+        start = time.perf_counter()
+        with self._condition:
+            bucket = self._bucket(key)
+            waiting = self._waiting[key]
+            entry = (level, next(self._order))
+            heapq.heappush(waiting, entry)
+            # A new head of the queue may be able to go before the old one
+            self._condition.notify_all()
+            while True:
+                wait = None
+                if waiting[0] == entry:
+                    wait = bucket.take()
+                    if not wait:
+                        heapq.heappop(waiting)
+                        self._condition.notify_all()
+                        break
+                self._condition.wait(wait)
+        waited = time.perf_counter() - start
+        metrics.registry.observe("rate_limit_wait", waited)
+        return waited
+
+    def pause(self, seconds, key=None):
+        """Stop handing out tokens for key, or every org, for seconds"""
+        # Jitter so the paused callers do not all resume at once
+        seconds += random.uniform(0, self.backoff)
+        with self._condition:
+            keys = [key] if key is not None else list(self._buckets)
+            for bucket_key in keys:
+                self._bucket(bucket_key).pause(seconds)
+            self._condition.notify_all()
+        log.warning(f"Throttled by the dashboard, pausing for {seconds:.1f}s")
+
+    def retry_delay(self, key, error, attempt):
+        """Return the seconds to wait before retrying error, or None to raise
+
+        A 429 pauses every caller of the org until its Retry-After has
+        passed, so the returned delay is only for other errors.
+        """
+        status = retry_status(error)
+        if status is None or attempt > self.max_retries:
+            return None
+        metrics.count("api_backoffs", status=status)
+        backoff = min(self.max_backoff, self.backoff * 2**attempt)
+        if status == 429:
+            metrics.count("api_throttled", org=key or "")
+            wait = retry_after(error)
+            if wait is None:
+                wait = random.uniform(0, backoff)
+            self.pause(wait, key)
+            return 0
+        wait = random.uniform(0, backoff)
+        log.warning(f"Dashboard returned {status}, retrying in {wait:.1f}s")
+        return wait
+
+    def call(self, key, func, *args, **kwargs):
+        """Make a dashboard call once the rate limit allows it, with retries"""
+        for attempt in itertools.count(1):
+            self.acquire(key)
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                wait = self.retry_delay(key, e, attempt)
+                if wait is None:
+                    raise
+            time.sleep(wait)
+
+    async def call_async(self, key, func, *args, **kwargs):
+        """Await a dashboard coroutine once the rate limit allows it"""
+        for attempt in itertools.count(1):
+            await asyncio.to_thread(self.acquire, key, _priority.get())
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                wait = self.retry_delay(key, e, attempt)
+                if wait is None:
+                    raise
+            await asyncio.sleep(wait)
+
+
+class _ScheduledSection:
+    def __init__(self, section, scheduler, key, asynchronous):
+        self._section = section
+        self._scheduler = scheduler
+        self._key = key
+        self._asynchronous = asynchronous
+
+    def __getattr__(self, name):
+        func = getattr(self._section, name)
+        if not callable(func):
+            return func
+        if self._asynchronous:
+
+            async def scheduled_async_call(*args, **kwargs):
+                return await self._scheduler.call_async(
+                    self._key, func, *args, **kwargs
+                )
+
+            return scheduled_async_call
+
+        def scheduled_call(*args, **kwargs):
+            return self._scheduler.call(self._key, func, *args, **kwargs)
+
+        return scheduled_call
+
+
+class ScheduledDashboard:
+    """Wraps a DashboardAPI so every call goes through a RequestScheduler
+
+    Args:
+        dashboard (obj): The DashboardAPI or AsyncDashboardAPI
+        scheduler (RequestScheduler): The scheduler shared by the process
+        key (str): The org the calls count against
+    """
+
+    def __init__(self, dashboard, scheduler, key=None):
+        self._dashboard = dashboard
+        self._scheduler = scheduler
+        self._key = key
+        self._asynchronous = hasattr(dashboard, "__aenter__")
+
+    def __getattr__(self, name):
+        return _ScheduledSection(
+            getattr(self._dashboard, name),
+            self._scheduler,
+            self._key,
+            self._asynchronous,
+        )
+
+    async def __aenter__(self):
+        await self._dashboard.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return await self._dashboard.__aexit__(*exc_info)
+
+
+scheduler = RequestScheduler()
+
+
+def configure(settings):
+    """Replace the shared scheduler with one from the [rate_limit] settings"""
+    global scheduler
+    rate_settings = settings.get("rate_limit", {})
+    scheduler = RequestScheduler(
+        rate=float(rate_settings.get("requests_per_second", 10)),
+        burst=int(rate_settings.get("burst", 10)),
+        max_retries=int(rate_settings.get("max_retries", 5)),
+    )
+    return scheduler
+
+
+class ThrottleListener(logging.Handler):
+    """Pauses the shared scheduler when the meraki library reports a 429
+
+    The library sleeps off a 429 inside the thread that got it, so without
+    this every other thread would keep making requests in the meantime.
+    """
+
+    def emit(self, record):
+        match = THROTTLE_PATTERN.search(record.getMessage())
+        if match:
+            metrics.count("api_throttled", org="")
+            scheduler.pause(float(match.group(1)))
+
+
+def listen_for_throttling():
+    """Attach a ThrottleListener to the meraki library's logger"""
+    meraki_log = logging.getLogger("meraki")
+    if not any(isinstance(h, ThrottleListener) for h in meraki_log.handlers):
+        meraki_log.addHandler(ThrottleListener())
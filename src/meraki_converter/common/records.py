@@ -0,0 +1,126 @@
+"""Compact records for the VLANs, reservations and clients being converted
+
+Batch conversion can hold a whole org of VLANs in memory at once. These
+records are tuples with no per-instance dict. They replace the per-VLAN
+dicts, keep only the fields the templates render and expose them under
+the same names, so templates use them unchanged.
+"""
+
+import collections
+
+from meraki_converter.common import subnets
+
+
+class Reservation(collections.namedtuple("Reservation", ["first", "last"])):
+    """A reserved IP range, stored as integers and rendered as addresses"""
+
+    __slots__ = ()
+
+    @property
+    def start(self):
+        return subnets.int_to_ip(self.first)
+
+    @property
+    def end(self):
+        return subnets.int_to_ip(self.last)
+
+
+FixedClient = collections.namedtuple(
+    "FixedClient", ["count", "ip", "mac", "description"]
+)
+FixedClient.__doc__ = """A fixed IP assignment, numbered in Meraki's order"""
+
+
+class ClientTable:
+    """The fixed IP assignments of a VLAN, stored column by column
+
+    A VLAN can have thousands of clients. Plain tuples of strings are cheap
+    to build and the garbage collector stops tracking them, unlike a record
+    per client, so FixedClients are only made while iterating.
+    """
+
+    __slots__ = ("ips", "macs", "descriptions")
+
+    def __init__(self, ips, macs, descriptions):
+        self.ips = ips
+        self.macs = macs
+        self.descriptions = descriptions
+
+    def __len__(self):
+        return len(self.macs)
+
+    def __eq__(self, other):
+        if not isinstance(other, ClientTable):
+            return NotImplemented
+        return (self.ips, self.macs, self.descriptions) == (
+            other.ips,
+            other.macs,
+            other.descriptions,
+        )
+
+    def __getitem__(self, index):
+        return FixedClient(
+            range(1, len(self) + 1)[index],
+            self.ips[index],
+            self.macs[index],
+            self.descriptions[index],
+        )
+
+    def __iter__(self):
+        return map(
+            FixedClient,
+            range(1, len(self) + 1),
+            self.ips,
+            self.macs,
+            self.descriptions,
+        )
+
+
+class Vlan(
+    collections.namedtuple(
+        "Vlan",
+        [
+            "vlan_name",
+            "vlan_id",
+            "vlan_ip",
+            "vlan_subnet",
+            "vlan_start",
+            "vlan_end",
+            "vlan_netmask",
+            "dhcp_handling",
+            "dhcp_name_servers",
+            "dhcp_reserved",
+            "clients",
+            "dhcp_relay",
+            "dhcp_lease_time",
+            "dhcp_options",
+        ],
+        defaults=[(), (), "", "", None],
+    )
+):
+    """A VLAN formatted for the templates
+
+    dhcp_name_servers is the Meraki keyword, or the "set dns-serverN" lines
+    when the VLAN has its own servers. dhcp_reserved is a tuple of
+    Reservations and clients a ClientTable.
+    """
+
+    __slots__ = ()
+
+
+def reservations(reserved):
+    """Convert Meraki reservedIpRanges to Reservations, keeping their order"""
+    ip_to_int = subnets.ip_to_int
+    return tuple(
+        Reservation(ip_to_int(r["start"]), ip_to_int(r["end"])) for r in reserved
+    )
+
+
+def fixed_clients(assignments):
+    """Convert Meraki fixedIpAssignments, keyed by MAC, to a ClientTable"""
+    clients = assignments.values()
+    return ClientTable(
+        tuple([client["ip"] for client in clients]),
+        tuple(assignments),
+        tuple([client.get("name", "") for client in clients]),
+    )
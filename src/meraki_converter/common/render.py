@@ -0,0 +1,303 @@
+"""Shared jinja environment used to render the Fortigate configs
+
+The sections base.conf includes are rendered separately. Each section's
+inputs are found from its syntax tree, and a section that does not use
+vlan_info is cached under the values of the settings it reads, so networks of
+one org share the sections that come out the same for all of them.
+"""
+
+import functools
+import logging
+import os
+import threading
+import time
+
+from meraki_converter.common import configtree, fileops, fortios, manifest, metrics
+
+log = logging.getLogger(__name__)
+
+TEMPLATE_DIR = "templates"
+BYTECODE_DIR = "output/cache/jinja/"
+BASE_TEMPLATE = "base.conf"
+# Rendered sections kept at most, the oldest are dropped first
+FRAGMENT_CACHE_SIZE = 4096
+# The variables the templates are rendered with
+RENDER_VARIABLES = ("config", "vlan_info")
+# Seconds between checks of the templates for edits while rendering
+PLAN_CHECK_INTERVAL = 1.0
+
+
+@functools.lru_cache(maxsize=None)
+def get_environment(template_dir=TEMPLATE_DIR, bytecode_dir=BYTECODE_DIR):
+    """Build the jinja environment once per process
+
+    Compiled templates are kept in memory for the life of the process and
+    persisted to bytecode_dir so later runs skip compilation too. A template
+    is recompiled when its file changes: the loader compares modification
+    times for the in-memory copy and the bytecode cache compares a checksum
+    of the source.
+
+    Args:
+        template_dir (str): The directory holding base.conf and its includes
+        bytecode_dir (str): The directory compiled templates are stored in
+
+    Returns:
+        jinja2.Environment
+    """
+    # jinja2 is only imported once something is rendered
+    import jinja2
+
+    log.info(f"Loading jinja templates from {template_dir}")
+    os.makedirs(bytecode_dir, exist_ok=True)
+    return jinja2.Environment(
+        loader=jinja2.FileSystemLoader(template_dir),
+        bytecode_cache=jinja2.FileSystemBytecodeCache(bytecode_dir),
+        auto_reload=True,
+    )
+
+
+def get_template(name=BASE_TEMPLATE):
+    return get_environment().get_template(name)
+
+
+def template_dependencies(name, environment=None):
+    """Find the render variables a template and its includes depend on
+
+    Args:
+        name (str): The name of the template
+        environment (jinja2.Environment): Defaults to get_environment()
+
+    Returns:
+        dict: each render variable used to the set of config keys read from
+            it, or None when it is used as a whole. None when the inputs
+            cannot be told from the syntax tree, such as an include whose
+            name is computed or a variable the template assigns to itself.
+    """
+    from jinja2 import meta, nodes
+
+    environment = environment or get_environment()
+    source = environment.loader.get_source(environment, name)[0]
+    tree = environment.parse(source)
+    undeclared = meta.find_undeclared_variables(tree)
+    if not undeclared <= set(RENDER_VARIABLES):
+        return None
+    keys = {}
+    for node in tree.find_all(nodes.Name):
+        if node.name not in RENDER_VARIABLES:
+            continue
+        if node.ctx != "load":
+            return None
+        keys.setdefault(node.name, set())
+    lookups = {}
+    for node in tree.find_all((nodes.Getattr, nodes.Getitem)):
+        if isinstance(node.node, nodes.Name) and node.node.name in keys:
+            if isinstance(node, nodes.Getattr):
+                key = node.attr
+            elif isinstance(node.arg, nodes.Const):
+                key = node.arg.value
+            else:
+                continue
+            keys[node.node.name].add(key)
+            lookups[node.node.name] = lookups.get(node.node.name, 0) + 1
+    for variable in keys:
+        # Used other than as variable.key somewhere, so all of it counts
+        uses = sum(
+            1 for node in tree.find_all(nodes.Name) if node.name == variable
+        )
+        if uses != lookups.get(variable, 0):
+            keys[variable] = None
+    for included in meta.find_referenced_templates(tree):
+        if included is None:
+            return None
+        included_keys = template_dependencies(included, environment)
+        if included_keys is None:
+            return None
+        for variable, used in included_keys.items():
+            if variable not in keys:
+                keys[variable] = used
+            elif keys[variable] is None or used is None:
+                keys[variable] = None
+            else:
+                keys[variable] |= used
+    return keys
+
+
+class RenderPlan:
+    """base.conf split into literal text and the sections it includes
+
+    Args:
+        environment (jinja2.Environment): The environment to render with
+        name (str): The name of the base template
+
+    Attributes:
+        parts (list): Literal strings and (template, dependencies) pairs,
+            in output order, or None when the base template does more than
+            include sections and so has to be rendered whole
+    """
+
+    def __init__(self, environment, name=BASE_TEMPLATE):
+        from jinja2 import nodes
+
+        self.environment = environment
+        self.name = name
+        self.template = environment.get_template(name)
+        self.parts = []
+        self.fragments = {}
+        self.checked = time.monotonic()
+        self._lock = threading.Lock()
+        source = environment.loader.get_source(environment, name)[0]
+        for node in environment.parse(source).body:
+            if (
+                isinstance(node, nodes.Include)
+                and isinstance(node.template, nodes.Const)
+                and not node.ignore_missing
+            ):
+                include = node.template.value
+                template = environment.get_template(include)
+                dependencies = template_dependencies(include, environment)
+                if dependencies is not None and "vlan_info" in dependencies:
+                    dependencies = None
+                elif dependencies is not None:
+                    config_keys = dependencies.get("config", set())
+                    # Sorted so equal settings always give the same key
+                    dependencies["config"] = (
+                        None if config_keys is None else sorted(config_keys)
+                    )
+                self.parts.append((template, dependencies))
+            elif isinstance(node, nodes.Output) and all(
+                isinstance(child, nodes.TemplateData) for child in node.nodes
+            ):
+                self.parts.append("".join(child.data for child in node.nodes))
+            else:
+                log.info(f"Rendering {name} whole, it does more than include")
+                self.parts = None
+                break
+
+    def is_current(self):
+        """Whether none of the templates have been edited since planning"""
+        if self.environment.get_template(self.name) is not self.template:
+            return False
+        for part in self.parts or ():
+            if isinstance(part, tuple):
+                template = part[0]
+                if self.environment.get_template(template.name) is not template:
+                    return False
+        return True
+
+    def _fragment(self, template, dependencies, config):
+        config_keys = dependencies["config"]
+        if config_keys is None:
+            inputs = manifest.hash_json(config)
+        else:
+            # repr of plain settings values is cheaper than hashing JSON and
+            # tells the same values apart
+            inputs = repr(
+                [(key, config[key]) for key in config_keys if key in config]
+            )
+        key = (template.name, inputs)
+        with self._lock:
+            text = self.fragments.get(key)
+        if text is not None:
+            return text
+        metrics.count("fragment_cache_misses")
+        text = template.render(config=config)
+        with self._lock:
+            if len(self.fragments) >= FRAGMENT_CACHE_SIZE:
+                del self.fragments[next(iter(self.fragments))]
+            self.fragments[key] = text
+        return text
+
+    def generate(self, config, vlan_info):
+        """Render a network's config chunk by chunk from cached sections"""
+        if self.parts is None:
+            yield from self.template.generate(config=config, vlan_info=vlan_info)
+            return
+        for part in self.parts:
+            if isinstance(part, str):
+                yield part
+                continue
+            template, dependencies = part
+            if dependencies is None:
+                # Each section at once, generating chunk by chunk through
+                # nested generators is far slower
+                yield template.render(config=config, vlan_info=vlan_info)
+            else:
+                yield self._fragment(template, dependencies, config)
+
+
+_plans = {}
+_plans_lock = threading.Lock()
+
+
+def get_plan(name=BASE_TEMPLATE):
+    """Return the RenderPlan of a template, planning it again once edited"""
+    environment = get_environment()
+    with _plans_lock:
+        plan = _plans.get((environment, name))
+        now = time.monotonic()
+        if plan is not None and now - plan.checked >= PLAN_CHECK_INTERVAL:
+            if plan.is_current():
+                plan.checked = now
+            else:
+                plan = None
+        if plan is None:
+            plan = _plans[(environment, name)] = RenderPlan(environment, name)
+    return plan
+
+
+def render_network(config, vlan_info):
+    """Render the full config of one network
+
+    Safe to call from several threads at once.
+
+    Args:
+        config (dict): The org settings returned by process_settings
+        vlan_info (list): The VLANs returned by from_meraki_get_vlans
+
+    Returns:
+        str: the rendered config
+    """
+    return "".join(get_plan().generate(config, vlan_info))
+
+
+def render_network_to_file(filename, config, vlan_info, check=True, delta_dir=None,
+                           replaces=None):
+    """Stream the rendered config of one network straight to disk
+
+    The template is rendered chunk by chunk into a buffered, atomic write
+    so the full config is never held in memory as one string. The chunks
+    are checked on their way to disk, so a config with structural errors
+    never replaces the file.
+
+    Args:
+        filename (str): The path of the config file to write
+        config (dict): The org settings returned by process_settings
+        vlan_info (list): The VLANs returned by from_meraki_get_vlans
+        check (bool): Whether to check the config with fortios.checked
+        delta_dir (str): Where to write the script of the changes from the
+            config being replaced, under the same file name, if anywhere
+        replaces (str): The config file this one is to replace once checked,
+            when written beside it rather than over it, defaults to filename
+
+    Returns:
+        int: the number of bytes written
+
+    Raises:
+        fortios.ConfigError: if the rendered config has errors
+    """
+    previous = None
+    if delta_dir is not None:
+        previous = configtree.load(replaces or filename)
+    with metrics.span("render"):
+        chunks = get_plan().generate(config, vlan_info)
+        if check:
+            chunks = fortios.checked(chunks, filename)
+        if previous is not None:
+            builder = configtree.Builder()
+            chunks = builder.tee(chunks)
+        written = fileops.write_atomic(filename, chunks)
+    if previous is not None:
+        delta = os.path.join(delta_dir, os.path.basename(filename))
+        lines = configtree.write_delta(delta, previous, builder.close())
+        log.info(f"Wrote {lines} changed lines of {filename} to {delta}")
+    return written
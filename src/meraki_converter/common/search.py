@@ -0,0 +1,104 @@
+"""Trigram index for finding networks and organizations by name, tag or ID"""
+
+import collections
+import heapq
+
+
+def trigrams(text):
+    """Return the set of three character substrings of text"""
+    return {text[pos:pos + 3] for pos in range(len(text) - 2)}
+
+
+def padded_trigrams(text):
+    """Trigrams of text padded so the start and end of words also match"""
+    return trigrams(f"  {text} ")
+
+
+class SearchIndex:
+    """Index over the name, tags and ID of dashboard items
+
+    Every lowercase name is split into trigrams once, and a search only
+    checks the names that contain all of the query's trigrams. A query
+    that is not a substring of any name falls back to ranking names by
+    the trigrams they share with it, which tolerates typos.
+    """
+
+    def __init__(self, items):
+        self.items = sorted(items, key=lambda x: x["name"])
+        self._names = [item["name"].lower() for item in self.items]
+        self._ids = {}
+        self._tags = collections.defaultdict(list)
+        self._grams = collections.defaultdict(list)
+        # Positions are added in order, so every posting list is sorted
+        for pos, (item, name) in enumerate(zip(self.items, self._names)):
+            self._ids[item["id"]] = pos
+            for tag in item.get("tags") or ():
+                self._tags[tag.lower()].append(pos)
+            for gram in padded_trigrams(name):
+                self._grams[gram].append(pos)
+
+    def __len__(self):
+        return len(self.items)
+
+    def _positions(self, query):
+        grams = trigrams(query)
+        if not grams:
+            # Too short to have trigrams, so check every name
+            return [p for p, name in enumerate(self._names) if query in name]
+        postings = sorted((self._grams.get(gram, ()) for gram in grams), key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                return []
+        return sorted(p for p in candidates if query in self._names[p])
+
+    def fuzzy(self, query, limit=10, cutoff=0.4):
+        """Return the items whose names are most similar to query
+
+        Args:
+            query (str): The text to compare names to
+            limit (int): The most items to return
+            cutoff (float): The lowest share of the query's trigrams a name
+                must contain to be returned
+
+        Returns:
+            list: the items, most similar first
+        """
+        grams = padded_trigrams(query.strip().lower())
+        shared = collections.Counter()
+        for gram in grams:
+            shared.update(self._grams.get(gram, ()))
+        # Score by how much of the query a name contains, then prefer the
+        # shorter name as it has the fewest characters the query lacks
+        scores = (
+            (count / len(grams), -len(self._names[pos]), -pos)
+            for pos, count in shared.items()
+        )
+        best = heapq.nlargest(limit, scores)
+        return [self.items[-pos] for score, _, pos in best if score >= cutoff]
+
+    def search(self, query):
+        """Return the items matching query, sorted by name
+
+        An empty query returns everything, an exact ID returns that item,
+        tag:<name> returns the items with that tag, and anything else is a
+        case insensitive substring of the name.
+
+        Args:
+            query (str): The text to search for
+
+        Returns:
+            list: the matching items
+        """
+        query = query.strip()
+        if not query:
+            return self.items
+        if query in self._ids:
+            return [self.items[self._ids[query]]]
+        query = query.lower()
+        if query.startswith("tag:"):
+            positions = self._tags.get(query[4:].strip(), [])
+        else:
+            positions = self._positions(query)
+        return [self.items[pos] for pos in positions]
@@ -0,0 +1,267 @@
+"""Cached, validated loading of the org settings files"""
+
+import dataclasses
+import ipaddress
+import os
+import threading
+
+try:
+    import tomllib
+except ModuleNotFoundError:
+    # Python 3.10 has no tomllib, fall back to the style preserving parser
+    tomllib = None
+    import tomlkit
+
+_toml_cache = {}
+_settings_cache = {}
+_cache_lock = threading.Lock()
+
+
+class SettingsError(ValueError):
+    """Raised when a settings file is missing keys or has invalid values"""
+
+
+def load_toml(path):
+    """Parse a TOML file, reusing the result until the file changes
+
+    The cache is keyed by path, modification time and size. The returned
+    dict is shared between callers and must not be modified.
+
+    Args:
+        path (str): The TOML file to load
+
+    Returns:
+        dict: the parsed file
+    """
+    stat = os.stat(path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached = _toml_cache.get(path)
+    if cached and cached[0] == key:
+        return cached[1]
+    with open(path, "rb") as file:
+        if tomllib:
+            data = tomllib.load(file)
+        else:
+            data = tomlkit.parse(file.read().decode("utf-8")).unwrap()
+    with _cache_lock:
+        _toml_cache[path] = (key, data)
+    return data
+
+
+def merge(base, override):
+    """Return base with the tables and keys of override layered on top"""
+    merged = dict(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def _ip():
+    return dataclasses.field(metadata={"check": "ip"})
+
+
+@dataclasses.dataclass(slots=True, frozen=True)
+class GlobalSettings:
+    hostname: str
+    gui_theme: str
+    model: str = ""
+
+
+@dataclasses.dataclass(slots=True, frozen=True)
+class InterfaceSettings:
+    loopback_name: str
+    loopback_description: str
+    loopback_ip: str = _ip()
+    wan_name: str
+    wan_description: str
+    wan_ip: str = _ip()
+    wan_mask: str = _ip()
+    wan_gw: str = _ip()
+    lan_interface: str
+
+
+@dataclasses.dataclass(slots=True, frozen=True)
+class SystemDnsSettings:
+    system_dns_primary: str = _ip()
+    system_dns_secondary: str = _ip()
+    system_domain: str
+
+
+@dataclasses.dataclass(slots=True, frozen=True)
+class FortimanagerSettings:
+    fortimanager_server: str
+
+
+@dataclasses.dataclass(slots=True, frozen=True)
+class FortianalyzerSettings:
+    fortianalyzer_server: str
+    fortianalyzer_serial: str
+
+
+@dataclasses.dataclass(slots=True, frozen=True)
+class IpsecSettings:
+    ipsec_remote_gw: str
+    ipsec_vpn_secret: str
+
+
+@dataclasses.dataclass(slots=True, frozen=True)
+class BgpSettings:
+    local_asn: str
+    remote_asn: str
+    neighbor_ip: str = _ip()
+
+
+@dataclasses.dataclass(slots=True, frozen=True)
+class UserSettings:
+    user1: str
+    user1_password: str
+    user1_profile: str
+    user2: str
+    user2_password: str
+    user2_profile: str
+    user3: str
+    user3_password: str
+    user3_profile: str
+
+
+@dataclasses.dataclass(slots=True, frozen=True)
+class TacacsSettings:
+    ise_server: str
+    ise_key: str
+
+
+@dataclasses.dataclass(slots=True, frozen=True)
+class NetflowSettings:
+    netflow_collector_ip: str = _ip()
+
+
+@dataclasses.dataclass(slots=True, frozen=True)
+class BannerSettings:
+    banner: str
+
+
+@dataclasses.dataclass(slots=True, frozen=True)
+class OrgSettings:
+    """Every table of an org settings file, keyed by its TOML table name"""
+
+    global_: GlobalSettings
+    interface: InterfaceSettings
+    system_dns: SystemDnsSettings
+    fortimanager: FortimanagerSettings
+    fortianalyzer: FortianalyzerSettings
+    ipsec: IpsecSettings
+    bgp: BgpSettings
+    user: UserSettings
+    tacacs: TacacsSettings
+    netflow: NetflowSettings
+    banner: BannerSettings
+
+    def to_config(self):
+        """Flatten every table into the single dict the templates use"""
+        config = {}
+        for table in dataclasses.fields(self):
+            values = getattr(self, table.name)
+            for field in dataclasses.fields(values):
+                config[field.name] = getattr(values, field.name)
+        config["banner"] = config["banner"].strip("\n")
+        return config
+
+
+def _check_value(table, name, value, check):
+    if isinstance(value, bool) or not isinstance(value, (str, int)):
+        return f"[{table}] {name} must be a string, not {type(value).__name__}"
+    if check == "ip" and value:
+        try:
+            ipaddress.IPv4Address(str(value))
+        except ValueError:
+            return f"[{table}] {name} is not a valid IPv4 address: {value!r}"
+    return None
+
+
+def parse_org_settings(data, source="settings"):
+    """Validate parsed TOML against the OrgSettings schema
+
+    Args:
+        data (dict): The parsed, merged settings
+        source (str): Where the settings came from, used in errors
+
+    Returns:
+        OrgSettings
+    """
+    errors = []
+    tables = {}
+    for table in dataclasses.fields(OrgSettings):
+        toml_name = table.name.rstrip("_")
+        schema = table.type
+        values = data.get(toml_name)
+        if not isinstance(values, dict):
+            errors.append(f"Missing table [{toml_name}]")
+            continue
+        table_errors = len(errors)
+        known = {field.name: field for field in dataclasses.fields(schema)}
+        for name in values.keys() - known.keys():
+            errors.append(f"[{toml_name}] has unknown key {name}")
+        kwargs = {}
+        for name, field in known.items():
+            if name not in values:
+                if field.default is dataclasses.MISSING:
+                    errors.append(f"[{toml_name}] is missing key {name}")
+                continue
+            error = _check_value(
+                toml_name, name, values[name], field.metadata.get("check")
+            )
+            if error:
+                errors.append(error)
+            else:
+                kwargs[name] = str(values[name])
+        if len(errors) == table_errors:
+            tables[table.name] = schema(**kwargs)
+    if errors:
+        raise SettingsError(f"Invalid settings in {source}: " + "; ".join(errors))
+    return OrgSettings(**tables)
+
+
+def settings_files(org_name, site=None, input_dir="input"):
+    """Return the settings files that apply, from least to most specific
+
+    A shared base_settings.toml is optional, the org file is required, and a
+    site file at <org>/<site>.toml overrides both when it exists.
+    """
+    files = []
+    base = os.path.join(input_dir, "base_settings.toml")
+    if os.path.exists(base):
+        files.append(base)
+    files.append(os.path.join(input_dir, f"{org_name}.toml"))
+    if site:
+        site_file = os.path.join(input_dir, org_name, f"{site}.toml")
+        if os.path.exists(site_file):
+            files.append(site_file)
+    return files
+
+
+def load_org_settings(org_name, site=None, input_dir="input"):
+    """Load, merge and validate the settings for an org and optional site
+
+    Args:
+        org_name (str): The organization name, matching input/<org>.toml
+        site (str): The network name, matching input/<org>/<site>.toml
+        input_dir (str): The directory holding the settings files
+
+    Returns:
+        OrgSettings
+    """
+    files = settings_files(org_name, site, input_dir)
+    key = tuple((path, os.stat(path).st_mtime_ns) for path in files)
+    cached = _settings_cache.get(key)
+    if cached:
+        return cached
+    data = {}
+    for path in files:
+        data = merge(data, load_toml(path))
+    settings = parse_org_settings(data, " + ".join(files))
+    with _cache_lock:
+        _settings_cache[key] = settings
+    return settings
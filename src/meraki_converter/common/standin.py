@@ -0,0 +1,240 @@
+"""Local HTTP stand-in for the Meraki dashboard API
+
+Serves the endpoints the converter calls from a SyntheticDashboard or
+from responses recorded in the response cache, so merakiops, merakiaio and
+batch runs can be exercised end to end with no network or API key. Point
+get_dashboard at it with base_url, or MERAKI_DASHBOARD_BASE_URL.
+
+Latency, page size and 429 injection are configurable to load test the
+pagination, concurrency and rate limit handling.
+"""
+
+import http.server
+import json
+import logging
+import re
+import threading
+import time
+import urllib.parse
+
+from meraki_converter.common import apicache
+
+log = logging.getLogger(__name__)
+
+# Path pattern, section and method of the backend, the extra keyword
+# arguments the converter calls it with, and the cursor key when paginated
+ROUTES = [
+    (r"/organizations", "organizations", "getOrganizations", {}, None),
+    (r"/organizations/([^/]+)", "organizations", "getOrganization", {}, None),
+    (
+        r"/organizations/([^/]+)/networks",
+        "organizations",
+        "getOrganizationNetworks",
+        {"total_pages": "all"},
+        "id",
+    ),
+    (
+        r"/organizations/([^/]+)/configurationChanges",
+        "organizations",
+        "getOrganizationConfigurationChanges",
+        {"total_pages": "all"},
+        None,
+    ),
+    (
+        r"/organizations/([^/]+)/devices",
+        "organizations",
+        "getOrganizationDevices",
+        {"total_pages": "all", "productTypes": ["appliance"]},
+        "serial",
+    ),
+    (
+        r"/organizations/([^/]+)/appliance/uplink/statuses",
+        "appliance",
+        "getOrganizationApplianceUplinkStatuses",
+        {"total_pages": "all"},
+        "serial",
+    ),
+    (
+        r"/networks/([^/]+)/appliance/vlans",
+        "appliance",
+        "getNetworkApplianceVlans",
+        {},
+        None,
+    ),
+    (
+        r"/networks/([^/]+)/appliance/warmSpare",
+        "appliance",
+        "getNetworkApplianceWarmSpare",
+        {},
+        None,
+    ),
+]
+ROUTES = [(re.compile(f"/api/v1{path}"), *route) for path, *route in ROUTES]
+
+# Query parameters passed on to the backend methods that filter by them
+QUERY_PARAMS = {"getOrganizationConfigurationChanges": ("t0", "t1", "networkId")}
+
+
+def paginate(items, cursor, query, page_size):
+    """Return one page of items and the query of the next page, if any
+
+    Args:
+        items (list): Every item of the listing
+        cursor (str): The key of each item that startingAfter refers to
+        query (dict): The parsed query string of the request
+        page_size (int): The page size when the request gives no perPage
+
+    Returns:
+        tuple: the page and the query string of the next page or None
+    """
+    per_page = int(query.get("perPage", [page_size])[0])
+    start = 0
+    after = query.get("startingAfter", [None])[0]
+    if after is not None:
+        positions = [item[cursor] for item in items]
+        start = positions.index(after) + 1 if after in positions else len(items)
+    page = items[start:start + per_page]
+    if start + per_page >= len(items):
+        return page, None
+    next_query = urllib.parse.urlencode(
+        {"perPage": per_page, "startingAfter": page[-1][cursor]}
+    )
+    return page, next_query
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    server_version = "MerakiStandIn/1.0"
+
+    def log_message(self, format, *args):
+        log.debug(format % args)
+
+    def _send(self, status, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        standin = self.server.standin
+        url = urllib.parse.urlsplit(self.path)
+        if standin.latency:
+            time.sleep(standin.latency)
+        if standin.should_throttle():
+            self._send(
+                429,
+                {"errors": ["API rate limit exceeded for organization"]},
+                {"Retry-After": str(standin.retry_after)},
+            )
+            return
+        for pattern, section, method, kwargs, cursor in ROUTES:
+            match = pattern.fullmatch(url.path)
+            if match:
+                break
+        else:
+            self._send(404, {"errors": [f"No route for {url.path}"]})
+            return
+        backend = getattr(standin.backend, section)
+        query = urllib.parse.parse_qs(url.query)
+        kwargs = dict(kwargs)
+        for param in QUERY_PARAMS.get(method, ()):
+            if param in query:
+                kwargs[param] = query[param][0]
+        try:
+            args = [urllib.parse.unquote(group) for group in match.groups()]
+            body = getattr(backend, method)(*args, **kwargs)
+        except (KeyError, apicache.CacheMiss) as e:
+            self._send(404, {"errors": [f"Not found: {e}"]})
+            return
+        headers = {}
+        if cursor:
+            body, next_query = paginate(body, cursor, query, standin.page_size)
+            if next_query:
+                # Relative, as the meraki library prefixes a non meraki.com
+                # link with its base URL
+                path = url.path[len("/api/v1"):]
+                headers["Link"] = f"<{path}?{next_query}>; rel=next"
+        self._send(200, body, headers)
+
+
+class StandInServer:
+    """A dashboard stand-in served from a background thread
+
+    Args:
+        backend (obj): A SyntheticDashboard, or a CachedDashboard with no
+            dashboard to serve recorded responses
+        host (str): The address to listen on
+        port (int): The port to listen on, 0 picks a free one
+        latency (float): Seconds added to every response
+        page_size (int): The page size of paginated endpoints
+        throttle_every (int): Answer every nth request with a 429, 0 never
+        retry_after (int): The Retry-After of injected 429s in seconds
+    """
+
+    def __init__(self, backend, host="127.0.0.1", port=0, latency=0.0,
+                 page_size=1000, throttle_every=0, retry_after=1):
+        self.backend = backend
+        self.latency = latency
+        self.page_size = page_size
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        self.requests = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+        self._httpd = http.server.ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.standin = self
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/api/v1"
+
+    def should_throttle(self):
+        """Count a request and decide whether it gets an injected 429"""
+        with self._lock:
+            self.requests += 1
+            if self.throttle_every and self.requests % self.throttle_every == 0:
+                self.throttled += 1
+                return True
+        return False
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        log.info(f"Serving the dashboard stand-in at {self.base_url}")
+        return self
+
+    def serve_forever(self):
+        log.info(f"Serving the dashboard stand-in at {self.base_url}")
+        self._httpd.serve_forever()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def recorded_backend(directory):
+    """Serve the responses recorded in a response cache directory
+
+    Those recorded from the Meraki cloud with the key last used there, not
+    any recorded from a stand-in.
+    """
+    scope = apicache.cache_scope(
+        directory, offline=True, base_url=apicache.DEFAULT_BASE_URL
+    )
+    return apicache.CachedDashboard(
+        None, apicache.ResponseCache(directory, offline=True, scope=scope)
+    )
@@ -0,0 +1,96 @@
+"""Integer arithmetic for VLAN subnets, DHCP ranges and netmasks"""
+
+import collections
+import socket
+import struct
+
+_IPV4 = struct.Struct("!I")
+
+# Netmask and host mask for every prefix length, so neither is recomputed
+NETMASKS = [
+    socket.inet_ntoa(_IPV4.pack((0xFFFFFFFF << (32 - prefix)) & 0xFFFFFFFF))
+    for prefix in range(33)
+]
+HOSTMASKS = [(1 << (32 - prefix)) - 1 for prefix in range(33)]
+
+AddressPlan = collections.namedtuple(
+    "AddressPlan",
+    ["network", "broadcast", "start", "end", "netmask"],
+)
+AddressPlan.__doc__ = """Addressing of one VLAN
+
+network and broadcast are integers, start and end are the first and last
+usable addresses as strings.
+"""
+
+
+def ip_to_int(address):
+    """Convert a dotted quad to an integer, rejecting anything else"""
+    try:
+        return _IPV4.unpack(socket.inet_pton(socket.AF_INET, address))[0]
+    except (OSError, TypeError):
+        raise ValueError(f"Invalid IPv4 address {address!r}") from None
+
+
+def ips_to_ints(addresses):
+    """Convert many dotted quads to integers, faster than one at a time"""
+    unpack = _IPV4.unpack
+    inet_pton = socket.inet_pton
+    try:
+        return [unpack(inet_pton(socket.AF_INET, address))[0] for address in addresses]
+    except (OSError, TypeError):
+        # Again one at a time, to name the bad address
+        return [ip_to_int(address) for address in addresses]
+
+
+def int_to_ip(value):
+    return socket.inet_ntoa(_IPV4.pack(value))
+
+
+def parse_subnet(subnet):
+    """Parse a CIDR subnet once into its integer network and prefix length
+
+    Args:
+        subnet (str): The subnet, e.g. 10.0.10.0/24
+
+    Returns:
+        tuple: the network address as an integer and the prefix length
+    """
+    address, _, prefix = subnet.partition("/")
+    if not prefix.isdigit() or int(prefix) > 32:
+        raise ValueError(f"Invalid subnet {subnet!r}")
+    prefix = int(prefix)
+    network = ip_to_int(address)
+    if network & HOSTMASKS[prefix]:
+        raise ValueError(f"{subnet} has host bits set")
+    return network, prefix
+
+
+def address_plan(vlans):
+    """Work out the addressing of a whole list of VLANs in one pass
+
+    Each subnet is parsed once, the DHCP range runs from the first to the
+    last usable address, and the netmask comes from a precomputed table.
+
+    Args:
+        vlans (list): VLANs as returned by getNetworkApplianceVlans
+
+    Returns:
+        list: an AddressPlan for each VLAN, in the same order
+    """
+    plans = []
+    for vlan in vlans:
+        network, prefix = parse_subnet(vlan["subnet"])
+        if prefix > 30:
+            raise ValueError(f"Subnet {vlan['subnet']} is too small for DHCP")
+        broadcast = network | HOSTMASKS[prefix]
+        plans.append(
+            AddressPlan(
+                network,
+                broadcast,
+                int_to_ip(network + 1),
+                int_to_ip(broadcast - 1),
+                NETMASKS[prefix],
+            )
+        )
+    return plans
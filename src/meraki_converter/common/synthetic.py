@@ -0,0 +1,207 @@
+"""Deterministic generator of fake Meraki organizations for benchmarks and tests"""
+
+import ipaddress
+import random
+
+LEASE_TIMES = ["30 minutes", "1 hour", "4 hours", "12 hours", "1 day", "1 week"]
+NAME_SERVERS = ["upstream_dns", "google_dns", "opendns", "10.0.0.53\n10.0.1.53"]
+OPTION_SETS = [
+    [],
+    [{"code": "15", "type": "text", "value": "corp.example.org"}],
+    [{"code": "150", "type": "ip", "value": "10.10.10.10, 10.10.10.11"}],
+    [
+        {"code": "15", "type": "text", "value": "branch.example.org"},
+        {"code": "43", "type": "hex", "value": "f1:04:0a:00:00:05"},
+    ],
+    [
+        {"code": "78", "type": "ip", "value": "10.20.0.5"},
+        {"code": "79", "type": "text", "value": "scope1"},
+        {"code": "85", "type": "ip", "value": "10.20.0.6, 10.20.0.7"},
+    ],
+]
+
+
+def generate_networks(org_id="1", count=1000, seed=0):
+    """Return count appliance networks for a fake organization
+
+    Args:
+        org_id (str): The organization ID the networks belong to
+        count (int): The number of networks
+        seed (int): Seed for the tags given to each network
+
+    Returns:
+        list: networks shaped like getOrganizationNetworks results
+    """
+    rng = random.Random(f"{seed}-networks")
+    regions = ["east", "west", "north", "south"]
+    return [
+        {
+            "id": f"L_{org_id}{index:07d}",
+            "organizationId": org_id,
+            "name": f"Branch {index:05d}",
+            "productTypes": ["appliance"],
+            "tags": [rng.choice(regions)],
+            "timeZone": "America/Chicago",
+        }
+        for index in range(count)
+    ]
+
+
+def generate_vlans(network_index, count=100, clients=20, seed=0):
+    """Return count VLANs for one network, the same every time for the inputs
+
+    Each VLAN gets its own /24 carved out of 10.0.0.0/8, which wraps around
+    once an org has more than 65536 VLANs in total.
+
+    Args:
+        network_index (int): The position of the network in the org
+        count (int): The number of VLANs
+        clients (int): The number of fixed IP assignments per VLAN
+        seed (int): Seed for the per VLAN choices
+
+    Returns:
+        list: VLANs shaped like getNetworkApplianceVlans results
+    """
+    rng = random.Random(f"{seed}-{network_index}")
+    vlans = []
+    for position in range(count):
+        block = (network_index * count + position) % 65536
+        network = ipaddress.IPv4Network(((10 << 24) + (block << 8), 24))
+        base = int(network.network_address)
+        vlan = {
+            "id": position + 1,
+            "name": f"VLAN {position + 1}",
+            "applianceIp": str(ipaddress.IPv4Address(base + 1)),
+            "subnet": str(network),
+            "fixedIpAssignments": {
+                "02:00:%02x:%02x:%02x:%02x"
+                % ((block >> 8) & 255, block & 255, client >> 8, client & 255): {
+                    "ip": str(ipaddress.IPv4Address(base + 100 + client)),
+                    "name": f"Client {client}",
+                }
+                for client in range(min(clients, 150))
+            },
+            "reservedIpRanges": [
+                {
+                    "start": str(ipaddress.IPv4Address(base + 2)),
+                    "end": str(ipaddress.IPv4Address(base + 9)),
+                    "comment": "Infrastructure",
+                }
+            ],
+            "dnsNameservers": rng.choice(NAME_SERVERS),
+        }
+        if rng.random() < 0.1:
+            vlan["dhcpHandling"] = "Relay DHCP to another server"
+            vlan["dhcpRelayServerIps"] = ["10.0.0.67", "10.0.1.67"]
+        else:
+            vlan["dhcpHandling"] = "Run a DHCP server"
+            vlan["dhcpLeaseTime"] = rng.choice(LEASE_TIMES)
+            vlan["dhcpOptions"] = rng.choice(OPTION_SETS)
+        vlans.append(vlan)
+    return vlans
+
+
+class _Section:
+    pass
+
+
+class SyntheticDashboard:
+    """Stand-in for DashboardAPI that serves a generated organization
+
+    Only the calls the converter makes are provided. VLANs are generated on
+    demand so large orgs do not have to be held in memory.
+    """
+
+    def __init__(self, org_id="1", networks=1000, vlans=100, clients=20, seed=0):
+        self.org_id = org_id
+        self.vlan_count = vlans
+        self.client_count = clients
+        self.seed = seed
+        self.networks = generate_networks(org_id, networks, seed)
+        self._index = {net["id"]: pos for pos, net in enumerate(self.networks)}
+        # Configuration changes, appended to by tests of the watch mode
+        self.changes = []
+
+        self.organizations = _Section()
+        self.organizations.getOrganizations = self.get_organizations
+        self.organizations.getOrganization = self.get_organization
+        self.organizations.getOrganizationNetworks = self.get_organization_networks
+        self.organizations.getOrganizationDevices = self.get_organization_devices
+        self.organizations.getOrganizationConfigurationChanges = (
+            self.get_organization_configuration_changes
+        )
+        self.appliance = _Section()
+        self.appliance.getNetworkApplianceVlans = self.get_network_appliance_vlans
+        self.appliance.getNetworkApplianceWarmSpare = self.get_network_warm_spare
+        self.appliance.getOrganizationApplianceUplinkStatuses = (
+            self.get_organization_appliance_uplink_statuses
+        )
+
+    def get_organizations(self):
+        return [self.get_organization(self.org_id)]
+
+    def get_organization(self, org_id):
+        return {"id": org_id, "name": f"Synthetic Org {org_id}"}
+
+    def get_organization_networks(self, org_id, **kwargs):
+        return list(self.networks)
+
+    def get_network_appliance_vlans(self, net_id):
+        return generate_vlans(
+            self._index[net_id], self.vlan_count, self.client_count, self.seed
+        )
+
+    def get_network_warm_spare(self, net_id):
+        position = self._index[net_id]
+        return {
+            "enabled": position % 4 == 0,
+            "primarySerial": f"Q2AA-{position:04d}-0001",
+            "spareSerial": f"Q2AA-{position:04d}-0002" if position % 4 == 0 else None,
+        }
+
+    def get_organization_devices(self, org_id, **kwargs):
+        devices = []
+        for network in self.networks:
+            spare = self.get_network_warm_spare(network["id"])
+            for serial in (spare["primarySerial"], spare["spareSerial"]):
+                if serial:
+                    devices.append(
+                        {
+                            "serial": serial,
+                            "networkId": network["id"],
+                            "model": "MX85",
+                            "name": f"{network['name']} MX",
+                            "productType": "appliance",
+                        }
+                    )
+        return devices
+
+    def get_organization_appliance_uplink_statuses(self, org_id, **kwargs):
+        statuses = []
+        for network in self.networks:
+            spare = self.get_network_warm_spare(network["id"])
+            for role in ("primary", "spare"):
+                serial = spare[f"{role}Serial"]
+                if serial:
+                    statuses.append(
+                        {
+                            "serial": serial,
+                            "networkId": network["id"],
+                            "model": "MX85",
+                            "highAvailability": {
+                                "enabled": spare["enabled"],
+                                "role": role,
+                            },
+                            "uplinks": [],
+                        }
+                    )
+        return statuses
+
+    def get_organization_configuration_changes(self, org_id, t0=None,
+                                               networkId=None, **kwargs):
+        return [
+            change
+            for change in self.changes
+            if (t0 is None or change["ts"] >= t0)
+            and (networkId is None or change.get("networkId") == networkId)
+        ]
@@ -1,82 +1,36 @@
 """Pull settings from Meraki dashboard and use them to build fortigate config"""
 
-import ipaddress
+import argparse
 import logging
-
-import jinja2
-
-from meraki_converter.common import fileops, merakiops
+import sys
+
+from meraki_converter.common import (
+    apicache,
+    configtree,
+    conflicts,
+    fileops,
+    fortios,
+    metrics,
+    ratelimit,
+    records,
+    render,
+    settingsops,
+    subnets,
+)
+from meraki_converter.common.dhcp_options import parse_dhcp_options
 
 log = logging.getLogger(__name__)
-fileops.setup_logging("main")
+
+# The servers behind the Meraki name server keywords other than upstream_dns
+PUBLIC_NAME_SERVERS = {
+    "google_dns": "8.8.8.8\n8.8.4.4",
+    "opendns": "208.67.222.222\n208.67.220.220",
+}
 
 
 def setup_fixed_address_clients(clients):
-    """Create and return a list of all client attributes"""
-    client_list = []
-    for count, client in enumerate(clients, start=1):
-        client_data = {
-            "count": count,
-            "ip": clients[client]["ip"],
-            "mac": client,
-            "description": clients[client].get("name", "")
-        }
-        client_list.append(client_data)
-    return client_list
-
-
-def parse_dhcp_options(options):
-    """For each Meraki DHCP option, format to Fortigate options"""
-    all_options = {
-        "code_15_text": "",
-        "code_43_hex": "",
-        "code_78_ip": "",
-        "code_79_text": "",
-        "code_85_ip": "",
-        "code_150_ip": ""}
-    for option in options:
-        if option["code"] == "15" and option["type"] == "text":
-            try:
-                fileops.validate_domain(option["value"])
-            except ValueError:
-                all_options["code_15_text"] = "Error"
-            else:
-                all_options["code_15_text"] = option["value"]
-        elif option["code"] == "43" and option["type"] == "hex":
-            new_format = []
-            hex_string = option["value"].split(":")
-            new_format.append(hex_string[0] + hex_string[1])
-            new_format.append(hex_string[2] + hex_string[3])
-            new_format.append(hex_string[4] + hex_string[5])
-            all_options["code_43_hex"] = ":".join(new_format) 
-        elif option["code"] == "78" and option["type"] == "ip":
-            code_78_ips = option["value"].split(",")
-            code_78_mystr = ""
-            for code_78_ip in code_78_ips:
-                code_78_mystr += code_78_ip.strip()
-                code_78_mystr += " "
-            all_options["code_78_ip"] = code_78_mystr.rstrip()
-        elif option["code"] == "79" and option["type"] == "text":
-            all_options["code_79_text"] = option["value"]
-        elif option["code"] == "85" and option["type"] == "ip":
-            code_85_ips = option["value"].split(",")
-            code_85_mystr = ""
-            for code_85_ip in code_85_ips:
-                code_85_mystr += code_85_ip.strip()
-                code_85_mystr += " "
-            all_options["code_85_ip"] = code_85_mystr.rstrip()
-        elif option["code"] == "150" and option["type"] == "ip":
-            ips = option["value"].split(",")
-            mystr = ""
-            for ip in ips:
-                mystr += ip.strip()
-                mystr += " "
-            all_options["code_150_ip"] = mystr.rstrip()
-        elif option["code"] == "115":
-            next
-        else:
-            raise TypeError("Undefined DHCP option code provided")
-    return all_options
+    """Create and return a ClientTable of the fixed IP assignments"""
+    return records.fixed_clients(clients)
 
 
 def convert_lease_time_to_seconds(lease):
@@ -98,96 +52,57 @@ def convert_lease_time_to_seconds(lease):
             raise ValueError("The specified lease time has not been defined")
 
 
-def process_settings(org_name):
-    """Get the settings from org_name and return a dict object with them"""
-    req_keys = [
-        "global",
-        "interface",
-        "system_dns",
-        "fortimanager",
-        "fortianalyzer",
-        "ipsec",
-        "bgp",
-        "user",
-        "tacacs",
-        "netflow",
-        "banner",
-    ]
-    settings = fileops.load_settings(f"input/{org_name}.toml", req_keys)
-    config = {
-        # global
-        "model": settings["global"]["model"],
-        "hostname": settings["global"]["hostname"],
-        "gui_theme": settings["global"]["gui_theme"],
-        # interface
-        "loopback_name": settings["interface"]["loopback_name"],
-        "loopback_description": settings["interface"]["loopback_description"],
-        "loopback_ip": settings["interface"]["loopback_ip"],
-        "wan_name": settings["interface"]["wan_name"],
-        "wan_description": settings["interface"]["wan_description"],
-        "wan_ip": settings["interface"]["wan_ip"],
-        "wan_mask": settings["interface"]["wan_mask"],
-        "wan_gw": settings["interface"]["wan_gw"],
-        "lan_interface": settings["interface"]["lan_interface"],
-        # dns
-        "system_dns_primary": settings["system_dns"]["system_dns_primary"],
-        "system_dns_secondary": settings["system_dns"]["system_dns_secondary"],
-        "system_domain": settings["system_dns"]["system_domain"],
-        # fortimanager
-        "fortimanager_server": settings["fortimanager"]["fortimanager_server"],
-        # fortianalyzer
-        "fortianalyzer_server": settings["fortianalyzer"]["fortianalyzer_server"],
-        "fortianalyzer_serial": settings["fortianalyzer"]["fortianalyzer_serial"],
-        # ipsec
-        "ipsec_remote_gw": settings["ipsec"]["ipsec_remote_gw"],
-        "ipsec_vpn_secret": settings["ipsec"]["ipsec_vpn_secret"],
-        # bgp
-        "local_asn": settings["bgp"]["local_asn"],
-        "remote_asn": settings["bgp"]["remote_asn"],
-        "neighbor_ip": settings["bgp"]["neighbor_ip"],
-        # user
-        "user1": settings["user"]["user1"],
-        "user1_password": settings["user"]["user1_password"],
-        "user1_profile": settings["user"]["user1_profile"],
-        "user2": settings["user"]["user2"],
-        "user2_password": settings["user"]["user2_password"],
-        "user2_profile": settings["user"]["user2_profile"],
-        "user3": settings["user"]["user3"],
-        "user3_password": settings["user"]["user3_password"],
-        "user3_profile": settings["user"]["user3_profile"],
-        # tacacs
-        "ise_server": settings["tacacs"]["ise_server"],
-        "ise_key": settings["tacacs"]["ise_key"],
-        # netflow
-        "netflow_collector_ip": settings["netflow"]["netflow_collector_ip"],
-        # banner
-        "banner": settings["banner"]["banner"].strip("\n"),
-    }
-
-    return config
+def process_settings(org_name, site=None):
+    """Get the settings from org_name and return a dict object with them
+
+    input/base_settings.toml, if present, supplies defaults for every org and
+    input/<org_name>/<site>.toml, if present, overrides them for one network.
+    """
+    with metrics.span("process_settings"):
+        try:
+            settings = settingsops.load_org_settings(org_name, site)
+        except FileNotFoundError as e:
+            sys.exit(f"Could not find file {e.filename}")
+        except settingsops.SettingsError as e:
+            sys.exit(str(e))
+    return settings.to_config()
 
 
 def from_meraki_get_vlans(dashboard, netid):
-    # Get list of vlans TODO: put in try block incase there are none
-    vlans = dashboard.appliance.getNetworkApplianceVlans(netid)
+    with metrics.span("from_meraki_get_vlans"):
+        # Get list of vlans TODO: put in try block incase there are none
+        vlans = dashboard.appliance.getNetworkApplianceVlans(netid)
+        # Before formatting, which cannot render a conflicting VLAN anyway
+        found = conflicts.check_network(vlans, netid)
+        if found:
+            raise conflicts.ConflictError(found)
+        return format_vlans(vlans)
+
 
-    # Extract vlan info into dict
+def format_vlans(vlans):
+    """Format the VLANs returned by getNetworkApplianceVlans for the templates
+
+    The VLANs are expected to have passed conflicts.check_network, which
+    rejects more reserved ranges than FortiOS allows.
+
+    Args:
+        vlans (list): The VLANs of one network
+
+    Returns:
+        list: a records.Vlan for each VLAN, in the same order
+    """
     all_vlans = []
-    for vlan in vlans:
-        vlan_info = {
-            "vlan_name": vlan["name"],
-            "vlan_id": vlan["id"],
-            "vlan_ip": vlan["applianceIp"],
-            "vlan_subnet": vlan["subnet"],
-            "vlan_start": format(ipaddress.IPv4Network(vlan["subnet"])[1]),
-            "vlan_end": format(ipaddress.IPv4Network(vlan["subnet"])[-2]),
-            "dhcp_handling": vlan["dhcpHandling"],
-            "dhcp_fixed": vlan["fixedIpAssignments"],
-            "dhcp_reserved": vlan["reservedIpRanges"],
-            "dhcp_name_servers": vlan["dnsNameservers"],
-        }
-        netmask = ipaddress.ip_network(vlan_info["vlan_subnet"]).netmask
-        vlan_info["vlan_netmask"] = netmask
+    # Parse every subnet once, up front, into its ranges and netmask
+    plans = subnets.address_plan(vlans)
+    for vlan, plan in zip(vlans, plans):
+        name_servers = vlan["dnsNameservers"]
+        name_servers = PUBLIC_NAME_SERVERS.get(name_servers, name_servers)
+        if name_servers != "upstream_dns":
+            name_servers = tuple(
+                f"set dns-server{count} {server}"
+                for count, server in enumerate(name_servers.split("\n"), start=1)
+            )
+        vlan_info = {}
         if "dhcpRelayServerIps" in vlan:
             vlan_info["dhcp_relay"] = " ".join(vlan["dhcpRelayServerIps"])
         if "dhcpLeaseTime" in vlan:
@@ -195,58 +110,110 @@ def from_meraki_get_vlans(dashboard, netid):
             vlan_info["dhcp_lease_time"] = lease
         if "dhcpOptions" in vlan:
             vlan_info["dhcp_options"] = parse_dhcp_options(vlan["dhcpOptions"])
-        dhcp_servers = []
-        if vlan_info["dhcp_name_servers"] not in [
-            "upstream_dns",
-            "google_dns",
-            "opendns",
-        ]:
-            dns_servers = vlan_info["dhcp_name_servers"].split("\n")
-            for count, server in enumerate(dns_servers):
-                dhcp_servers.append(f"set dns-server{count+1} {server}")
-            vlan_info["dhcp_name_servers"] = dhcp_servers
         if vlan["fixedIpAssignments"]:
             clients = setup_fixed_address_clients(vlan["fixedIpAssignments"])
             vlan_info["clients"] = clients
-        all_vlans.append(vlan_info)
-        if len(vlan_info["dhcp_reserved"]) > 16:
-            print(len(vlan_info["dhcp_reserved"]))
-            raise Exception("Exceeds maximum allowed reservations")
+        all_vlans.append(
+            records.Vlan(
+                vlan_name=vlan["name"],
+                vlan_id=vlan["id"],
+                vlan_ip=vlan["applianceIp"],
+                vlan_subnet=vlan["subnet"],
+                vlan_start=plan.start,
+                vlan_end=plan.end,
+                vlan_netmask=plan.netmask,
+                dhcp_handling=vlan["dhcpHandling"],
+                dhcp_name_servers=name_servers,
+                dhcp_reserved=records.reservations(vlan["reservedIpRanges"]),
+                **vlan_info,
+            )
+        )
     return all_vlans
 
 
-def main():
+def metrics_directory(settings):
+    return settings.get("metrics", {}).get("directory", "output/metrics/")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Convert a Meraki network into a Fortigate config"
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Only use cached dashboard responses, no API key is needed",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always query the dashboard instead of using cached responses",
+    )
+    parser.add_argument(
+        "--delta",
+        action="store_true",
+        help=f"Also write the changes to the config replaced, as a script, to "
+        f"{configtree.DELTA_DIR}",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    # The meraki library is slow to import, so only load it when it is used
+    from meraki_converter.common import merakiops
+
+    args = parse_args(argv)
+    fileops.setup_logging("main")
     # Get the title and print it out to the screen
     req_keys = ["title", "logging"]
     settings = fileops.load_settings("input/general_settings.toml", req_keys)
     fileops.clear_screen()
     title = settings["title"]
     print(fileops.colorme(title, "red"))
+    ratelimit.configure(settings)
 
     # Select an organization to work with
     log.info("Creating instance of the Meraki dashboard")
-    dashboard = merakiops.get_dashboard()
-    org_id, org_name = merakiops.select_organization(dashboard)
+    if args.no_cache:
+        dashboard = merakiops.get_dashboard()
+    else:
+        cache = apicache.cache_from_settings(settings, offline=args.offline)
+        dashboard = merakiops.get_cached_dashboard(cache, offline=args.offline)
+    with metrics.span("select_organization"):
+        org_id, org_name = merakiops.select_organization(dashboard)
     log.info(f"User has selected organization {org_name} with ID {org_id}")
 
     # Specify which network in that organization to pull data from
-    network_id, network_name = merakiops.select_network(dashboard, org_id)
+    with metrics.span("select_network"):
+        network_id, network_name = merakiops.select_network(dashboard, org_id)
     log.info(f"User has selected network {network_name} with ID {network_id}")
 
     # Get and format the configuration information
-    vlan_info = from_meraki_get_vlans(dashboard, network_id)
+    try:
+        vlan_info = from_meraki_get_vlans(dashboard, network_id)
+    except conflicts.ConflictError as e:
+        for conflict in e.conflicts:
+            print(fileops.colorme(conflict.message, "red"))
+        sys.exit(f"Fix the {len(e.conflicts)} addressing conflicts in {network_name}")
+    except apicache.CacheMiss as e:
+        sys.exit(f"{e}, run online first")
     config = process_settings(org_name)
 
-    # Load and render jinja templates
-    log.info("Loading jinja templates")
-    file_loader = jinja2.FileSystemLoader("templates")
-    env = jinja2.Environment(loader=file_loader)
-    template = env.get_template("base.conf")
-    rendered_vlans = template.render(config=config, vlan_info=vlan_info)
-
-    # Write rendered data to file named after the network name
-    filename = "output/configs/" + network_name + ".conf"
+    # Render the jinja templates to a file named after the network name
+    name = fileops.safe_filename(network_name, network_id)
+    filename = f"output/configs/{name}.conf"
     log.info(f"Writing rendered output to file {filename}")
-    fileops.writelines_to_file(filename, rendered_vlans)
+    try:
+        render.render_network_to_file(
+            filename,
+            config,
+            vlan_info,
+            delta_dir=configtree.DELTA_DIR if args.delta else None,
+        )
+    except fortios.ConfigError as e:
+        for issue in e.issues:
+            print(fileops.colorme(f"{filename}:{issue.line}: {issue.message}", "red"))
+        sys.exit(f"The rendered config has {len(e.issues)} errors, see above")
+    metrics.write_reports("main", metrics_directory(settings))
     log.info("Script completed successfully")
     print(fileops.colorme("Script completed successfully", "green"))
@@ -0,0 +1,240 @@
+"""Keep the configs of an organization current by following its change log
+
+Each poll asks the dashboard for the configuration changes made since the
+last one and converts only the networks they were made in, so a change
+reaches its config within one interval for a few requests per poll.
+"""
+
+import argparse
+import logging
+import sys
+import time
+
+from meraki_converter import main as converter
+from meraki_converter.batch import check_configs, print_summary, run_batch
+from meraki_converter.common import (
+    changefeed,
+    configtree,
+    fileops,
+    manifest,
+    merakiops,
+    metrics,
+    ratelimit,
+    render,
+)
+
+log = logging.getLogger(__name__)
+
+
+def poll(dashboard, org_id, org_name, cursor, filters, state, pending=None,
+         workers=8, delta_dir=None):
+    """Convert the networks changed since the cursor
+
+    Args:
+        dashboard (obj): The Meraki dashboard instance
+        org_id (str): The organization ID
+        org_name (str): The name of the org settings
+        cursor (ChangeCursor): Where the last poll stopped
+        filters (dict): The name, tag and regex filters of the networks
+        state (Manifest): Input hashes of earlier runs
+        pending (set): IDs of networks not yet converted after earlier
+            polls, such as the cursor's, retried and each only removed
+            once converted or found up to date
+        workers (int): The maximum number of networks converted at once
+        delta_dir (str): Where to write the changes to each config replaced,
+            if anywhere
+
+    Returns:
+        tuple: lists of (network, filename) converted, (network, filename)
+            already up to date and (network, error) failures
+
+    Raises:
+        RuntimeError: when the networks cannot be fetched, leaving every
+            changed network pending
+    """
+    pending = set() if pending is None else pending
+    changes = changefeed.fetch_changes(dashboard, org_id, cursor)
+    metrics.count("watch_polls")
+    changed = changefeed.affected_network_ids(changes) | pending
+    if not changed:
+        return [], [], []
+    # Held until converted, as the cursor has already moved past the changes
+    pending.update(changed)
+    log.info(f"{len(changes)} changes to {len(changed)} networks since last poll")
+    # Fetch the networks again, a change may have renamed or retagged one
+    networks = fetch_networks(dashboard, org_id)
+    networks = [
+        network
+        for network in merakiops.filter_networks(networks, **filters)
+        if network["id"] in changed
+    ]
+    # Deleted, or no longer matching the filters, so nothing to convert
+    pending.intersection_update(network["id"] for network in networks)
+    result = convert(dashboard, org_name, networks, state, workers, delta_dir)
+    pending.difference_update(network["id"] for network, _ in result[0])
+    pending.difference_update(network["id"] for network, _ in result[1])
+    return result
+
+
+def fetch_networks(dashboard, org_id):
+    """Return the networks of the org, raising rather than returning none
+
+    Raises:
+        RuntimeError: when getOrganizationNetworks fails
+    """
+    networks = merakiops.get_networks(dashboard, org_id)
+    if networks is None:
+        raise RuntimeError(f"Unable to fetch the networks of organization {org_id}")
+    return networks
+
+
+def convert(dashboard, org_name, networks, state, workers=8, delta_dir=None):
+    """Convert networks, skipping those whose inputs have not changed"""
+    if not networks:
+        return [], [], []
+    base_hashes = {"templates": manifest.hash_templates(render.TEMPLATE_DIR)}
+    try:
+        succeeded, up_to_date, failed = run_batch(
+            dashboard,
+            networks,
+            org_name,
+            workers=workers,
+            state=state,
+            base_hashes=base_hashes,
+            delta_dir=delta_dir,
+            staged=True,
+        )
+        succeeded, bad = check_configs(
+            succeeded, state=state, delta_dir=delta_dir
+        )
+    finally:
+        state.save()
+    failed = failed + bad
+    result = succeeded, up_to_date, failed
+    metrics.count("networks", len(succeeded), status="converted")
+    metrics.count("networks", len(up_to_date), status="up_to_date")
+    metrics.count("networks", len(failed), status="failed")
+    return result
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Convert the networks of an organization as they change"
+    )
+    parser.add_argument("org_id", help="The Meraki organization ID")
+    parser.add_argument("--name", help="Only networks whose name contains this")
+    parser.add_argument("--tag", help="Only networks carrying this tag")
+    parser.add_argument("--regex", help="Only networks whose name matches this")
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=300,
+        help="Seconds between polls of the change log (default: 300)",
+    )
+    parser.add_argument(
+        "--once",
+        action="store_true",
+        help="Poll once and exit, for running from cron",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        help="Number of networks converted at the same time (default: 8)",
+    )
+    parser.add_argument(
+        "--settings",
+        help="Name of the org settings file in input/, defaults to the org name",
+    )
+    parser.add_argument(
+        "--cursor",
+        default=changefeed.CURSOR_PATH,
+        help=f"File the last seen change is kept in (default: "
+        f"{changefeed.CURSOR_PATH})",
+    )
+    parser.add_argument(
+        "--delta",
+        action="store_true",
+        help=f"Also write the changes to each config replaced, as a script, to "
+        f"{configtree.DELTA_DIR}",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    fileops.setup_logging("watch")
+    req_keys = ["title", "logging"]
+    settings = fileops.load_settings("input/general_settings.toml", req_keys)
+    print(fileops.colorme(settings["title"], "red"))
+    ratelimit.configure(settings)
+
+    # Not cached, every poll has to see the dashboard as it is now
+    dashboard = merakiops.get_dashboard(org=args.org_id)
+    org_name = args.settings or merakiops.get_organization_name(
+        dashboard, args.org_id
+    )
+    # Fail on bad settings before fetching any networks
+    converter.process_settings(org_name)
+
+    filters = {"name": args.name, "tag": args.tag, "regex": args.regex}
+    cursor = changefeed.ChangeCursor(args.cursor, args.org_id)
+    state = manifest.Manifest()
+    if cursor.pending:
+        log.info(f"Retrying {len(cursor.pending)} networks that failed to convert")
+    delta_dir = configtree.DELTA_DIR if args.delta else None
+    try:
+        if cursor.t0 is None:
+            # Start following the log before the full conversion, so changes
+            # made while it runs are picked up by the first poll
+            log.info(f"Converting every network of {org_name} before watching")
+            cursor.start(changefeed.utc_now())
+            try:
+                networks = fetch_networks(dashboard, args.org_id)
+            except RuntimeError as e:
+                # The cursor is not saved, so the next run starts over
+                sys.exit(str(e))
+            networks = merakiops.filter_networks(networks, **filters)
+            result = convert(
+                dashboard,
+                org_name,
+                networks,
+                state,
+                args.workers,
+                delta_dir,
+            )
+            cursor.pending.update(network["id"] for network, _ in result[2])
+            print_summary(*result)
+            cursor.save()
+        print(fileops.colorme(f"Watching {org_name} for changes", "green"))
+        while True:
+            if not args.once:
+                time.sleep(args.interval)
+            try:
+                result = poll(
+                    dashboard,
+                    args.org_id,
+                    org_name,
+                    cursor,
+                    filters,
+                    state,
+                    cursor.pending,
+                    args.workers,
+                    delta_dir,
+                )
+            except Exception as e:
+                # Networks of changes already read stay pending for the next
+                # poll, which retries them
+                log.error(f"Failed to poll the change log: {e}")
+                metrics.count("watch_poll_errors")
+            else:
+                cursor.save()
+                if any(result):
+                    print_summary(*result)
+            if args.once:
+                break
+    except KeyboardInterrupt:
+        log.info("Stopped watching")
+    finally:
+        metrics.write_reports("watch", converter.metrics_directory(settings))
+    return 1 if cursor.pending else 0
@@ -0,0 +1,112 @@
+"""Test the on-disk Meraki response cache"""
+
+import pytest
+
+from meraki_converter.common.apicache import (
+    SCOPES_FILE,
+    CachedDashboard,
+    CacheMiss,
+    ResponseCache,
+    cache_scope,
+)
+
+
+def test_cache_call_only_queries_once(tmp_path):
+    """
+    Test that a second identical call is served from the cache
+    """
+    cache = ResponseCache(tmp_path)
+    calls = []
+
+    def get_vlans(net_id):
+        calls.append(net_id)
+        return [{"id": 1}]
+
+    assert cache.call("getNetworkApplianceVlans", get_vlans, "N_1") == [{"id": 1}]
+    assert cache.call("getNetworkApplianceVlans", get_vlans, "N_1") == [{"id": 1}]
+    assert calls == ["N_1"]
+
+
+def test_cache_expired_entry_is_a_miss(tmp_path):
+    """
+    Test that an entry older than its endpoint TTL is not returned
+    """
+    cache = ResponseCache(tmp_path, ttls={"getOrganizations": -1})
+    cache.put("getOrganizations", (), None, [{"id": "1"}])
+    assert cache.get("getOrganizations") == (False, None)
+
+
+def test_cache_offline_ignores_ttl_and_raises_on_miss(tmp_path):
+    """
+    Test that offline mode serves stale entries and raises CacheMiss otherwise
+    """
+    ResponseCache(tmp_path, ttls={"getOrganizations": -1}).put(
+        "getOrganizations", (), None, [{"id": "1"}]
+    )
+    cache = ResponseCache(tmp_path, offline=True)
+    assert cache.call("getOrganizations", None) == [{"id": "1"}]
+    with pytest.raises(CacheMiss):
+        cache.call("getOrganizationNetworks", None, "1")
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    """
+    Test that the oldest entries are evicted once the size limit is exceeded
+    """
+    cache = ResponseCache(tmp_path, max_bytes=1000)
+    for net in range(20):
+        cache.put("getNetworkApplianceVlans", (f"N_{net}",), None, ["x" * 50])
+    assert cache.get("getNetworkApplianceVlans", ("N_19",))[0]
+    assert not cache.get("getNetworkApplianceVlans", ("N_0",))[0]
+    assert sum(f.stat().st_size for f in tmp_path.iterdir()) <= 1000
+
+
+def test_cache_keeps_dashboards_and_keys_apart(tmp_path, monkeypatch):
+    """
+    Test that responses are only served to the dashboard and key they came from
+    """
+    monkeypatch.delenv("MERAKI_DASHBOARD_API_KEY", raising=False)
+    monkeypatch.delenv("MERAKI_DASHBOARD_BASE_URL", raising=False)
+    directory = str(tmp_path)
+    standin = "http://127.0.0.1:8080/api/v1"
+    ResponseCache(
+        directory, scope=cache_scope(directory, key="key-a", base_url=standin)
+    ).put("getOrganizations", (), None, ["standin"])
+    ResponseCache(directory, scope=cache_scope(directory, key="key-a")).put(
+        "getOrganizations", (), None, ["cloud"]
+    )
+    for key, expected in (("key-a", ["cloud"]), ("key-b", None)):
+        cache = ResponseCache(directory, scope=cache_scope(directory, True, key))
+        assert cache.get("getOrganizations")[1] == expected
+
+    # Offline, with no key, the key last used online is assumed
+    offline = ResponseCache(
+        directory, offline=True, scope=cache_scope(directory, offline=True)
+    )
+    assert offline.get("getOrganizations") == (True, ["cloud"])
+    assert "key-a" not in (tmp_path / SCOPES_FILE).read_text()
+
+
+def test_cache_get_many_splits_hits_and_misses(tmp_path):
+    """
+    Test that cached calls are returned and the rest listed to fetch
+    """
+    cache = ResponseCache(tmp_path)
+    cache.put("getNetworkApplianceVlans", ("N_1",), None, [{"id": 1}])
+    hits, misses = cache.get_many("getNetworkApplianceVlans", [("N_1",), ("N_2",)])
+    assert hits == {("N_1",): [{"id": 1}]}
+    assert misses == [("N_2",)]
+
+
+def test_offline_miss_exits_naming_the_call(tmp_path):
+    """
+    Test that an uncached org lookup ends the run with a message, not a trace
+    """
+    from meraki_converter.common import merakiops
+
+    cache = ResponseCache(tmp_path, offline=True)
+    dashboard = CachedDashboard(None, cache)
+    with pytest.raises(SystemExit, match=r"getOrganization\('1',\)"):
+        merakiops.get_organization_name(dashboard, "1")
+    with pytest.raises(SystemExit, match="getOrganizationNetworks"):
+        merakiops.get_networks(dashboard, "1")
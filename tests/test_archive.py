@@ -0,0 +1,87 @@
+"""Test the single archive batch output mode"""
+
+import zlib
+
+import pytest
+
+from meraki_converter import batch
+from meraki_converter.common import archive, fortios
+
+CONFIG = "config system global\n    set hostname fw\nend\n"
+
+
+def test_archive_stores_each_config_once(tmp_path):
+    """
+    Test that identical configs share one entry and every network is indexed
+    """
+    path = str(tmp_path / "configs.zip")
+    with archive.ConfigArchive(path) as configs:
+        first = configs.add({"id": "N_1", "name": "A"}, "A.conf", CONFIG)
+        second = configs.add({"id": "N_2", "name": "B"}, "B.conf", CONFIG)
+        configs.add({"id": "N_3", "name": "C"}, "C.conf", CONFIG + "\n")
+    assert first == second
+    index = archive.read_index(path)
+    assert [(entry["network_id"], entry["filename"]) for entry in index] == [
+        ("N_1", "A.conf"),
+        ("N_2", "B.conf"),
+        ("N_3", "C.conf"),
+    ]
+    assert index[0]["offset"] == index[1]["offset"] != index[2]["offset"]
+    assert archive.read_config(path, "N_3") == CONFIG + "\n"
+    assert archive.read_config(path, "B") == CONFIG
+    assert archive.read_config(path, "N_4") is None
+    assert [p.name for p in tmp_path.iterdir()] == ["configs.zip"]
+
+
+def test_archive_offsets_locate_compressed_configs(tmp_path):
+    """
+    Test that an entry can be read from its offset without the zip library
+    """
+    path = str(tmp_path / "configs.zip")
+    with archive.ConfigArchive(path) as configs:
+        for number in range(3):
+            text = CONFIG.replace("fw", f"fw{number}")
+            configs.add({"id": f"N_{number}", "name": f"fw{number}"}, "x", text)
+    with open(path, "rb") as file:
+        data = file.read()
+    for entry in archive.read_index(path):
+        compressed = data[entry["offset"]:entry["offset"] + entry["compressed_size"]]
+        text = zlib.decompress(compressed, -15).decode()
+        assert text == CONFIG.replace("fw", entry["name"])
+
+
+def test_interrupted_archive_keeps_old_one(tmp_path):
+    """
+    Test that an archive only replaces the older one once it is complete
+    """
+    path = str(tmp_path / "configs.zip")
+    with archive.ConfigArchive(path) as configs:
+        configs.add({"id": "N_1", "name": "A"}, "A.conf", CONFIG)
+    with pytest.raises(KeyboardInterrupt):
+        with archive.ConfigArchive(path) as configs:
+            configs.add({"id": "N_2", "name": "B"}, "B.conf", CONFIG)
+            raise KeyboardInterrupt
+    assert [entry["network_id"] for entry in archive.read_index(path)] == ["N_1"]
+    assert [p.name for p in tmp_path.iterdir()] == ["configs.zip"]
+
+
+def test_write_network_checks_archived_configs(tmp_path):
+    """
+    Test that a config with errors is never added to the archive
+    """
+    network = {"id": "N_1", "name": "A"}
+    vlan = {
+        "vlan_id": 10,
+        "vlan_name": "Data",
+        "vlan_ip": "10.0.10.1",
+        "vlan_subnet": "10.0.10.0/24",
+        "vlan_netmask": "255.255.255.0",
+        "dhcp_handling": "Do not respond to DHCP requests",
+    }
+    # Settings left blank render "set" lines without values
+    prepared = ("output/configs/A.conf", {}, [vlan], None)
+    path = str(tmp_path / "configs.zip")
+    with archive.ConfigArchive(path) as configs:
+        with pytest.raises(fortios.ConfigError):
+            batch.write_network(network, prepared, config_archive=configs)
+    assert archive.read_index(path) == []
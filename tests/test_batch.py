@@ -0,0 +1,48 @@
+"""Test the network filtering used by batch conversion"""
+
+from meraki_converter.common.merakiops import filter_networks
+
+# Arrange
+networks = [
+    {"id": "N_3", "name": "Store 003", "productTypes": ["appliance"], "tags": []},
+    {"id": "N_1", "name": "Store 001", "productTypes": ["appliance"], "tags": ["east"]},
+    {"id": "N_2", "name": "Warehouse", "productTypes": ["appliance", "switch"],
+     "tags": ["east"]},
+    {"id": "N_4", "name": "Store 004 Wireless", "productTypes": ["wireless"],
+     "tags": ["east"]},
+]
+
+
+def test_filter_networks_no_filters():
+    """
+    Test that without filters every appliance network is returned sorted by name
+    """
+    names = [net["name"] for net in filter_networks(networks)]
+    assert names == ["Store 001", "Store 003", "Warehouse"]
+
+
+def test_filter_networks_by_name():
+    """
+    Test that the name filter is a case insensitive substring match
+    """
+    names = [net["name"] for net in filter_networks(networks, name="store")]
+    assert names == ["Store 001", "Store 003"]
+
+
+def test_filter_networks_by_tag():
+    """
+    Test that only networks carrying the tag are returned
+    """
+    names = [net["name"] for net in filter_networks(networks, tag="east")]
+    assert names == ["Store 001", "Warehouse"]
+
+
+def test_filter_networks_by_regex():
+    """
+    Test that the regex filter is combined with the other filters
+    """
+    names = [
+        net["name"]
+        for net in filter_networks(networks, tag="east", regex=r"^Store \d+$")
+    ]
+    assert names == ["Store 001"]
@@ -0,0 +1,136 @@
+"""Test following the configuration change log in watch mode"""
+
+import shutil
+
+import pytest
+
+from meraki_converter import watch
+from meraki_converter.common import changefeed, manifest, ratelimit, synthetic
+
+REPO = __file__.rsplit("/tests/", 1)[0]
+
+
+def change(ts, network_id=None, label="VLAN"):
+    return {
+        "ts": ts,
+        "adminId": "1",
+        "networkId": network_id,
+        "page": "Addressing & VLANs",
+        "label": label,
+        "oldValue": "a",
+        "newValue": "b",
+    }
+
+
+def test_cursor_advances_past_changes(tmp_path):
+    """
+    Test that changes already seen, including at the cursor's time, are skipped
+    """
+    cursor = changefeed.ChangeCursor(str(tmp_path / "cursor.json"), "1")
+    cursor.start("2024-01-01T00:00:00.000000Z")
+    first = change("2024-01-01T00:01:00.000000Z", "N_1")
+    second = change("2024-01-01T00:01:00.000000Z", "N_2")
+    assert cursor.advance([second, first]) == [second, first]
+    assert cursor.t0 == "2024-01-01T00:01:00.000000Z"
+    third = change("2024-01-01T00:02:00.000000Z", "N_1")
+    assert cursor.advance([first, second, third]) == [third]
+    assert cursor.advance([third]) == []
+
+
+def test_cursor_persists(tmp_path):
+    """
+    Test that a saved cursor is loaded for the same org only
+    """
+    path = str(tmp_path / "cursor.json")
+    cursor = changefeed.ChangeCursor(path, "1")
+    first = change("2024-01-01T00:01:00.000000Z", "N_1")
+    cursor.advance([first])
+    cursor.save()
+    loaded = changefeed.ChangeCursor(path, "1")
+    assert loaded.t0 == cursor.t0
+    assert loaded.advance([first]) == []
+    assert changefeed.ChangeCursor(path, "2").t0 is None
+
+
+def test_cursor_keeps_pending_networks(tmp_path):
+    """
+    Test that networks still to be converted are saved with the cursor
+    """
+    path = str(tmp_path / "cursor.json")
+    cursor = changefeed.ChangeCursor(path, "1")
+    cursor.advance([change("2024-01-01T00:01:00.000000Z", "N_1")])
+    cursor.pending.add("N_1")
+    cursor.save()
+    loaded = changefeed.ChangeCursor(path, "1")
+    assert loaded.pending == {"N_1"}
+    loaded.start("2024-01-02T00:00:00.000000Z")
+    assert loaded.pending == set()
+
+
+def test_affected_network_ids():
+    """
+    Test that org wide changes do not affect any network
+    """
+    changes = [change("t", "N_1"), change("t", None, "Admins"), change("t", "N_1")]
+    assert changefeed.affected_network_ids(changes) == {"N_1"}
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    shutil.copytree(f"{REPO}/input", tmp_path / "input")
+    shutil.copytree(f"{REPO}/templates", tmp_path / "templates")
+    (tmp_path / "output/configs").mkdir(parents=True)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(ratelimit, "scheduler", ratelimit.RequestScheduler(1000, 1000))
+    return tmp_path
+
+
+def test_poll_converts_changed_networks(workdir):
+    """
+    Test that a poll converts only the networks changed since the last one
+    """
+    dashboard = synthetic.SyntheticDashboard(networks=5, vlans=2, clients=1)
+    cursor = changefeed.ChangeCursor("cursor.json", "1")
+    cursor.start("2024-01-01T00:00:00.000000Z")
+    state = manifest.Manifest("manifest.json")
+    filters = {"name": None, "tag": None, "regex": None}
+    dashboard.changes.append(change("2024-01-01T00:01:00.000000Z", "L_10000003"))
+    dashboard.changes.append(change("2024-01-01T00:01:00.000000Z"))
+    succeeded, up_to_date, failed = watch.poll(
+        dashboard, "1", "myorg", cursor, filters, state
+    )
+    assert [network["id"] for network, _ in succeeded] == ["L_10000003"]
+    assert (workdir / "output/configs/Branch 00003.conf").exists()
+    assert not (workdir / "output/configs/Branch 00001.conf").exists()
+    assert not failed
+    assert watch.poll(dashboard, "1", "myorg", cursor, filters, state) == (
+        [],
+        [],
+        [],
+    )
+
+
+def test_poll_keeps_changes_when_networks_cannot_be_fetched(workdir, monkeypatch):
+    """
+    Test that networks stay pending until converted when a fetch fails
+    """
+    from meraki_converter.common import merakiops
+
+    dashboard = synthetic.SyntheticDashboard(networks=5, vlans=2, clients=1)
+    cursor = changefeed.ChangeCursor("cursor.json", "1")
+    cursor.start("2024-01-01T00:00:00.000000Z")
+    state = manifest.Manifest("manifest.json")
+    filters = {"name": None, "tag": None, "regex": None}
+    dashboard.changes.append(change("2024-01-01T00:01:00.000000Z", "L_10000003"))
+    get_networks = merakiops.get_networks
+    monkeypatch.setattr(merakiops, "get_networks", lambda *args: None)
+    with pytest.raises(RuntimeError):
+        watch.poll(dashboard, "1", "myorg", cursor, filters, state, cursor.pending)
+    assert cursor.pending == {"L_10000003"}
+
+    monkeypatch.setattr(merakiops, "get_networks", get_networks)
+    succeeded, _, _ = watch.poll(
+        dashboard, "1", "myorg", cursor, filters, state, cursor.pending
+    )
+    assert [network["id"] for network, _ in succeeded] == ["L_10000003"]
+    assert cursor.pending == set()
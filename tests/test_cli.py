@@ -0,0 +1,175 @@
+"""Test the subcommand entry point and its startup cost"""
+
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+import pytest
+
+from meraki_converter import cli
+
+SRC = os.path.dirname(os.path.dirname(cli.__file__))
+HEAVY_MODULES = ["meraki", "jinja2", "tomlkit", "requests"]
+
+
+def run_python(code, *args):
+    env = dict(os.environ, PYTHONPATH=SRC)
+    return subprocess.run(
+        [sys.executable, "-c", code, *args],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+@pytest.fixture
+def input_dir(tmp_path):
+    shutil.copy("input/myorg_settings_template.toml", tmp_path / "myorg.toml")
+    shutil.copy("input/general_settings_template.toml", tmp_path)
+    return tmp_path
+
+
+def test_cli_import_skips_heavy_modules():
+    """
+    Test that importing the CLI does not load meraki, jinja2 or tomlkit
+    """
+    result = run_python(
+        "import sys, meraki_converter.cli\n"
+        f"print([m for m in {HEAVY_MODULES!r} if m in sys.modules])"
+    )
+    assert result.stdout.strip() == "[]"
+
+
+def test_cli_validate_skips_heavy_modules(input_dir):
+    """
+    Test that the offline validate command never imports the API libraries
+    """
+    result = run_python(
+        "import sys\n"
+        "from meraki_converter import cli\n"
+        "code = cli.main(sys.argv[1:])\n"
+        f"print([m for m in {HEAVY_MODULES!r} if m in sys.modules], code)",
+        "validate", "--input-dir", str(input_dir),
+    )
+    assert result.stdout.strip().splitlines()[-1] == "[] 0"
+
+
+def best_time(code, *args, repeat=3):
+    """The fastest of a few runs, so a slow machine affects each alike"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run_python(code, *args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def test_cli_version_is_fast():
+    """
+    Test that --version costs little more than starting Python itself
+    """
+    bare, _ = best_time("pass")
+    elapsed, result = best_time(
+        "import sys\nfrom meraki_converter import cli\ncli.main(sys.argv[1:])",
+        "--version",
+    )
+    # Importing the meraki library alone takes several times a bare start
+    assert elapsed < bare * 2.5
+    assert result.stdout.strip() == "meraki_converter 0.0.1"
+
+
+def test_org_settings_names_skips_general_and_templates(input_dir):
+    """
+    Test that only org settings files are found for validation
+    """
+    assert cli.org_settings_names(str(input_dir)) == ["myorg"]
+
+
+def test_validate_reports_invalid_site(input_dir, capsys):
+    """
+    Test that an invalid site override fails validation
+    """
+    (input_dir / "myorg").mkdir()
+    (input_dir / "myorg" / "Branch.toml").write_text('[bgp]\nneighbor_ip = "x"\n')
+    assert cli.main(["validate", "--input-dir", str(input_dir)]) == 1
+    assert "myorg/Branch" in capsys.readouterr().out
+
+
+def test_check_reports_config_errors(tmp_path, capsys):
+    """
+    Test that check prints each error with its file and line and fails
+    """
+    (tmp_path / "good.conf").write_text("config system global\nend\n")
+    (tmp_path / "bad.conf").write_text("config system global\n    set hostname\n")
+    assert cli.main(["check", str(tmp_path), "--workers", "1"]) == 1
+    out = capsys.readouterr().out
+    assert f"{tmp_path / 'bad.conf'}:2: error: set hostname has no value" in out
+    assert "good.conf" not in out
+    assert "1 of 2 configs have errors" in out
+
+
+def test_extract_lists_and_reads_archive(tmp_path, capsys):
+    """
+    Test that extract lists the archived networks and prints one config
+    """
+    from meraki_converter.common import archive
+
+    path = str(tmp_path / "configs.zip")
+    with archive.ConfigArchive(path) as configs:
+        configs.add({"id": "N_1", "name": "Branch"}, "Branch.conf", "config a\nend\n")
+    assert cli.main(["extract", "--archive", path]) == 0
+    assert capsys.readouterr().out.split()[0] == "N_1"
+    assert cli.main(["extract", "Branch", "--archive", path]) == 0
+    assert capsys.readouterr().out == "config a\nend\n"
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    repo = os.path.dirname(SRC)
+    shutil.copytree(f"{repo}/input", tmp_path / "input")
+    shutil.copytree(f"{repo}/templates", tmp_path / "templates")
+    (tmp_path / "output/configs").mkdir(parents=True)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def record_vlans(network_id, vlans):
+    from meraki_converter.common import apicache, fileops
+
+    settings = fileops.load_settings("input/general_settings.toml")
+    cache = apicache.cache_from_settings(settings)
+    cache.put("getNetworkApplianceVlans", (network_id,), None, vlans)
+
+
+def test_render_keeps_site_name_inside_configs(workdir, capsys):
+    """
+    Test that a site name with path separators is written to a safe file
+    """
+    from meraki_converter.common import synthetic
+
+    dashboard = synthetic.SyntheticDashboard(networks=1, vlans=2, clients=1)
+    network_id = dashboard.networks[0]["id"]
+    record_vlans(network_id, dashboard.get_network_appliance_vlans(network_id))
+    args = ["render", network_id, "--settings", "myorg", "--site", "../../x"]
+    assert cli.main(args) == 0
+    assert os.listdir(workdir / "output/configs") == [f"_.._x_{network_id}.conf"]
+
+
+def test_render_reports_addressing_conflicts(workdir, capsys):
+    """
+    Test that render refuses VLANs with conflicts, as the convert script does
+    """
+    from meraki_converter.common import synthetic
+
+    dashboard = synthetic.SyntheticDashboard(networks=1, vlans=2, clients=1)
+    network_id = dashboard.networks[0]["id"]
+    vlans = dashboard.get_network_appliance_vlans(network_id)
+    vlans[1] = dict(vlans[1], subnet=vlans[0]["subnet"])
+    record_vlans(network_id, vlans)
+    assert cli.main(["render", network_id, "--settings", "myorg"]) == 1
+    assert "overlaps" in capsys.readouterr().out
+    assert os.listdir(workdir / "output/configs") == []
@@ -0,0 +1,218 @@
+"""Test the config tree and the delta scripts worked out from it"""
+
+from meraki_converter.common import configtree, fortios, render
+
+OLD = """config system global
+    set hostname fw1
+    set timezone 04
+end
+config system interface
+    edit Vlan_10
+        set ip 10.0.10.1 255.255.255.0
+        set description "Data"
+    next
+    edit Vlan_20
+        set ip 10.0.20.1 255.255.255.0
+    next
+end
+config router bgp
+    set as 65001
+    config neighbor
+        edit 10.0.0.1
+            set remote-as 65000
+        next
+    end
+end
+config router static
+    edit 0
+        set device wan1
+    next
+end
+"""
+
+
+def test_parse_builds_tree():
+    """
+    Test that blocks are keyed by path and ID and strings spanning lines kept
+    """
+    tree = configtree.parse(
+        OLD
+        + "config system replacemsg admin pre_admin-disclaimer-text\n"
+        + '    set buffer "first\n\tsecond"\n'
+        + "end\n"
+    )
+    assert tree.configs["system global"].settings == {
+        "hostname": "fw1",
+        "timezone": "04",
+    }
+    interfaces = tree.configs["system interface"].entries
+    assert list(interfaces) == ["Vlan_10", "Vlan_20"]
+    assert interfaces["Vlan_10"].settings["description"] == '"Data"'
+    bgp = tree.configs["router bgp"]
+    assert bgp.configs["neighbor"].entries["10.0.0.1"].settings == {
+        "remote-as": "65000"
+    }
+    assert len(tree.configs["router static"].anonymous) == 1
+    message = tree.configs["system replacemsg admin pre_admin-disclaimer-text"]
+    assert message.settings["buffer"] == '"first\n\tsecond"'
+
+
+def test_diff_of_same_config_is_empty():
+    """
+    Test that indentation alone is not a change
+    """
+    assert configtree.diff(configtree.parse(OLD), configtree.parse(OLD)) == []
+    retabbed = OLD.replace("        set ip", "\tset ip")
+    assert configtree.diff(configtree.parse(OLD), configtree.parse(retabbed)) == []
+
+
+def test_diff_has_only_changed_commands():
+    """
+    Test that the script sets, unsets, edits and deletes only what changed
+    """
+    new = (
+        OLD.replace("    set timezone 04\n", "")
+        .replace("10.0.10.1 255", "10.0.11.1 255")
+        .replace(
+            "    edit Vlan_20\n        set ip 10.0.20.1 255.255.255.0\n    next\n",
+            "    edit Vlan_30\n    next\n",
+        )
+        .replace("set remote-as 65000", "set remote-as 65002")
+    )
+    script = configtree.diff(configtree.parse(OLD), configtree.parse(new))
+    assert script == [
+        "config system global",
+        "    unset timezone",
+        "end",
+        "config system interface",
+        "    delete Vlan_20",
+        "    edit Vlan_10",
+        "        set ip 10.0.11.1 255.255.255.0",
+        "    next",
+        "    edit Vlan_30",
+        "    next",
+        "end",
+        "config router bgp",
+        "    config neighbor",
+        "        edit 10.0.0.1",
+        "            set remote-as 65002",
+        "        next",
+        "    end",
+        "end",
+    ]
+
+
+def test_diff_of_numbered_entries():
+    """
+    Test that edit 0 entries are matched by content and only new ones added
+    """
+    added = OLD.replace(
+        "    edit 0\n        set device wan1\n",
+        "    edit 0\n        set device wan2\n    next\n"
+        "    edit 0\n        set device wan1\n",
+    )
+    script = configtree.diff(configtree.parse(OLD), configtree.parse(added))
+    assert script == [
+        "config router static",
+        "    edit 0",
+        "        set device wan2",
+        "    next",
+        "end",
+    ]
+    removed = configtree.diff(configtree.parse(added), configtree.parse(OLD))
+    assert "    purge" in removed
+
+
+def test_diff_purges_only_when_numbered_entry_is_removed():
+    """
+    Test that a changed edit 0 entry purges its own table, with a warning,
+    and every entry of that table is re-added
+    """
+    old = OLD.replace(
+        "config router static\n",
+        "config router static\n    edit 5\n        set device wan9\n    next\n",
+    )
+    changed = old.replace("set device wan1", "set device wan3")
+    script = configtree.diff(configtree.parse(old), configtree.parse(changed))
+    assert script == [
+        "config router static",
+        f"    {configtree.PURGE_WARNING}",
+        "    purge",
+        "    edit 5",
+        "        set device wan9",
+        "    next",
+        "    edit 0",
+        "        set device wan3",
+        "    next",
+        "end",
+    ]
+    checker = fortios.Checker()
+    checker.feed("\n".join(script) + "\n")
+    assert checker.close() == []
+
+
+def test_render_writes_delta_of_replaced_config(tmp_path):
+    """
+    Test that rendering over a config writes the changes to the delta dir
+    """
+    vlan = {
+        "vlan_id": 10,
+        "vlan_name": "Data",
+        "vlan_ip": "10.0.10.1",
+        "vlan_subnet": "10.0.10.0/24",
+        "vlan_netmask": "255.255.255.0",
+        "dhcp_handling": "Do not respond to DHCP requests",
+    }
+    config = {"lan_interface": "internal"}
+    filename = str(tmp_path / "Branch.conf")
+    delta_dir = str(tmp_path / "deltas")
+    render.render_network_to_file(
+        filename, config, [vlan], check=False, delta_dir=delta_dir
+    )
+    assert not (tmp_path / "deltas").exists()
+
+    vlan = dict(vlan, vlan_name="Voice")
+    render.render_network_to_file(
+        filename, config, [vlan], check=False, delta_dir=delta_dir
+    )
+    delta = (tmp_path / "deltas" / "Branch.conf").read_text()
+    assert delta == (
+        "config system interface\n"
+        "    edit Vlan_10\n"
+        '        set alias "Voice"\n'
+        "    next\n"
+        "end\n"
+    )
+
+
+def test_new_fixed_ip_edits_only_its_dhcp_server():
+    """
+    Test that DHCP servers are keyed by VLAN, so one new fixed IP neither
+    purges the table nor touches the other servers
+    """
+    from meraki_converter.common import synthetic
+    from meraki_converter.main import format_vlans
+
+    dashboard = synthetic.SyntheticDashboard(networks=1, vlans=3, clients=1)
+    vlans = dashboard.get_network_appliance_vlans(dashboard.networks[0]["id"])
+    config = {"lan_interface": "internal"}
+    old = render.render_network(config, format_vlans(vlans))
+    vlans[1]["fixedIpAssignments"]["02:00:00:01:00:01"] = {
+        "ip": "10.0.1.101",
+        "name": "Printer",
+    }
+    new = render.render_network(config, format_vlans(vlans))
+    script = configtree.diff(configtree.parse(old), configtree.parse(new))
+    assert script == [
+        "config system dhcp server",
+        "    edit 2",
+        "        config reserved-address",
+        "            edit 2",
+        "                set ip 10.0.1.101",
+        "                set mac 02:00:00:01:00:01",
+        '                set description "Printer"',
+        "            next",
+        "        end",
+        "    next",
+        "end",
+    ]
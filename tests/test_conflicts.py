@@ -0,0 +1,118 @@
+"""Test the addressing conflict checks run before rendering"""
+
+from meraki_converter.common import conflicts
+
+
+def vlan(vlan_id=10, subnet="10.0.10.0/24", reserved=(), clients=None):
+    return {
+        "id": vlan_id,
+        "name": f"VLAN {vlan_id}",
+        "applianceIp": subnet.replace("0/24", "1"),
+        "subnet": subnet,
+        "dhcpHandling": "Run a DHCP server",
+        "dnsNameservers": "upstream_dns",
+        "reservedIpRanges": [
+            {"start": start, "end": end, "comment": f"Range {start}"}
+            for start, end in reserved
+        ],
+        "fixedIpAssignments": {
+            mac: {"ip": ip, "name": mac} for mac, ip in (clients or {}).items()
+        },
+    }
+
+
+def kinds(found):
+    return sorted(conflict.kind for conflict in found)
+
+
+def test_clean_vlan_has_no_conflicts():
+    """
+    Test that reservations and clients apart from each other pass
+    """
+    checked = vlan(
+        reserved=[("10.0.10.2", "10.0.10.9"), ("10.0.10.200", "10.0.10.254")],
+        clients={"aa": "10.0.10.10", "bb": "10.0.10.199"},
+    )
+    assert conflicts.check_network([checked]) == []
+
+
+def test_overlapping_reservations():
+    """
+    Test that every reservation overlapping an earlier one is reported
+    """
+    checked = vlan(
+        reserved=[
+            ("10.0.10.50", "10.0.10.60"),
+            ("10.0.10.2", "10.0.10.100"),
+            ("10.0.10.90", "10.0.10.95"),
+        ]
+    )
+    found = conflicts.check_vlan(checked, "N_1")
+    assert kinds(found) == ["reservation_overlap", "reservation_overlap"]
+    assert {(c.start, c.end) for c in found} == {
+        ("10.0.10.50", "10.0.10.60"),
+        ("10.0.10.90", "10.0.10.95"),
+    }
+    assert all(c.other == "Range 10.0.10.2" for c in found)
+
+
+def test_fixed_ip_conflicts():
+    """
+    Test that reserved, duplicate and foreign fixed IPs are reported
+    """
+    checked = vlan(
+        reserved=[("10.0.10.2", "10.0.10.9")],
+        clients={
+            "aa": "10.0.10.5",
+            "bb": "10.0.10.20",
+            "cc": "10.0.10.20",
+            "dd": "10.0.11.5",
+        },
+    )
+    found = conflicts.check_vlan(checked, "N_1")
+    assert kinds(found) == [
+        "duplicate_fixed_ip",
+        "fixed_ip_outside_subnet",
+        "fixed_ip_reserved",
+    ]
+    reserved = next(c for c in found if c.kind == "fixed_ip_reserved")
+    assert reserved.other == "aa" and reserved.start == "10.0.10.5"
+
+
+def test_too_many_reservations():
+    """
+    Test that more than 16 reserved ranges are reported, not rendered
+    """
+    reserved = [(f"10.0.10.{n}", f"10.0.10.{n}") for n in range(2, 20)]
+    checked = vlan(reserved=reserved)
+    assert kinds(conflicts.check_vlan(checked)) == ["too_many_reservations"]
+    assert conflicts.check_network([checked])[0].severity == conflicts.ERROR
+
+
+def test_subnet_overlaps_in_network_and_org():
+    """
+    Test that overlaps in a network are errors and across networks warnings
+    """
+    first = [vlan(10, "10.0.0.0/16"), vlan(20, "10.0.20.0/24")]
+    second = [vlan(10, "10.1.10.0/24")]
+    third = [vlan(10, "10.1.10.0/24")]
+    checker = conflicts.OrgChecker()
+    found = checker.add("N_1", first)
+    assert [(c.kind, c.severity, c.vlan_id, c.other) for c in found] == [
+        ("subnet_overlap", conflicts.ERROR, 20, 10)
+    ]
+    assert checker.add("N_2", second) == []
+    assert checker.add("N_3", third) == []
+    warnings = [c for c in checker.conflicts() if c.severity == conflicts.WARNING]
+    assert len(warnings) == 1
+    assert {warnings[0].network_id, warnings[0].other[0]} == {"N_2", "N_3"}
+
+
+def test_conflict_error_lists_conflicts():
+    """
+    Test that the raised error carries the structured conflicts
+    """
+    found = conflicts.check_vlan(vlan(clients={"aa": "10.0.11.5"}), "N_1")
+    error = conflicts.ConflictError(found)
+    assert error.conflicts == found
+    assert "10.0.11.5" in str(error)
@@ -0,0 +1,45 @@
+"""Test the atomic file writes in fileops"""
+
+import pytest
+
+from meraki_converter.common.fileops import safe_filename, write_atomic
+
+
+def test_write_atomic_streams_chunks(tmp_path):
+    """
+    Test that every chunk is written and the byte count is returned
+    """
+    filename = tmp_path / "net.conf"
+    chunks = ("config system interface\n", "end\n", "é")
+    assert write_atomic(str(filename), chunks) == len("".join(chunks).encode())
+    assert filename.read_text(encoding="utf-8") == "".join(chunks)
+    assert [f.name for f in tmp_path.iterdir()] == ["net.conf"]
+
+
+def test_write_atomic_failure_keeps_old_file(tmp_path):
+    """
+    Test that an error while rendering leaves the previous file untouched
+    """
+    filename = tmp_path / "net.conf"
+    filename.write_text("old config\n")
+
+    def failing_chunks():
+        yield "partial"
+        raise RuntimeError("render failed")
+
+    with pytest.raises(RuntimeError):
+        write_atomic(str(filename), failing_chunks())
+    assert filename.read_text() == "old config\n"
+    assert [f.name for f in tmp_path.iterdir()] == ["net.conf"]
+
+
+def test_safe_filename_keeps_names_apart():
+    """
+    Test that unsafe names are cleaned and cannot collide with real names
+    """
+    assert safe_filename("Branch 0001 (HQ)", "N_1") == "Branch 0001 (HQ)"
+    assert safe_filename("Store/12", "N_1") == "Store_12_N_1"
+    assert safe_filename("Store_12", "N_2") == "Store_12"
+    assert safe_filename("../../etc", "N_3") == "_.._etc_N_3"
+    assert safe_filename("CON", "N_4") == "CON_N_4"
+    assert safe_filename("", "N_5") == "__N_5"
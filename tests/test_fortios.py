@@ -0,0 +1,139 @@
+"""Test the structural checks of rendered FortiOS configs"""
+
+import pytest
+
+from meraki_converter import main as converter
+from meraki_converter.common import fileops, fortios, render, synthetic
+
+
+def check(text):
+    checker = fortios.Checker("fw.conf")
+    checker.feed(text)
+    return [(issue.line, issue.severity, issue.message) for issue in checker.close()]
+
+
+def test_clean_config_passes():
+    """
+    Test that nested configs, repeated edit 0 and quoted strings pass
+    """
+    text = (
+        "config router bgp\n"
+        "    set as 65001\n"
+        "    config neighbor\n"
+        "        edit 10.0.0.1\n"
+        '            set description "two words"\n'
+        "        next\n"
+        "    end\n"
+        "end\n"
+        "config router static\n"
+        "    edit 0\n"
+        "\tset device wan1\n"
+        "    next\n"
+        "    edit 0\n"
+        "        set device wan2\n"
+        "    next\n"
+        "end\n"
+        "config system replacemsg admin pre_admin-disclaimer-text\n"
+        '    set buffer "first line\n'
+        "second line\n"
+        'with a quoted \\" mark"\n'
+        "end\n"
+    )
+    assert check(text) == []
+
+
+def test_unbalanced_blocks_are_reported_by_line():
+    """
+    Test that a missing next, a stray end and unclosed blocks are found
+    """
+    text = (
+        "config router prefix-list\n"
+        '    edit "LAN1"\n'
+        "        config rule\n"
+        "            edit 1\n"
+        "            next\n"
+        "        end\n"
+        "    end\n"
+        "end\n"
+        "next\n"
+        "config firewall address\n"
+        "    edit one\n"
+    )
+    assert check(text) == [
+        (7, fortios.ERROR, 'edit "LAN1" from line 2 has no next'),
+        (8, fortios.ERROR, "end without a config"),
+        (9, fortios.ERROR, "next in the top level without an edit"),
+        (10, fortios.ERROR, "config firewall address is never closed by end"),
+        (11, fortios.ERROR, "edit one is never closed by next"),
+    ]
+
+
+def test_duplicate_edits_and_bad_values():
+    """
+    Test that duplicate IDs, missing values and placeholders are found
+    """
+    text = (
+        "config system dhcp server\n"
+        "    edit 1\n"
+        "        set domain\n"
+        '        set hostname ""\n'
+        "        config options\n"
+        "            edit 1\n"
+        "                set value Error\n"
+        "            next\n"
+        "        end\n"
+        "    next\n"
+        "    edit 1\n"
+        "    next\n"
+        "end\n"
+    )
+    assert check(text) == [
+        (3, fortios.ERROR, "set domain has no value"),
+        (4, fortios.WARNING, "set hostname is empty"),
+        (7, fortios.ERROR, "set value has placeholder Error"),
+        (11, fortios.ERROR, "duplicate edit 1 in config system dhcp server"),
+    ]
+
+
+def test_checked_keeps_old_file_on_errors(tmp_path):
+    """
+    Test that a config with errors never replaces the file being written
+    """
+    filename = str(tmp_path / "fw.conf")
+    fileops.write_atomic(filename, ["config system global\nend\n"])
+    chunks = ["config system ", "global\n    set hostname\n", "end\n"]
+    with pytest.raises(fortios.ConfigError, match="line 2: set hostname"):
+        fileops.write_atomic(filename, fortios.checked(chunks, filename))
+    with open(filename) as file:
+        assert file.read() == "config system global\nend\n"
+    assert [path.name for path in tmp_path.iterdir()] == ["fw.conf"]
+
+
+def test_check_files_on_a_process_pool(tmp_path):
+    """
+    Test that a directory of configs is checked file by file
+    """
+    for number in range(6):
+        ending = "end\n" if number % 2 else ""
+        (tmp_path / f"fw{number}.conf").write_text("config system global\n" + ending)
+    (tmp_path / "conflicts.json").write_text("[]")
+    files = fortios.config_files([str(tmp_path)])
+    assert len(files) == 6
+    results = fortios.check_files(files, workers=2)
+    assert list(results) == files
+    bad = sorted(path.rsplit("/", 1)[1] for path, issues in results.items() if issues)
+    assert bad == ["fw0.conf", "fw2.conf", "fw4.conf"]
+
+
+def test_repo_templates_render_clean_configs():
+    """
+    Test that every template renders configs that pass the checks
+    """
+    config = converter.process_settings("myorg_settings_template")
+    # The settings template leaves values for the user to fill in
+    config = {key: value if value != "" else key for key, value in config.items()}
+    dashboard = synthetic.SyntheticDashboard(networks=4, vlans=20, clients=5)
+    for network in dashboard.networks:
+        vlan_info = converter.from_meraki_get_vlans(dashboard, network["id"])
+        issues = check(render.render_network(config, vlan_info))
+        assert [issue for issue in issues if issue[1] == fortios.ERROR] == []
@@ -0,0 +1,45 @@
+"""Test the org wide appliance prefetch"""
+
+from meraki_converter.common import inventory, merakiops
+from meraki_converter.common.synthetic import SyntheticDashboard
+
+# Arrange
+devices = [
+    {"serial": "Q2-B", "networkId": "N_1", "model": "MX85", "name": "mx-b"},
+    {"serial": "Q2-A", "networkId": "N_1", "model": "MX85", "name": "mx-a"},
+    {"serial": "Q2-C", "networkId": "N_2", "model": "MX67", "name": "mx-c"},
+    {"serial": "Q2-D", "networkId": None, "model": "MX67", "name": "unused"},
+]
+uplink_statuses = [
+    {"serial": "Q2-A", "highAvailability": {"enabled": True, "role": "spare"}},
+    {"serial": "Q2-B", "highAvailability": {"enabled": True, "role": "primary"}},
+    {"serial": "Q2-C", "highAvailability": {"enabled": False, "role": "primary"}},
+]
+
+
+def test_index_appliances_pairs_ha():
+    """
+    Test that the HA roles decide which appliance is the primary
+    """
+    index = inventory.index_appliances(devices, uplink_statuses)
+    assert sorted(index) == ["N_1", "N_2"]
+    assert index["N_1"].serial == "Q2-B"
+    assert index["N_1"].spare_serial == "Q2-A"
+    assert index["N_2"].to_config() == {
+        "mx_serial": "Q2-C",
+        "mx_model": "MX67",
+        "mx_spare_serial": "",
+    }
+
+
+def test_get_mx_serial_number_reads_prefetch():
+    """
+    Test that the prefetch gives the same answer as the per network call
+    """
+    dashboard = SyntheticDashboard(networks=8, vlans=1, clients=0)
+    appliances = merakiops.get_appliances(dashboard, "1")
+    assert len(appliances) == 8
+    for network in dashboard.networks:
+        assert merakiops.get_mx_serial_number(
+            None, network["id"], appliances
+        ) == merakiops.get_mx_serial_number(dashboard, network["id"])
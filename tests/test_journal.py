@@ -0,0 +1,191 @@
+"""Test the batch job journal used to resume interrupted runs"""
+
+import shutil
+
+import pytest
+
+from meraki_converter import batch
+from meraki_converter.common import journal, manifest, ratelimit, synthetic
+
+REPO = __file__.rsplit("/tests/", 1)[0]
+
+network = {"id": "N_1", "name": "Store 1"}
+
+
+def test_journal_resumes_same_job(tmp_path):
+    """
+    Test that a reopened journal of the same job knows the networks done
+    """
+    path = str(tmp_path / "journal.jsonl")
+    config = tmp_path / "store1.conf"
+    config.write_text("config")
+    with journal.Journal(path, "job1") as job_journal:
+        job_journal.record(network, journal.DONE, str(config))
+        job_journal.record({"id": "N_2", "name": "Store 2"}, journal.FAILED, error="x")
+    with journal.Journal(path, "job1") as job_journal:
+        assert job_journal.is_done("N_1")
+        assert not job_journal.is_done("N_2")
+    with journal.Journal(path, "job2") as job_journal:
+        assert not job_journal.is_done("N_1")
+
+
+def test_journal_starts_over(tmp_path):
+    """
+    Test that a completed, restarted or removed network is not done
+    """
+    path = str(tmp_path / "journal.jsonl")
+    config = tmp_path / "store1.conf"
+    config.write_text("config")
+    with journal.Journal(path, "job1") as job_journal:
+        job_journal.record(network, journal.DONE, str(config))
+    with journal.Journal(path, "job1", restart=True) as job_journal:
+        assert not job_journal.is_done("N_1")
+        job_journal.record(network, journal.DONE, str(config))
+        job_journal.complete()
+    with journal.Journal(path, "job1") as job_journal:
+        assert not job_journal.is_done("N_1")
+        job_journal.record(network, journal.DONE, str(config))
+    config.unlink()
+    with journal.Journal(path, "job1") as job_journal:
+        assert not job_journal.is_done("N_1")
+
+
+def test_journal_drops_torn_line(tmp_path):
+    """
+    Test that a line cut short by a crash is dropped and not appended to
+    """
+    path = tmp_path / "journal.jsonl"
+    config = tmp_path / "store1.conf"
+    config.write_text("config")
+    with journal.Journal(str(path), "job1") as job_journal:
+        job_journal.record(network, journal.DONE, str(config))
+    with open(path, "a", encoding="utf-8") as file:
+        file.write('{"network_id": "N_2", "sta')
+    with journal.Journal(str(path), "job1") as job_journal:
+        assert job_journal.is_done("N_1")
+        job_journal.record({"id": "N_3", "name": "Store 3"}, journal.FAILED)
+    assert len(path.read_text().splitlines()) == 3
+
+
+def test_load_job(tmp_path):
+    """
+    Test that every org of a job file gets every key
+    """
+    job_file = tmp_path / "job.toml"
+    job_file.write_text(
+        '[[org]]\norg_id = 1\ntag = "east"\n\n'
+        '[[org]]\norg_id = "2"\nnetworks = ["N_1"]\n'
+    )
+    jobs = journal.load_job(str(job_file))
+    assert [job["org_id"] for job in jobs] == ["1", "2"]
+    assert jobs[0]["tag"] == "east" and jobs[0]["networks"] is None
+    assert jobs[1]["networks"] == ["N_1"] and jobs[1]["settings"] is None
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    shutil.copytree(f"{REPO}/input", tmp_path / "input")
+    shutil.copytree(f"{REPO}/templates", tmp_path / "templates")
+    (tmp_path / "output/configs").mkdir(parents=True)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(ratelimit, "scheduler", ratelimit.RequestScheduler(1000, 1000))
+    return tmp_path
+
+
+def test_run_batch_records_failures(workdir):
+    """
+    Test that a failing network is journaled and the others still converted
+    """
+    dashboard = synthetic.SyntheticDashboard(networks=3, vlans=2, clients=1)
+    networks = dashboard.networks + [{"id": "L_missing", "name": "Missing"}]
+    with journal.Journal("journal.jsonl", "job1") as job_journal:
+        succeeded, _, failed = batch.run_batch(
+            dashboard, networks, "myorg", workers=2, job_journal=job_journal
+        )
+    assert len(succeeded) == 3
+    assert [network["id"] for network, _ in failed] == ["L_missing"]
+    with journal.Journal("journal.jsonl", "job1") as job_journal:
+        assert all(job_journal.is_done(net["id"]) for net in dashboard.networks)
+        assert job_journal.networks["L_missing"]["status"] == journal.FAILED
+
+
+def run_checked(dashboard, job_journal):
+    state = manifest.Manifest()
+    try:
+        succeeded, up_to_date, failed = batch.run_batch(
+            dashboard,
+            dashboard.networks,
+            "myorg",
+            workers=2,
+            state=state,
+            job_journal=job_journal,
+            staged=True,
+        )
+        succeeded, bad = batch.check_configs(
+            succeeded, workers=1, job_journal=job_journal, state=state
+        )
+    finally:
+        state.save()
+    return succeeded, up_to_date, failed + bad
+
+
+def test_failed_check_keeps_last_good_config(workdir):
+    """
+    Test that a config failing its check is not put in place or recorded
+    """
+    dashboard = synthetic.SyntheticDashboard(networks=2, vlans=2, clients=1)
+    broken = dashboard.networks[0]
+    with journal.Journal("journal.jsonl", "job1") as job_journal:
+        succeeded, _, failed = run_checked(dashboard, job_journal)
+    assert len(succeeded) == 2 and not failed
+    config = workdir / succeeded[0][1]
+    good = config.read_text()
+
+    # Blank settings render "set" lines without values
+    (workdir / "input/myorg").mkdir()
+    (workdir / f"input/myorg/{broken['name']}.toml").write_text(
+        '[bgp]\nlocal_asn = ""\n'
+    )
+    for _ in range(2):
+        with journal.Journal("journal.jsonl", "job1") as job_journal:
+            succeeded, up_to_date, failed = run_checked(dashboard, job_journal)
+            assert [network["id"] for network, _ in failed] == [broken["id"]]
+            assert not job_journal.is_done(broken["id"])
+        assert broken not in [network for network, _ in succeeded + up_to_date]
+        assert config.read_text() == good
+        assert not list((workdir / "output/configs").glob("*.pending"))
+
+
+def test_job_writes_each_org_to_its_own_directory(workdir, monkeypatch, capsys):
+    """
+    Test that same-named networks of two orgs in a job keep their configs
+    apart, and a rerun finds both up to date
+    """
+    from meraki_converter.common import merakiops
+
+    dashboards = {
+        org_id: synthetic.SyntheticDashboard(
+            org_id=org_id, networks=2, vlans=2, clients=1, seed=seed
+        )
+        for seed, org_id in enumerate(["1", "2"])
+    }
+    monkeypatch.setattr(
+        merakiops, "get_dashboard", lambda org=None, **kwargs: dashboards[org]
+    )
+    (workdir / "output/logs").mkdir()
+    (workdir / "job.toml").write_text(
+        '[[org]]\norg_id = "1"\nsettings = "myorg"\n\n'
+        '[[org]]\norg_id = "2"\nsettings = "myorg"\n'
+    )
+    argv = ["--job", "job.toml", "--no-cache", "--check-workers", "1"]
+    assert batch.main(argv) == 0
+    first = workdir / "output/configs/1/Branch 00000.conf"
+    second = workdir / "output/configs/2/Branch 00000.conf"
+    assert first.read_text() != second.read_text()
+    state = manifest.Manifest()
+    assert state.networks["L_20000000"]["filename"] == str(
+        second.relative_to(workdir)
+    )
+    capsys.readouterr()
+    assert batch.main(argv + ["--restart"]) == 0
+    assert "4 networks up to date" in capsys.readouterr().out
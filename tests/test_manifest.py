@@ -0,0 +1,48 @@
+"""Test the input hash manifest used for incremental regeneration"""
+
+from meraki_converter.common.manifest import Manifest, hash_json
+
+hashes = {"vlans": hash_json([{"id": 1}]), "settings": "a", "templates": "b"}
+
+
+def test_hash_json_ignores_key_order():
+    """
+    Test that the same payload hashes the same regardless of key order
+    """
+    assert hash_json({"a": 1, "b": [1, 2]}) == hash_json({"b": [1, 2], "a": 1})
+
+
+def test_manifest_current_after_save(tmp_path):
+    """
+    Test that a recorded network is current when reloaded with the same inputs
+    """
+    config = tmp_path / "net.conf"
+    config.write_text("config")
+    state = Manifest(str(tmp_path / "manifest.json"))
+    state.record("N_1", "Store 1", hashes, str(config))
+    state.save()
+
+    state = Manifest(str(tmp_path / "manifest.json"))
+    assert state.is_current("N_1", hashes, str(config))
+    assert not state.is_current("N_1", dict(hashes, settings="c"), str(config))
+    assert not state.is_current("N_2", hashes, str(config))
+
+
+def test_manifest_missing_output_is_not_current(tmp_path):
+    """
+    Test that a network whose config file was removed is rendered again
+    """
+    state = Manifest(str(tmp_path / "manifest.json"))
+    state.record("N_1", "Store 1", hashes, str(tmp_path / "net.conf"))
+    assert not state.is_current("N_1", hashes, str(tmp_path / "net.conf"))
+
+
+def test_manifest_force_is_never_current(tmp_path):
+    """
+    Test that force renders every network again
+    """
+    config = tmp_path / "net.conf"
+    config.write_text("config")
+    state = Manifest(str(tmp_path / "manifest.json"), force=True)
+    state.record("N_1", "Store 1", hashes, str(config))
+    assert not state.is_current("N_1", hashes, str(config))
@@ -0,0 +1,40 @@
+"""Test the bounded concurrency helpers of the async Meraki layer"""
+
+import asyncio
+
+from meraki_converter.common.merakiaio import gather_bounded
+
+
+def test_gather_bounded_limits_concurrency():
+    """
+    Test that no more than limit coroutines are in flight at the same time
+    """
+    in_flight = 0
+    peak = 0
+
+    async def job(value):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return value
+
+    results = asyncio.run(gather_bounded((job(i) for i in range(20)), 3))
+    assert results == list(range(20))
+    assert peak == 3
+
+
+def test_gather_bounded_returns_exceptions():
+    """
+    Test that a failing coroutine returns its exception instead of raising
+    """
+
+    async def job(value):
+        if value == 1:
+            raise ValueError("boom")
+        return value
+
+    results = asyncio.run(gather_bounded((job(i) for i in range(3)), 2))
+    assert results[0] == 0 and results[2] == 2
+    assert isinstance(results[1], ValueError)
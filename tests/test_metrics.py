@@ -0,0 +1,72 @@
+"""Test the run metrics and their reports"""
+
+import logging
+
+from meraki_converter.common.metrics import (
+    Metrics,
+    MerakiLogCounter,
+    capture_meraki_logs,
+    registry,
+)
+
+
+def test_span_records_each_run():
+    """
+    Test that every span adds one observation to its stage
+    """
+    metrics = Metrics()
+    for _ in range(3):
+        with metrics.span("render"):
+            pass
+    stage = metrics.report()["stages"]["render"]
+    assert stage["count"] == 3
+    assert stage["max_seconds"] >= stage["mean_seconds"] >= 0
+
+
+def test_prometheus_textfile_format():
+    """
+    Test that counters are written with their labels and stages as summaries
+    """
+    metrics = Metrics()
+    metrics.observe("write", 0.5)
+    metrics.count("api_calls", endpoint="getOrganizations")
+    metrics.count("api_calls", endpoint="getOrganizations")
+    metrics.count("bytes_written", 100)
+    lines = metrics.prometheus().splitlines()
+    assert 'meraki_converter_stage_seconds_sum{stage="write"} 0.5' in lines
+    assert 'meraki_converter_stage_seconds_count{stage="write"} 1' in lines
+    assert (
+        'meraki_converter_api_calls_total{endpoint="getOrganizations"} 2' in lines
+    )
+    assert "meraki_converter_bytes_written_total 100" in lines
+    assert lines.count("# TYPE meraki_converter_api_calls_total counter") == 1
+
+
+def test_meraki_log_counter_counts_retries():
+    """
+    Test that retry warnings logged by the meraki library are counted
+    """
+    key = ("api_retries", (("endpoint", "getNetworkApplianceVlans"),))
+    before = registry.counters.get(key, 0)
+    record = logging.LogRecord(
+        "meraki", logging.WARNING, __file__, 1,
+        "appliance, getNetworkApplianceVlans - 429 Too Many Requests, "
+        "retrying in 2 seconds", None, None,
+    )
+    MerakiLogCounter().emit(record)
+    assert registry.counters[key] == before + 1
+    record.msg = (
+        "appliance, getNetworkApplianceVlans > https://api.meraki.com/api/v1/"
+        "networks/N_1/appliance/vlans - 429 Too Many Requests, retrying in 1 second"
+    )
+    MerakiLogCounter().emit(record)
+    assert registry.counters[key] == before + 2
+
+
+def test_capture_meraki_logs_drops_request_records():
+    """
+    Test that only the library's warnings reach the counter
+    """
+    capture_meraki_logs()
+    assert not logging.getLogger("meraki").isEnabledFor(logging.INFO)
+    assert logging.getLogger("meraki.aio").isEnabledFor(logging.WARNING)
@@ -2,7 +2,13 @@
 
 import pytest
 
-from meraki_converter.main import convert_lease_time_to_seconds, parse_dhcp_options
+from meraki_converter.main import (
+    convert_lease_time_to_seconds,
+    format_vlans,
+    parse_dhcp_options,
+)
+from meraki_converter.common import fortios, render
+from meraki_converter.common.dhcp_options import Option
 from meraki_converter.common.fileops import validate_domain
 
 # ------------------------TEST match_lease_time-------------------------
@@ -72,52 +78,112 @@ def test_parse_dhcp_options_code_15():
     """
     Test that given code 15 and type is text, a valid domain is returned
     """
-    assert parse_dhcp_options(code_15) == {"domain_name": "example.org", "ip_list": ""}
+    assert parse_dhcp_options(code_15)["code_15_text"] == "example.org"
+
+
+def test_parse_dhcp_options_code_15_invalid_domain():
+    """
+    Test that given code 15 with an invalid domain, Error is returned
+    """
+    options = [{"code": "15", "type": "text", "value": "-bad.org"}]
+    assert parse_dhcp_options(options)["code_15_text"] == "Error"
 
 
 def test_parse_dhcp_options_code_150():
     """
     Test that give code 150 and type ip, a valid IP is returned
     """
-    assert parse_dhcp_options(code_150) == {"domain_name": "", "ip_list": "1.1.1.1"}
+    assert parse_dhcp_options(code_150)["code_150_ip"] == "1.1.1.1"
 
 
 def test_parse_dhcp_options_code_150_dual_ips():
     """
     Test that give code 150 and type ip where there are two IPs, two are returned
     """
-    assert parse_dhcp_options(code_150_dual_ips) == {
-        "domain_name": "",
-        "ip_list": "1.1.1.1 2.2.2.2",
-    }
+    assert parse_dhcp_options(code_150_dual_ips)["code_150_ip"] == "1.1.1.1 2.2.2.2"
+
+
+def test_parse_dhcp_options_code_43_hex():
+    """
+    Test that code 43 hex bytes are grouped into two byte words
+    """
+    options = [{"code": "43", "type": "hex", "value": "f1:04:0a:00:00:05"}]
+    assert parse_dhcp_options(options)["code_43_hex"] == "f104:0a00:0005"
 
 
 def test_parse_dhcp_options_dual_options():
     """
     Test that when given multiple options, those options are all returned
     """
-    assert parse_dhcp_options(dual_options) == {
-        "domain_name": "my.example.org",
-        "ip_list": "1.1.1.1 2.2.2.2",
-    }
+    result = parse_dhcp_options(dual_options)
+    assert result["code_15_text"] == "my.example.org"
+    assert result["code_150_ip"] == "1.1.1.1 2.2.2.2"
+    assert result["extra"] == ()
 
 
 def test_parse_dhcp_options_code_unknown():
     """
-    Test that when given an undefined code, a TypeError is raised
+    Test that a code without its own template key is returned as an extra option
     """
-    with pytest.raises(TypeError) as excinfo:
-        parse_dhcp_options(code_unknown)
-    assert str(excinfo.value) == "Undefined code provided"
+    assert parse_dhcp_options(code_unknown)["extra"] == (
+        Option("2", "string", "unknown"),
+    )
+
+
+def test_parse_dhcp_options_integer_code():
+    """
+    Test that integer options are sent as hex of the option's byte width
+    """
+    options = [{"code": "26", "type": "integer", "value": "1400"}]
+    assert parse_dhcp_options(options)["extra"] == (Option("26", "hex", "0578"),)
 
 
 def test_parse_dhcp_options_type_unknown():
     """
-    Test that when given an undefined code, a TypeError is raised
+    Test that when given an undefined type, a TypeError is raised
     """
     with pytest.raises(TypeError) as excinfo:
         parse_dhcp_options(type_unknown)
-    assert str(excinfo.value) == "Undefined code provided"
+    assert str(excinfo.value) == "Undefined DHCP option type provided"
+
+
+def test_parse_dhcp_options_result_is_a_copy():
+    """
+    Test that changing a returned result does not change memoized results
+    """
+    parse_dhcp_options(code_15)["code_15_text"] = "changed"
+    assert parse_dhcp_options(code_15)["code_15_text"] == "example.org"
+    extra = parse_dhcp_options(code_unknown)["extra"]
+    with pytest.raises(AttributeError):
+        extra[0].value = "changed"
+
+
+def test_text_options_render_quoted():
+    """
+    Test that text option values with spaces and quotes stay one value
+    """
+    vlan = {
+        "id": 10,
+        "name": "Data",
+        "applianceIp": "10.0.10.1",
+        "subnet": "10.0.10.0/24",
+        "dhcpHandling": "Run a DHCP server",
+        "fixedIpAssignments": {},
+        "reservedIpRanges": [],
+        "dnsNameservers": "upstream_dns",
+        "dhcpOptions": [
+            {"code": "2", "type": "text", "value": 'Main "office" printer'},
+            {"code": "79", "type": "text", "value": "scope one"},
+        ],
+    }
+    config = {"lan_interface": "internal"}
+    rendered = render.render_network(config, format_vlans([vlan]))
+    lines = [line.strip() for line in rendered.splitlines()]
+    assert 'set value "Main \\"office\\" printer"' in lines
+    assert 'set value "scope one"' in lines
+    for line in lines:
+        if line.startswith("set value"):
+            assert len(fortios.tokenize(line)[0]) == 3
 
 
 # ------------------------TEST validate_domain--------------------------
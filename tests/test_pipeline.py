@@ -0,0 +1,72 @@
+"""Test the bounded staged pipeline used by batch conversion"""
+
+import threading
+import time
+
+from meraki_converter.common.pipeline import Failed, Stage, run_pipeline
+
+
+def test_run_pipeline_passes_every_item_through():
+    """
+    Test that each item comes out once with the output of every stage
+    """
+    stages = [
+        Stage("double", lambda item, _: item * 2, 3),
+        Stage("add", lambda item, value: value + item, 2),
+    ]
+    results = dict(run_pipeline(range(100), stages, queue_size=4))
+    assert results == {item: item * 3 for item in range(100)}
+
+
+def test_run_pipeline_passes_failures_on():
+    """
+    Test that a failing item skips the later stages and the others go on
+    """
+    calls = []
+
+    def check(item, _):
+        if item == 3:
+            raise ValueError("bad item")
+        return item
+
+    stages = [
+        Stage("check", check, 2),
+        Stage("record", lambda item, _: calls.append(item), 1),
+    ]
+    results = dict(run_pipeline(range(6), stages))
+    assert isinstance(results[3], Failed)
+    assert str(results[3].error) == "bad item" and results[3].stage == "check"
+    assert sorted(calls) == [0, 1, 2, 4, 5]
+
+
+def test_run_pipeline_bounds_items_in_flight():
+    """
+    Test that a slow last stage holds back the reading of more items
+    """
+    lock = threading.Lock()
+    in_flight = [0, 0]
+
+    def start(item, _):
+        with lock:
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight[1], in_flight[0])
+
+    def finish(item, _):
+        time.sleep(0.001)
+        with lock:
+            in_flight[0] -= 1
+
+    stages = [Stage("start", start, 4), Stage("finish", finish, 1)]
+    assert len(list(run_pipeline(range(200), stages, queue_size=2))) == 200
+    # Each start worker, the queue between the stages and the finish worker
+    assert in_flight[1] <= 4 + 2 + 1
+
+
+def test_run_pipeline_stops_when_closed():
+    """
+    Test that abandoning the results stops the workers
+    """
+    results = run_pipeline(range(10**6), [Stage("same", lambda i, _: i, 2)], 2)
+    next(results)
+    results.close()
+    assert not any(t.name.startswith("pipeline-") for t in threading.enumerate())
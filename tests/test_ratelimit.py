@@ -0,0 +1,132 @@
+"""Test the shared rate limit scheduler"""
+
+import logging
+import threading
+import time
+import types
+
+import pytest
+
+from meraki_converter.common import ratelimit
+from meraki_converter.common.metrics import registry
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeAPIError(Exception):
+    def __init__(self, status, retry_after=None):
+        super().__init__(status)
+        self.status = status
+        headers = {"Retry-After": retry_after} if retry_after else {}
+        self.response = types.SimpleNamespace(headers=headers)
+
+
+def counter(name, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    return registry.counters.get(key, 0)
+
+
+def test_token_bucket_burst_refill_and_pause():
+    """
+    Test that the bucket allows a burst, then refills at its rate
+    """
+    clock = FakeClock()
+    bucket = ratelimit.TokenBucket(rate=2, burst=3, clock=clock)
+    assert [bucket.take() for _ in range(3)] == [0, 0, 0]
+    assert bucket.take() == pytest.approx(0.5)
+    clock.now += 0.5
+    assert bucket.take() == 0
+    bucket.pause(4)
+    assert bucket.take() == pytest.approx(4)
+    clock.now += 4.5
+    assert bucket.take() == 0
+
+
+def test_interactive_calls_go_before_bulk():
+    """
+    Test that an interactive request jumps the queue of bulk requests
+    """
+    scheduler = ratelimit.RequestScheduler(rate=20, burst=1)
+    scheduler.acquire("org")
+    order = []
+
+    def worker(name, level):
+        scheduler.acquire("org", level)
+        order.append(name)
+
+    threads = [
+        threading.Thread(target=worker, args=(f"bulk{n}", ratelimit.BULK))
+        for n in range(3)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.01)
+    threads.append(
+        threading.Thread(target=worker, args=("interactive", ratelimit.INTERACTIVE))
+    )
+    threads[-1].start()
+    for thread in threads:
+        thread.join(5)
+    assert order[0] == "interactive"
+    assert sorted(order[1:]) == ["bulk0", "bulk1", "bulk2"]
+
+
+def test_call_retries_after_throttling():
+    """
+    Test that a 429 pauses the org for its Retry-After and is retried
+    """
+    scheduler = ratelimit.RequestScheduler(rate=100, burst=5, backoff=0.01)
+    responses = [FakeAPIError(429, retry_after="0.05"), "vlans"]
+    throttled = counter("api_throttled", org="L_1")
+
+    def flaky():
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    start = time.perf_counter()
+    assert scheduler.call("L_1", flaky) == "vlans"
+    assert time.perf_counter() - start >= 0.05
+    assert counter("api_throttled", org="L_1") == throttled + 1
+
+
+def test_call_raises_errors_that_are_not_retried():
+    """
+    Test that client errors and exhausted retries are raised to the caller
+    """
+    scheduler = ratelimit.RequestScheduler(max_retries=2, backoff=0.001)
+    calls = []
+
+    def failing(status):
+        calls.append(status)
+        raise FakeAPIError(status)
+
+    with pytest.raises(FakeAPIError):
+        scheduler.call(None, failing, 404)
+    assert calls == [404]
+    with pytest.raises(FakeAPIError):
+        scheduler.call(None, failing, 503)
+    assert calls.count(503) == 3
+
+
+def test_throttle_listener_pauses_every_org(monkeypatch):
+    """
+    Test that a 429 logged by the meraki library pauses the shared scheduler
+    """
+    scheduler = ratelimit.RequestScheduler(backoff=0)
+    scheduler.acquire("L_1")
+    monkeypatch.setattr(ratelimit, "scheduler", scheduler)
+    record = logging.LogRecord(
+        "meraki", logging.WARNING, __file__, 0,
+        "appliance, getNetworkApplianceVlans - 429 Too Many Requests, "
+        "retrying in 2 seconds", None, None,
+    )
+    ratelimit.ThrottleListener().emit(record)
+    assert scheduler._buckets["L_1"].take() == pytest.approx(2, abs=0.1)
@@ -0,0 +1,71 @@
+"""Test the slotted VLAN, reservation and client records"""
+
+import pytest
+
+from meraki_converter.common import records, render
+from meraki_converter.main import format_vlans
+
+VLAN = {
+    "id": 10,
+    "name": "Data",
+    "applianceIp": "10.0.10.1",
+    "subnet": "10.0.10.0/24",
+    "dhcpHandling": "Run a DHCP server",
+    "fixedIpAssignments": {
+        "aa:bb:cc:00:00:01": {"ip": "10.0.10.50", "name": "printer"},
+        "aa:bb:cc:00:00:02": {"ip": "10.0.10.51"},
+    },
+    "reservedIpRanges": [
+        {"start": "10.0.10.200", "end": "10.0.10.210", "comment": "b"},
+        {"start": "10.0.10.2", "end": "10.0.10.9", "comment": "a"},
+    ],
+    "dnsNameservers": "1.1.1.1\n8.8.8.8",
+    "dhcpLeaseTime": "1 day",
+}
+
+
+def test_records_have_no_instance_dict():
+    """
+    Test that no record carries a per-instance dict
+    """
+    (vlan,) = format_vlans([VLAN])
+    for record in (vlan, vlan.dhcp_reserved[0], vlan.clients, vlan.clients[0]):
+        assert not hasattr(record, "__dict__")
+    with pytest.raises(AttributeError):
+        vlan.vlan_id = 20
+
+
+def test_format_vlans_builds_records():
+    """
+    Test that reservations keep their order and clients are numbered
+    """
+    (vlan,) = format_vlans([VLAN])
+    assert [(r.start, r.end) for r in vlan.dhcp_reserved] == [
+        ("10.0.10.200", "10.0.10.210"),
+        ("10.0.10.2", "10.0.10.9"),
+    ]
+    assert vlan.dhcp_reserved[1] == (0x0A000A02, 0x0A000A09)
+    assert len(vlan.clients) == 2
+    assert vlan.clients[-1].count == 2
+    assert tuple(vlan.clients) == (
+        records.FixedClient(1, "10.0.10.50", "aa:bb:cc:00:00:01", "printer"),
+        records.FixedClient(2, "10.0.10.51", "aa:bb:cc:00:00:02", ""),
+    )
+    assert vlan.dhcp_name_servers == (
+        "set dns-server1 1.1.1.1",
+        "set dns-server2 8.8.8.8",
+    )
+
+
+def test_records_render_like_dicts():
+    """
+    Test that the templates render the records' DHCP settings
+    """
+    rendered = render.render_network(
+        {"lan_interface": "internal"}, format_vlans([VLAN])
+    )
+    assert "set lease-time 86400" in rendered
+    assert "set start-ip 10.0.10.200\n" in rendered
+    assert "set end-ip 10.0.10.210\n" in rendered
+    assert 'set mac aa:bb:cc:00:00:02\n                set description ""' in rendered
+    assert "set dns-server2 8.8.8.8" in rendered
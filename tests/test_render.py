@@ -0,0 +1,87 @@
+"""Test the shared jinja rendering environment"""
+
+import os
+
+from meraki_converter.common import render
+
+
+def test_get_environment_is_shared(tmp_path):
+    """
+    Test that the environment is only built once per template directory
+    """
+    env = render.get_environment(str(tmp_path), str(tmp_path / "bytecode"))
+    assert render.get_environment(str(tmp_path), str(tmp_path / "bytecode")) is env
+
+
+def test_get_environment_reloads_changed_template(tmp_path):
+    """
+    Test that a template is recompiled once its file changes
+    """
+    template_file = tmp_path / "base.conf"
+    template_file.write_text("first {{ config.hostname }}")
+    env = render.get_environment(str(tmp_path), str(tmp_path / "bytecode"))
+    config = {"hostname": "fw1"}
+    assert env.get_template("base.conf").render(config=config) == "first fw1"
+
+    template_file.write_text("second {{ config.hostname }}")
+    mtime = os.path.getmtime(template_file) + 10
+    os.utime(template_file, (mtime, mtime))
+    assert env.get_template("base.conf").render(config=config) == "second fw1"
+
+
+def test_render_network_includes_vlans():
+    """
+    Test that the repo templates render the VLAN interfaces
+    """
+    vlan_info = [
+        {
+            "vlan_id": 10,
+            "vlan_name": "Data",
+            "vlan_ip": "10.0.10.1",
+            "vlan_subnet": "10.0.10.0/24",
+            "vlan_netmask": "255.255.255.0",
+            "dhcp_handling": "Do not respond to DHCP requests",
+        }
+    ]
+    rendered = render.render_network({"lan_interface": "internal"}, vlan_info)
+    assert "    edit Vlan_10\n" in rendered
+    assert "set prefix 10.0.10.0/24" in rendered
+
+
+def test_template_dependencies(tmp_path):
+    """
+    Test that the settings a template reads are found through its includes
+    """
+    (tmp_path / "base.conf").write_text(
+        '{{ config.hostname }}{% include "vlans.conf" %}'
+    )
+    (tmp_path / "vlans.conf").write_text(
+        "{{ config['wan_name'] }}{% for vlan in vlan_info %}{% endfor %}"
+    )
+    (tmp_path / "whole.conf").write_text("{{ config | length }}")
+    env = render.get_environment(str(tmp_path), str(tmp_path / "bytecode"))
+    assert render.template_dependencies("base.conf", env) == {
+        "config": {"hostname", "wan_name"},
+        "vlan_info": None,
+    }
+    assert render.template_dependencies("whole.conf", env) == {"config": None}
+
+
+def test_render_plan_reuses_sections(tmp_path):
+    """
+    Test that sections are cached by the settings they read, not all of them
+    """
+    (tmp_path / "base.conf").write_text(
+        '{% include "global.conf" %}\n{% include "vlans.conf" %}'
+    )
+    (tmp_path / "global.conf").write_text("hostname {{ config.hostname }}")
+    (tmp_path / "vlans.conf").write_text(
+        "{% for vlan in vlan_info %}{{ vlan }} {% endfor %}{{ config.serial }}"
+    )
+    env = render.get_environment(str(tmp_path), str(tmp_path / "bytecode"))
+    plan = render.RenderPlan(env)
+    first = "".join(plan.generate({"hostname": "fw", "serial": "A"}, [1, 2]))
+    second = "".join(plan.generate({"hostname": "fw", "serial": "B"}, [3]))
+    assert first == "hostname fw\n1 2 A"
+    assert second == "hostname fw\n3 B"
+    assert list(plan.fragments) == [("global.conf", "[('hostname', 'fw')]")]
@@ -0,0 +1,67 @@
+"""Test the network search index and the selection prompt"""
+
+from meraki_converter.common import merakiops
+from meraki_converter.common.search import SearchIndex
+
+NETWORKS = [
+    {"id": "L_3", "name": "Store Chicago", "tags": ["north", "retail"]},
+    {"id": "L_1", "name": "Branch Austin", "tags": ["south"]},
+    {"id": "L_2", "name": "Branch Boston", "tags": ["north"]},
+    {"id": "L_4", "name": "HQ", "tags": []},
+]
+
+
+def names(items):
+    return [item["name"] for item in items]
+
+
+def test_search_substring_is_case_insensitive_and_sorted():
+    """
+    Test that name searches match anywhere in the name and sort by name
+    """
+    index = SearchIndex(NETWORKS)
+    assert names(index.search("BRANCH")) == ["Branch Austin", "Branch Boston"]
+    assert names(index.search("ost")) == ["Branch Boston"]
+    assert names(index.search("q")) == ["HQ"]
+    assert index.search("denver") == []
+
+
+def test_search_blank_id_and_tag():
+    """
+    Test the blank, exact ID and tag: searches
+    """
+    index = SearchIndex(NETWORKS)
+    assert len(index.search("")) == 4
+    assert names(index.search("L_3")) == ["Store Chicago"]
+    assert names(index.search("tag:North")) == ["Branch Boston", "Store Chicago"]
+
+
+def test_fuzzy_tolerates_typos():
+    """
+    Test that a misspelt name still finds the closest network first
+    """
+    index = SearchIndex(NETWORKS)
+    assert names(index.fuzzy("brnch bostn"))[0] == "Branch Boston"
+    assert index.fuzzy("zzzz") == []
+
+
+def test_select_from_index_searches_until_selected(monkeypatch, capsys):
+    """
+    Test that text starts a new search and a listed number selects
+    """
+    responses = iter(["chicgo", "1"])
+    monkeypatch.setattr("builtins.input", lambda prompt: next(responses))
+    selected = merakiops.select_from_index(SearchIndex(NETWORKS), "networks", "br")
+    assert selected["id"] == "L_3"
+    assert "closest matches" in capsys.readouterr().out
+
+
+def test_select_from_index_limits_listed_matches(monkeypatch, capsys):
+    """
+    Test that only lines_to_display matches are listed at once
+    """
+    monkeypatch.setattr("builtins.input", lambda prompt: "2")
+    index = SearchIndex(NETWORKS)
+    selected = merakiops.select_from_index(index, "networks", lines_to_display=2)
+    assert selected["name"] == "Branch Boston"
+    assert "2 more" in capsys.readouterr().out
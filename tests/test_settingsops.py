@@ -0,0 +1,82 @@
+"""Test the cached, validated org settings loader"""
+
+import shutil
+
+import pytest
+
+from meraki_converter.common.settingsops import (
+    SettingsError,
+    load_org_settings,
+    load_toml,
+)
+
+TEMPLATE = "input/myorg_settings_template.toml"
+
+
+@pytest.fixture
+def input_dir(tmp_path):
+    shutil.copy(TEMPLATE, tmp_path / "myorg.toml")
+    return tmp_path
+
+
+def test_load_org_settings_template_is_valid(input_dir):
+    """
+    Test that the shipped template passes validation and flattens for templates
+    """
+    config = load_org_settings("myorg", input_dir=str(input_dir)).to_config()
+    assert config["banner"] == "Your banner"
+    assert config["model"] == ""
+    assert len(config) == 36
+
+
+def test_load_org_settings_is_cached(input_dir):
+    """
+    Test that loading the same unchanged files returns the same object
+    """
+    first = load_org_settings("myorg", input_dir=str(input_dir))
+    assert load_org_settings("myorg", input_dir=str(input_dir)) is first
+
+
+def test_load_org_settings_site_overrides_base(input_dir):
+    """
+    Test that base, org and site files are layered from least to most specific
+    """
+    (input_dir / "base_settings.toml").write_text(
+        '[global]\nmodel = "FG-60F"\n[bgp]\nremote_asn = 65000\n'
+    )
+    (input_dir / "myorg").mkdir()
+    (input_dir / "myorg" / "Branch 1.toml").write_text(
+        '[global]\nhostname = "branch1"\n'
+    )
+    config = load_org_settings(
+        "myorg", site="Branch 1", input_dir=str(input_dir)
+    ).to_config()
+    assert config["model"] == "FG-60F"
+    assert config["hostname"] == "branch1"
+    # The org file sets remote_asn = "" which overrides the base file
+    assert config["remote_asn"] == ""
+
+
+def test_load_org_settings_reports_every_error(input_dir):
+    """
+    Test that bad values and missing keys are all reported at once
+    """
+    text = (input_dir / "myorg.toml").read_text()
+    text = text.replace('wan_ip = ""', 'wan_ip = "10.0.0.300"')
+    text = text.replace('ise_key = ""\n', "")
+    (input_dir / "myorg.toml").write_text(text)
+    with pytest.raises(SettingsError) as excinfo:
+        load_org_settings("myorg", input_dir=str(input_dir))
+    assert "wan_ip is not a valid IPv4 address" in str(excinfo.value)
+    assert "[tacacs] is missing key ise_key" in str(excinfo.value)
+
+
+def test_load_toml_reloads_changed_file(tmp_path):
+    """
+    Test that a changed file is parsed again
+    """
+    path = tmp_path / "general.toml"
+    path.write_text('title = "one"\n')
+    assert load_toml(str(path))["title"] == "one"
+    path.write_text('title = "two, longer"\n')
+    assert load_toml(str(path))["title"] == "two, longer"
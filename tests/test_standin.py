@@ -0,0 +1,102 @@
+"""Test the converter end to end against the local dashboard stand-in"""
+
+import pytest
+
+from meraki_converter.common import apicache, merakiaio, merakiops, ratelimit
+from meraki_converter.common.standin import StandInServer, paginate, recorded_backend
+from meraki_converter.common.synthetic import SyntheticDashboard
+from meraki_converter.main import format_vlans, from_meraki_get_vlans
+
+
+@pytest.fixture(autouse=True)
+def fast_scheduler(monkeypatch):
+    scheduler = ratelimit.RequestScheduler(rate=1000, burst=1000, backoff=0.001)
+    monkeypatch.setattr(ratelimit, "scheduler", scheduler)
+
+
+@pytest.fixture
+def synthetic():
+    return SyntheticDashboard(networks=7, vlans=3, clients=2)
+
+
+def test_paginate_follows_cursor():
+    """
+    Test that pages run in order and the last page has no next link
+    """
+    items = [{"id": str(n)} for n in range(5)]
+    page, next_query = paginate(items, "id", {}, 2)
+    assert page == items[:2] and next_query == "perPage=2&startingAfter=1"
+    page, next_query = paginate(items, "id", {"startingAfter": ["3"]}, 2)
+    assert page == items[4:] and next_query is None
+
+
+def test_dashboard_against_standin(synthetic):
+    """
+    Test paginated networks, VLANs and warm spare through the meraki library
+    """
+    server = StandInServer(synthetic, page_size=3, throttle_every=5, retry_after=0)
+    with server:
+        dashboard = merakiops.get_dashboard(key="test", base_url=server.base_url)
+        networks = merakiops.get_networks(dashboard, "1")
+        assert networks == synthetic.networks
+        net_id = networks[4]["id"]
+        assert from_meraki_get_vlans(dashboard, net_id) == format_vlans(
+            synthetic.get_network_appliance_vlans(net_id)
+        )
+        assert merakiops.get_mx_serial_number(
+            dashboard, net_id
+        ) == merakiops.get_mx_serial_number(synthetic, net_id)
+        assert len(merakiops.get_appliances(dashboard, "1")) == 7
+    assert server.throttled > 0
+
+
+def test_async_fetch_against_standin(synthetic):
+    """
+    Test that the asyncio layer fetches every network through the stand-in
+    """
+    net_ids = [network["id"] for network in synthetic.networks]
+    with StandInServer(synthetic, latency=0.01) as server:
+        results = merakiaio.fetch_network_vlans(
+            net_ids, key="test", concurrency=4, base_url=server.base_url
+        )
+    assert results[net_ids[0]] == synthetic.get_network_appliance_vlans(net_ids[0])
+    assert not any(isinstance(r, BaseException) for r in results.values())
+
+
+def test_standin_serves_recordings(tmp_path, synthetic, monkeypatch):
+    """
+    Test that responses recorded from the Meraki cloud are served back
+    """
+    monkeypatch.delenv("MERAKI_DASHBOARD_API_KEY", raising=False)
+    scope = apicache.cache_scope(
+        str(tmp_path), key="cloud", base_url=apicache.DEFAULT_BASE_URL
+    )
+    cache = apicache.ResponseCache(str(tmp_path), scope=scope)
+    recorder = apicache.CachedDashboard(synthetic, cache)
+    vlans = recorder.appliance.getNetworkApplianceVlans("L_10000002")
+    backend = recorded_backend(str(tmp_path))
+    with StandInServer(backend) as server:
+        dashboard = merakiops.get_dashboard(key="test", base_url=server.base_url)
+        assert dashboard.appliance.getNetworkApplianceVlans("L_10000002") == vlans
+        with pytest.raises(merakiops.meraki.APIError):
+            dashboard.appliance.getNetworkApplianceVlans("L_10000003")
+
+
+def test_scheduler_alone_retries_throttled_calls(synthetic, monkeypatch):
+    """
+    Test that a throttled call is sent once per scheduler attempt, with no
+    retries of the library's own on top
+    """
+    scheduler = ratelimit.RequestScheduler(1000, 1000, max_retries=2, backoff=0.001)
+    monkeypatch.setattr(ratelimit, "scheduler", scheduler)
+    net_id = synthetic.networks[0]["id"]
+    with StandInServer(synthetic, throttle_every=1, retry_after=0) as server:
+        dashboard = merakiops.get_dashboard(key="test", base_url=server.base_url)
+        with pytest.raises(merakiops.meraki.APIError):
+            dashboard.organizations.getOrganization("1")
+        assert server.requests == 3
+        results = merakiaio.fetch_network_vlans(
+            [net_id], key="test", base_url=server.base_url
+        )
+        assert isinstance(results[net_id], BaseException)
+        assert server.requests == 6
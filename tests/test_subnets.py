@@ -0,0 +1,41 @@
+"""Test the integer subnet engine against the ipaddress module"""
+
+import ipaddress
+
+import pytest
+
+from meraki_converter.common.subnets import (
+    address_plan,
+    ip_to_int,
+    parse_subnet,
+)
+
+
+@pytest.mark.parametrize("subnet", ["10.0.10.0/24", "192.168.4.0/22", "172.16.0.8/29"])
+def test_address_plan_matches_ipaddress(subnet):
+    """
+    Test that ranges and netmask agree with IPv4Network for the same subnet
+    """
+    network = ipaddress.IPv4Network(subnet)
+    plan = address_plan([{"subnet": subnet}])[0]
+    assert plan.start == str(network[1])
+    assert plan.end == str(network[-2])
+    assert plan.netmask == str(network.netmask)
+    assert plan.broadcast == int(network.broadcast_address)
+
+
+def test_parse_subnet_rejects_host_bits():
+    """
+    Test that a subnet with host bits set raises a ValueError
+    """
+    with pytest.raises(ValueError):
+        parse_subnet("10.0.10.1/24")
+
+
+def test_ip_to_int_rejects_short_forms():
+    """
+    Test that only full dotted quads are accepted
+    """
+    assert ip_to_int("10.0.0.1") == 167772161
+    with pytest.raises(ValueError):
+        ip_to_int("10.1")
@@ -0,0 +1,34 @@
+"""Test the synthetic Meraki organization generator"""
+
+from meraki_converter.common.synthetic import SyntheticDashboard, generate_vlans
+from meraki_converter.main import from_meraki_get_vlans
+
+
+def test_generate_vlans_is_deterministic():
+    """
+    Test that the same inputs always generate the same VLANs
+    """
+    first = generate_vlans(7, count=5, clients=3)
+    assert first == generate_vlans(7, count=5, clients=3)
+    assert generate_vlans(7, count=5) != generate_vlans(8, count=5)
+
+
+def test_generate_vlans_sizes():
+    """
+    Test that the requested number of VLANs and fixed assignments are made
+    """
+    vlans = generate_vlans(0, count=4, clients=6)
+    assert len(vlans) == 4
+    assert all(len(vlan["fixedIpAssignments"]) == 6 for vlan in vlans)
+    assert len({vlan["subnet"] for vlan in vlans}) == 4
+
+
+def test_synthetic_dashboard_converts():
+    """
+    Test that every generated network can be formatted for the templates
+    """
+    dashboard = SyntheticDashboard(networks=3, vlans=10, clients=2)
+    networks = dashboard.organizations.getOrganizationNetworks("1")
+    assert len(networks) == 3
+    for network in networks:
+        assert len(from_meraki_get_vlans(dashboard, network["id"])) == 10